@@ -5,6 +5,8 @@ Django settings for master-portal project.
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -69,6 +71,58 @@ DATABASES = {
     }
 }
 
+# Optional local PostgreSQL (e.g. for stress_booking); requires psycopg
+if os.environ.get('POSTGRES_DB'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ['POSTGRES_DB'],
+        'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+    }
+
+# Route booking writes through a per-master queue (see schedule/writer.py)
+BOOKING_WRITE_QUEUE = os.environ.get('BOOKING_WRITE_QUEUE', 'False').lower() in ('true', '1', 'yes')
+BOOKING_WRITE_TIMEOUT = float(os.environ.get('BOOKING_WRITE_TIMEOUT', '5'))
+
+# Bookings whose start is older than this many days move to the archive tables (see schedule/archive.py)
+SCHEDULE_ARCHIVE_AFTER_DAYS = int(os.environ.get('SCHEDULE_ARCHIVE_AFTER_DAYS', '180'))
+
+# Serve anonymous storefront pages from the full-page cache (see showcase/page_cache.py)
+STOREFRONT_PAGE_CACHE = os.environ.get('STOREFRONT_PAGE_CACHE', 'True').lower() in ('true', '1', 'yes')
+# Seconds a cached storefront page may spend rebuilding before the last good copy is served instead
+STOREFRONT_READ_BUDGET = float(os.environ.get('STOREFRONT_READ_BUDGET', '0.5'))
+# Rebuild storefront snapshots on a background thread after each change (see showcase/snapshots.py)
+STOREFRONT_SNAPSHOT_ASYNC = os.environ.get('STOREFRONT_SNAPSHOT_ASYNC', 'True').lower() in ('true', '1', 'yes')
+
+# Slot holds, page generations and snapshots must be seen by every process:
+# redis://host:6379/0 or memcached://host:11211. Empty keeps a per-process memory cache (one process only)
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('memcached://'):
+    # Needs pymemcache installed
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL[len('memcached://'):],
+        }
+    }
+elif CACHE_URL:
+    raise ImproperlyConfigured(f'CACHE_URL must start with redis://, rediss:// or memcached://, got {CACHE_URL!r}')
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -0,0 +1,144 @@
+"""Conditional GET for pages built from one master's data.
+
+The ETag hashes the master's ``data_version`` (see versions.py) together with
+everything else that varies the HTML: the URL, the viewer (user, CSRF cookie,
+slot hold token), the slot holds version where the page shows holds, and the
+current ``FRESHNESS_SECONDS`` window. The window bounds staleness for what no
+version tracks, such as slots passing into the past or an admin edit.
+``Last-Modified`` is the later of ``data_changed_at`` and the window start.
+
+Storefront pages take the master from the slug resolver (resolver.py); the
+cabinet's row is cached the same way, reused while the page generation is
+unchanged. Validating a page, and answering a matching ``If-None-Match`` or
+``If-Modified-Since`` with 304, so usually runs no query and never the view. Outdated
+copies served by the storefront page cache carry no validators, so a client
+never keeps one under a current tag.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import OperationalError
+from django.http import Http404
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from schedule.holds import HOLD_COOKIE, holds_version
+
+from .models import MasterProfile
+from .resolver import resolve_master
+from .versions import page_generation_key
+
+FRESHNESS_SECONDS = 60
+
+# X-Page-Cache values of responses older than the data version (see showcase/page_cache.py)
+OUTDATED_PAGE_MARKERS = ('stale', 'fallback')
+
+
+def storefront_master(request, slug):
+    """``(user_id, data_version, data_changed_at)`` of the public page's master, or ``None``."""
+    try:
+        record = resolve_master(request, slug)
+    except Http404:
+        return None
+    return record.user_id, record.data_version, record.data_changed_at
+
+
+def cabinet_master(request, *args, **kwargs):
+    """The same for the signed-in master; ``None`` lets the view redirect as usual."""
+    if request.user.is_authenticated and request.user.is_master:
+        return _master_row(request.user.pk)
+    return None
+
+
+def page_validators(request, lookup, with_holds, *args, **kwargs):
+    """Return ``(etag, last_modified)`` for the page, or ``None`` if it cannot be validated cheaply."""
+    if not hasattr(request, '_page_validators'):
+        request._page_validators = _compute_validators(request, lookup, with_holds, *args, **kwargs)
+    return request._page_validators
+
+
+def _compute_validators(request, lookup, with_holds, *args, **kwargs):
+    if messages.get_messages(request):
+        # Pending messages are rendered once; the page must be built to show them
+        return None
+    try:
+        row = lookup(request, *args, **kwargs)
+    except OperationalError:
+        # Locked database: leave the request to the page cache fallback
+        return None
+    if row is None:
+        return None
+    master_id, version, changed_at = row
+
+    window = int(time.time() // FRESHNESS_SECONDS)
+    parts = [
+        request.get_full_path(), master_id, version, window,
+        request.user.pk, request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    if with_holds:
+        parts += [holds_version(master_id), request.COOKIES.get(HOLD_COOKIE, '')]
+    etag = md5(repr(parts).encode()).hexdigest()
+    window_start = datetime.fromtimestamp(window * FRESHNESS_SECONDS, tz=dt_timezone.utc)
+    return etag, max(changed_at, window_start)
+
+
+def _master_row(user_id):
+    """Return ``(user_id, data_version, data_changed_at)`` of the master, or ``None``."""
+    key = f'page_validators:{user_id}'
+    cached = cache.get(key)
+    # Read before the row: a bump committed in between makes the stored copy outdated, not stuck
+    generation = cache.get(page_generation_key(user_id))
+    if cached is not None and cached['generation'] == generation:
+        return cached['row']
+    row = MasterProfile.objects.filter(user_id=user_id).values_list(
+        'user_id', 'data_version', 'data_changed_at'
+    ).first()
+    if row is not None:
+        cache.set(key, {'row': row, 'generation': generation}, None)
+    return row
+
+
+def conditional_page(lookup, with_holds=False):
+    """Add ETag, Last-Modified and revalidation Cache-Control to a master's page; answer 304 early.
+
+    ``lookup(request, *args, **kwargs)`` returns ``(user_id, data_version,
+    data_changed_at)`` of the page's master, or ``None`` to serve the page
+    unconditionally.
+    """
+    def etag(request, *args, **kwargs):
+        validators = page_validators(request, lookup, with_holds, *args, **kwargs)
+        return validators[0] if validators else None
+
+    def last_modified(request, *args, **kwargs):
+        validators = page_validators(request, lookup, with_holds, *args, **kwargs)
+        return validators[1] if validators else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            validators = getattr(request, '_page_validators', None)
+            if not validators or response.status_code not in (200, 304):
+                return response
+            if response.get('X-Page-Cache') in OUTDATED_PAGE_MARKERS:
+                del response['ETag']
+                del response['Last-Modified']
+                patch_cache_control(response, no_cache=True)
+                return response
+            if response.status_code == 304:
+                response['ETag'] = quote_etag(validators[0])
+                response['Last-Modified'] = http_date(validators[1].timestamp())
+            # Shared caches may keep anonymous pages; everyone revalidates on every use
+            shared = not request.user.is_authenticated and HOLD_COOKIE not in request.COOKIES
+            patch_cache_control(response, public=shared, private=not shared, max_age=0, must_revalidate=True)
+            return response
+        return wrapped
+    return decorator
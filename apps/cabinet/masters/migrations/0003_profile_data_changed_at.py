@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:04
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0002_profile_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='masterprofile',
+            name='data_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Данные изменены'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import F
 from django.conf import settings
+from django.utils import timezone
 from django.utils.text import slugify
 
 
@@ -14,6 +16,9 @@ class MasterProfile(models.Model):
     slug = models.SlugField('URL', unique=True, max_length=100)
     phone = models.CharField('Телефон', max_length=20, blank=True)
     bio = models.TextField('О себе', blank=True)
+    # Bumped on every change to what the storefront shows about the master (see versions.py)
+    data_version = models.PositiveIntegerField('Версия данных', default=0, editable=False)
+    data_changed_at = models.DateTimeField('Данные изменены', default=timezone.now, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -28,7 +33,13 @@ class MasterProfile(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = self._generate_unique_slug()
+        if not self._state.adding:
+            # Increment in SQL: an instance loaded before a booking bumped the counter must not write it back
+            self.data_version = F('data_version') + 1
+            self.data_changed_at = timezone.now()
         super().save(*args, **kwargs)
+        if not isinstance(self.data_version, int):
+            self.refresh_from_db(fields=['data_version'])
 
     def _generate_unique_slug(self):
         base_slug = slugify(self.display_name) or 'master'
@@ -0,0 +1,121 @@
+"""Slug to master resolution shared by the storefront views.
+
+A per-process LRU maps a slug to a compact ``MasterRecord``: profile fields,
+data version and the salon card. An entry is reused while the master's page
+generation in the shared cache (see versions.py) is the one it was loaded
+under, so writes made by other processes invalidate it too; writes in this
+process also drop it at once. ``RESOLVER_TTL`` bounds the one case the
+generation misses: a write committed elsewhere between loading the profile
+and reading its generation. A request resolves each slug at most once.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.http import Http404
+
+from .models import MasterProfile
+from .versions import page_generation_key
+
+RESOLVER_SIZE = 1024
+
+RESOLVER_TTL = 60
+
+SalonCard = namedtuple('SalonCard', ['name', 'address', 'phone', 'description'])
+
+
+class MasterRecord(namedtuple('MasterRecord', [
+    'profile_id', 'user_id', 'slug', 'display_name', 'phone', 'bio', 'data_version', 'data_changed_at', 'salon'
+])):
+    __slots__ = ()
+
+    @property
+    def owner(self):
+        """The master's user with only the primary key set: enough for filters and foreign keys."""
+        return get_user_model()(pk=self.user_id)
+
+
+class MasterResolver:
+    """Thread-safe LRU of master records keyed by slug."""
+
+    def __init__(self, size=RESOLVER_SIZE):
+        self.size = size
+        self._entries = OrderedDict()  # slug -> (record, page generation it was loaded under, expiry)
+        self._lock = threading.Lock()
+
+    def get(self, slug):
+        """Return the record for ``slug`` or ``None`` if no master has it."""
+        with self._lock:
+            entry = self._entries.get(slug)
+            if entry is not None:
+                self._entries.move_to_end(slug)
+        if entry is not None and entry[2] > time.monotonic() and (
+            cache.get(page_generation_key(entry[0].user_id)) == entry[1]
+        ):
+            return entry[0]
+
+        record, generation = self._load(slug)
+        with self._lock:
+            if record is None:
+                self._entries.pop(slug, None)
+                return None
+            self._entries[slug] = (record, generation, time.monotonic() + RESOLVER_TTL)
+            self._entries.move_to_end(slug)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return record
+
+    def _load(self, slug):
+        # One LEFT JOIN brings the first salon along
+        profile = (
+            MasterProfile.objects.filter(slug=slug)
+            .values(
+                'pk', 'user_id', 'display_name', 'phone', 'bio', 'data_version', 'data_changed_at',
+                *(f'user__salons__{field}' for field in SalonCard._fields), salon_id=F('user__salons__pk'),
+            )
+            .order_by('user__salons__pk')
+            .first()
+        )
+        if profile is None:
+            return None, None
+        generation = cache.get(page_generation_key(profile['user_id']))
+        salon = None
+        if profile['salon_id'] is not None:
+            salon = SalonCard(*(profile[f'user__salons__{field}'] for field in SalonCard._fields))
+        return MasterRecord(
+            profile_id=profile['pk'],
+            user_id=profile['user_id'],
+            slug=slug,
+            display_name=profile['display_name'],
+            phone=profile['phone'],
+            bio=profile['bio'],
+            data_version=profile['data_version'],
+            data_changed_at=profile['data_changed_at'],
+            salon=salon,
+        ), generation
+
+    def forget(self, user_id, slug=None):
+        """Drop every entry of the master, whatever slug it was stored under, and the entry for ``slug``."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0].user_id == user_id or key == slug]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+resolver = MasterResolver()
+
+
+def resolve_master(request, slug):
+    """Return the ``MasterRecord`` for ``slug``, once per request; raise ``Http404`` if there is none."""
+    resolved = request.__dict__.setdefault('_resolved_masters', {})
+    if slug not in resolved:
+        resolved[slug] = resolver.get(slug)
+    if resolved[slug] is None:
+        raise Http404('Мастер не найден')
+    return resolved[slug]
@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 
-from .models import MasterProfile
+from .models import MasterProfile, Salon, Service
+from .resolver import resolver
+from .versions import bump_master_version, touch_page_generation
 
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
@@ -13,3 +15,21 @@ def create_master_profile(sender, instance, created, **kwargs):
             user=instance,
             display_name=instance.username or instance.email.split('@')[0]
         )
+
+
+@receiver(post_save, sender=MasterProfile)
+@receiver(post_delete, sender=MasterProfile)
+def profile_changed(sender, instance, **kwargs):
+    """Profiles bump their data version in save(); cached pages also need a new generation."""
+    # The slug may have been resolved to another master before (a rename, a deleted profile)
+    resolver.forget(instance.user_id, slug=instance.slug)
+    touch_page_generation(instance.user_id)
+
+
+@receiver(post_save, sender=Salon)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Salon)
+@receiver(post_delete, sender=Service)
+def master_data_changed(sender, instance, **kwargs):
+    """Salon and service cards are public, so any write invalidates the master's storefront caches."""
+    bump_master_version(instance.owner_id)
@@ -1,8 +1,16 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.http import Http404
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 
 from accounts.models import User
 from .models import MasterProfile, Salon, Service
+from .resolver import MasterResolver, resolve_master, resolver
+from .versions import bump_master_version, page_generation_key
+
+
+def data_version(user):
+    return MasterProfile.objects.values_list('data_version', flat=True).get(user=user)
 
 
 class MasterProfileModelTest(TestCase):
@@ -206,3 +214,98 @@ class ServiceViewTest(TestCase):
             'description': '', 'is_active': True,
         })
         self.assertEqual(resp.status_code, 404)
+
+
+class MasterDataVersionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='ver@test.com', username='ver', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.client.login(username='ver@test.com', password='pass123')
+
+    def assertBumped(self, before):
+        after = data_version(self.user)
+        self.assertGreater(after, before)
+        return after
+
+    def test_profile_edit_bumps(self):
+        version = data_version(self.user)
+        self.client.post(reverse('profile_edit'), {
+            'display_name': 'Имя', 'slug': 'imya', 'phone': '', 'bio': '',
+        })
+        self.assertBumped(version)
+
+    def test_stale_profile_save_does_not_roll_back(self):
+        profile = MasterProfile.objects.get(user=self.user)
+        bump_master_version(self.user.pk)
+        bump_master_version(self.user.pk)
+        profile.bio = 'Новое'
+        profile.save()
+        self.assertEqual(profile.data_version, 3)
+        self.assertEqual(data_version(self.user), 3)
+
+    def test_salon_and_service_writes_bump(self):
+        version = data_version(self.user)
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        version = self.assertBumped(version)
+        service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=30, price=1)
+        version = self.assertBumped(version)
+        self.client.post(reverse('service_delete', args=[service.pk]))
+        self.assertBumped(version)
+
+
+class MasterResolverTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        resolver.clear()
+        self.user = User.objects.create_user(
+            email='res@test.com', username='resolve', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        self.salon = Salon.objects.create(owner=self.user, name='Салон', address='Ленина, 1')
+
+    def test_resolved_once_per_request_and_shared_across_requests(self):
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            record = resolve_master(request, 'resolve')
+            self.assertIs(resolve_master(request, 'resolve'), record)
+        self.assertEqual(record.user_id, self.user.pk)
+        self.assertEqual(record.salon.address, 'Ленина, 1')
+        with self.assertNumQueries(0):
+            resolve_master(RequestFactory().get('/'), 'resolve')
+        with self.assertRaises(Http404):
+            resolve_master(request, 'nobody')
+
+    def test_profile_and_salon_writes_invalidate(self):
+        resolver.get('resolve')
+        self.salon.name = 'Студия'
+        self.salon.save()
+        self.assertEqual(resolver.get('resolve').salon.name, 'Студия')
+
+        self.profile.slug = 'renamed'
+        self.profile.save()
+        self.assertIsNone(resolver.get('resolve'))
+        self.assertEqual(resolver.get('renamed').data_version, self.profile.data_version)
+
+    def test_write_in_another_process_seen_through_generation(self):
+        resolver.get('resolve')
+        MasterProfile.objects.filter(pk=self.profile.pk).update(display_name='Анна')
+        self.assertEqual(resolver.get('resolve').display_name, 'resolve')
+        # Another process committed a bump: only the shared generation tells us
+        cache.set(page_generation_key(self.user.pk), 'other')
+        self.assertEqual(resolver.get('resolve').display_name, 'Анна')
+
+    def test_least_recently_used_entry_evicted(self):
+        small = MasterResolver(size=2)
+        for name in ('first', 'second'):
+            User.objects.create_user(email=f'{name}@test.com', username=name, password='x', role=User.Role.MASTER)
+        small.get('first')
+        small.get('second')
+        small.get('first')
+        small.get('resolve')
+        with self.assertNumQueries(0):
+            small.get('first')
+        with self.assertNumQueries(1):
+            small.get('second')
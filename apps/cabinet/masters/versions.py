@@ -0,0 +1,67 @@
+"""Per-master version of everything the storefront shows about a master.
+
+``MasterProfile.data_version`` is only ever incremented in SQL, so concurrent
+writers never lose a bump and a stale in-memory profile cannot roll it back.
+Profile, salon and service writes bump it here (``signals.py``); slot, rule and
+booking writes bump it through ``schedule.summary.refresh_master_availability``,
+which every schedule write path already calls, including bulk ``update()``
+paths such as ``Booking.cancel`` that fire no signals. A storefront cache keyed
+on ``(master_id, data_version)`` therefore never serves data older than the
+last write. ``data_changed_at`` records when that last write happened, for
+``Last-Modified`` headers (see conditional.py).
+
+Full-page caches must not touch the database even to read that version, so
+every bump is mirrored, after commit, into a cache-side page generation per
+master plus one for the catalog, which lists every master. The slug resolver
+(resolver.py) checks its entries against the same generation.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import MasterProfile
+
+CATALOG_GENERATION_KEY = 'page_generation:catalog'
+
+# Sent with ``user_id`` after a transaction that changed the master's data commits
+master_data_committed = Signal()
+
+
+def page_generation_key(user_id):
+    return f'page_generation:{user_id}'
+
+
+def bump_master_version(user_id):
+    """Increment the master's data version and stamp the change time."""
+    MasterProfile.objects.filter(user_id=user_id).update(
+        data_version=F('data_version') + 1, data_changed_at=timezone.now()
+    )
+    touch_page_generation(user_id)
+
+
+def touch_page_generation(user_id):
+    """Invalidate cached storefront pages of the master (and the catalog) once the write commits."""
+    from .resolver import resolver
+
+    # This process sees its own write at once; others notice the new generation
+    resolver.forget(user_id)
+    transaction.on_commit(lambda: _committed(user_id))
+
+
+def _committed(user_id):
+    _bump_generations([page_generation_key(user_id), CATALOG_GENERATION_KEY])
+    master_data_committed.send(sender=MasterProfile, user_id=user_id)
+
+
+def _bump_generations(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Missing or evicted: restart from a value no earlier generation can have reached
+            cache.add(key, time.time_ns(), None)
+
@@ -1,18 +1,74 @@
-from django.contrib import admin
-from .models import ScheduleSlot, Booking
+from django.contrib import admin, messages
+
+from .bulk import block_days, cancel_bookings
+from .changelist import ScalableAdminMixin, OwnerFilter, date_drilldown
+from .models import ScheduleSlot, Booking, WorkingHours, ScheduleException, ArchivedBooking, ArchivedSlot
 
 
 @admin.register(ScheduleSlot)
-class ScheduleSlotAdmin(admin.ModelAdmin):
-    list_display = ('owner', 'start_at', 'end_at', 'status')
-    list_filter = ('status', 'owner', 'start_at')
+class ScheduleSlotAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('owner', 'start_at', 'end_at', 'status', 'source')
+    list_filter = ('status', 'source', OwnerFilter, date_drilldown('start_date'))
+    list_select_related = ('owner',)
     search_fields = ('owner__email',)
-    date_hierarchy = 'start_at'
+    actions = ('block_master_days',)
+
+    @admin.action(description='Заблокировать день мастера', permissions=('change',))
+    def block_master_days(self, request, queryset):
+        result = block_days(queryset)
+        self.message_user(
+            request,
+            f'Закрыто дней: {result.days} (мастеров: {result.masters}), '
+            f'заблокировано свободных слотов: {result.slots}',
+            messages.SUCCESS,
+        )
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('client_name', 'client_phone', 'service', 'owner', 'slot', 'status', 'created_at')
-    list_filter = ('status', 'owner', 'created_at')
+    list_filter = ('status', OwnerFilter, date_drilldown('created_at', 'Создана'))
+    list_select_related = ('service', 'owner', 'slot')
     search_fields = ('client_name', 'client_phone', 'owner__email')
-    date_hierarchy = 'created_at'
+    actions = ('cancel_selected',)
+
+    @admin.action(description='Отменить записи', permissions=('change',))
+    def cancel_selected(self, request, queryset):
+        result = cancel_bookings(queryset)
+        self.message_user(
+            request,
+            f'Отменено записей: {result.bookings}, освобождено слотов: {result.slots}',
+            messages.SUCCESS,
+        )
+
+
+@admin.register(WorkingHours)
+class WorkingHoursAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('owner', 'weekday', 'start_time', 'end_time', 'slot_minutes')
+    list_filter = ('weekday', OwnerFilter)
+    list_select_related = ('owner',)
+    search_fields = ('owner__email',)
+
+
+@admin.register(ScheduleException)
+class ScheduleExceptionAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('owner', 'date', 'start_time', 'end_time', 'slot_minutes')
+    list_filter = (OwnerFilter, date_drilldown('date'))
+    list_select_related = ('owner',)
+    search_fields = ('owner__email',)
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('client_name', 'client_phone', 'service_name', 'owner', 'start_at', 'status', 'archived_at')
+    list_filter = ('status', OwnerFilter, date_drilldown('start_at'))
+    list_select_related = ('owner',)
+    search_fields = ('client_name', 'client_phone', 'owner__email')
+
+
+@admin.register(ArchivedSlot)
+class ArchivedSlotAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('owner', 'start_at', 'end_at', 'status', 'source', 'booking')
+    list_filter = ('status', 'source', OwnerFilter, date_drilldown('start_date'))
+    list_select_related = ('owner', 'booking')
+    search_fields = ('owner__email',)
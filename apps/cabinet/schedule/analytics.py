@@ -0,0 +1,343 @@
+"""Point-in-time export of the booking data into a separate SQLite file for analytics.
+
+Long analytical reads never run against the live database. For a full
+export on SQLite the online backup API first copies it into a temporary file
+``backup_pages`` pages per step, releasing the lock between steps; a write
+committed meanwhile restarts the copy, so the copy is consistent. Each
+restart, or a step kept waiting on writers, doubles the step up to
+``BACKUP_MAX_PAGES``, so writers never wait longer than one capped step. If
+the copy keeps restarting at the cap it pauses and starts over, and gives up
+with ``SnapshotBusy`` after ``BACKUP_ATTEMPTS`` tries: the next run will
+find a quieter moment. Other backends are read in one ``REPEATABLE READ``
+transaction, which does not block writers.
+Tables are then read in primary-key chunks of ``chunk_size`` rows and written
+to the output file, which DuckDB (``ATTACH ... (TYPE sqlite)``) and pandas
+open directly. A full export replaces the file atomically.
+
+Incremental mode re-exports only masters whose ``data_changed_at`` is past
+the watermark stored in the file (minus ``WATERMARK_OVERLAP`` for writes
+committed after they were stamped). Every write to a master's data stamps
+it (see masters/versions.py), so replacing those masters' rows brings the
+file up to date; masters deleted since are dropped. Those few rows are read
+straight from the live database in short chunked queries, without a copy: a
+master written while it is read is stamped after the new watermark and is
+exported again by the next run.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from uuid import UUID
+
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from masters.models import MasterProfile, Service
+from .models import ScheduleSlot, Booking, ArchivedBooking, ArchivedSlot
+
+# Model and the field naming its master, in export order
+EXPORT_MODELS = (
+    (MasterProfile, 'user'),
+    (Service, 'owner'),
+    (ScheduleSlot, 'owner'),
+    (Booking, 'owner'),
+    (ArchivedBooking, 'owner'),
+    (ArchivedSlot, 'owner'),
+)
+
+EXPORT_CHUNK_SIZE = 5000
+
+# Database pages copied per locked backup step, and the pause between steps
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.005
+
+# Seconds a backup step may wait for writers before the step size grows
+BACKUP_BUSY_LIMIT = 0.5
+
+# Largest locked step: the longest writers ever wait for the copy
+BACKUP_MAX_PAGES = 4096
+
+# Copies started over at the largest step before giving up, and the pause before each
+BACKUP_ATTEMPTS = 5
+BACKUP_RETRY_DELAY = 1.0
+
+# Masters re-exported per owner IN (...) batch in incremental mode
+OWNER_BATCH_SIZE = 500
+
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+META_TABLE = 'export_meta'
+
+ExportResult = namedtuple('ExportResult', ['rows', 'masters', 'incremental', 'watermark', 'elapsed'])
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def _owner_column(model, owner_field):
+    return model._meta.get_field(owner_field).column
+
+
+def _plain(value):
+    """A value sqlite3 stores without adapters (drivers other than SQLite's return Python objects)."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, (date, Decimal, UUID)):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _as_datetime(value):
+    if not isinstance(value, datetime):
+        value = parse_datetime(value or '')
+        if value is None:
+            return None
+    # SQLite stores UTC without an offset
+    return value if value.tzinfo else value.replace(tzinfo=dt_timezone.utc)
+
+
+class _Source:
+    """Consistent read-only view of the live data: a DB-API cursor and its parameter placeholder."""
+
+    def __init__(self, cursor, placeholder):
+        self.cursor = cursor
+        self.placeholder = placeholder
+
+    def chunks(self, model, chunk_size, owner_column=None, owners=None):
+        """Yield lists of rows of ``model`` in primary key order, optionally only of ``owners``."""
+        table = model._meta.db_table
+        pk = model._meta.pk.column
+        names = _columns(model)
+        pk_index = names.index(pk)
+        columns = ', '.join(f'"{column}"' for column in names)
+        p = self.placeholder
+        last = None
+        while True:
+            conditions, params = [], []
+            if last is not None:
+                conditions.append(f'"{pk}" > {p}')
+                params.append(last)
+            if owners is not None:
+                conditions.append(f'"{owner_column}" IN ({", ".join([p] * len(owners))})')
+                params.extend(owners)
+            where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+            self.cursor.execute(
+                f'SELECT {columns} FROM "{table}"{where} ORDER BY "{pk}" LIMIT {int(chunk_size)}', params
+            )
+            rows = [tuple(_plain(value) for value in row) for row in self.cursor.fetchall()]
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last = rows[-1][pk_index]
+
+    def masters(self):
+        """``{user_id: data_changed_at}`` of every master."""
+        self.cursor.execute(f'SELECT "user_id", "data_changed_at" FROM "{MasterProfile._meta.db_table}"')
+        return {user_id: _as_datetime(changed_at) for user_id, changed_at in self.cursor.fetchall()}
+
+
+class _BackupStalled(Exception):
+    pass
+
+
+class SnapshotBusy(RuntimeError):
+    """The live database was written too often for the copy to finish in bounded steps."""
+
+
+def _backup(source, target, pages, max_pages=BACKUP_MAX_PAGES):
+    """Copy ``source`` into ``target`` ``pages`` pages per step, growing the step while writers get in the way."""
+    pages = min(pages, max_pages) if pages > 0 else max_pages
+    attempts = 0
+    while True:
+        seen = {'left': None, 'busy_since': None}
+
+        def progress(status, left, total):
+            if status in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED):
+                # Writers keep the database locked: fewer, longer steps find a gap sooner
+                seen['busy_since'] = seen['busy_since'] or time.monotonic()
+                if time.monotonic() - seen['busy_since'] > BACKUP_BUSY_LIMIT:
+                    raise _BackupStalled(total)
+                return
+            seen['busy_since'] = None
+            if seen['left'] is not None and left >= seen['left']:
+                # A step that copied pages without getting closer: a write made SQLite start over
+                raise _BackupStalled(total)
+            seen['left'] = left
+
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=BACKUP_PAUSE)
+            return
+        except _BackupStalled:
+            if pages < max_pages:
+                pages = min(pages * 2, max_pages)
+                continue
+            # Never one step for the whole file: that would hold writers for the entire copy
+            attempts += 1
+            if attempts >= BACKUP_ATTEMPTS:
+                raise SnapshotBusy(
+                    f'The database kept changing during {attempts} copies in steps of {max_pages} pages'
+                )
+            time.sleep(BACKUP_RETRY_DELAY)
+
+
+@contextmanager
+def snapshot_source(backup_pages=BACKUP_PAGES, workdir=None):
+    """Open a consistent snapshot of the live database for reading."""
+    if connection.in_atomic_block:
+        raise RuntimeError('A snapshot cannot be taken inside a transaction')
+    connection.ensure_connection()
+    if connection.vendor == 'sqlite':
+        with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+            copy = sqlite3.connect(os.path.join(tmp, 'snapshot.sqlite3'))
+            try:
+                _backup(connection.connection, copy, backup_pages)
+                yield _Source(copy.cursor(), '?')
+            finally:
+                copy.close()
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            yield _Source(cursor, '%s')
+
+
+@contextmanager
+def live_source():
+    """Read the live database directly, each query on its own."""
+    if connection.in_atomic_block:
+        # A transaction would hold SQLite's read lock across every chunk
+        raise RuntimeError('Live reads cannot run inside a transaction')
+    with connection.cursor() as cursor:
+        yield _Source(cursor, '%s')
+
+
+def _create_tables(out):
+    out.execute(f'CREATE TABLE IF NOT EXISTS "{META_TABLE}" ("key" text PRIMARY KEY, "value" text)')
+    for model, owner_field in EXPORT_MODELS:
+        table = model._meta.db_table
+        columns = ', '.join(
+            f'"{field.column}" {field.db_type(connection) or ""}'.rstrip() for field in model._meta.concrete_fields
+        )
+        out.execute(f'CREATE TABLE "{table}" ({columns}, PRIMARY KEY ("{model._meta.pk.column}"))')
+        out.execute(f'CREATE INDEX "{table}_owner" ON "{table}" ("{_owner_column(model, owner_field)}")')
+
+
+def _schema_matches(out):
+    for model, _ in EXPORT_MODELS:
+        existing = [row[1] for row in out.execute(f'PRAGMA table_info("{model._meta.db_table}")')]
+        if existing != _columns(model):
+            return False
+    return True
+
+
+def _read_watermark(path):
+    """The watermark of an existing export whose tables match the models, else ``None``."""
+    if not os.path.exists(path):
+        return None
+    out = sqlite3.connect(path)
+    try:
+        row = out.execute(f'SELECT "value" FROM "{META_TABLE}" WHERE "key" = \'watermark\'').fetchone()
+        if row is None or not _schema_matches(out):
+            return None
+        return _as_datetime(row[0])
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        out.close()
+
+
+def _insert(out, model, rows):
+    placeholders = ', '.join('?' * len(_columns(model)))
+    out.executemany(f'INSERT INTO "{model._meta.db_table}" VALUES ({placeholders})', rows)
+
+
+def _write_meta(out, watermark, snapshot_at):
+    out.executemany(f'INSERT OR REPLACE INTO "{META_TABLE}" VALUES (?, ?)', [
+        ('watermark', watermark.isoformat() if watermark else ''),
+        ('snapshot_at', snapshot_at.isoformat()),
+        ('source', connection.vendor),
+    ])
+
+
+def export_analytics(path, incremental=False, chunk_size=EXPORT_CHUNK_SIZE, backup_pages=BACKUP_PAGES):
+    """Write the analytics snapshot to ``path``; with ``incremental``, update only masters changed since the last run."""
+    started = time.monotonic()
+    snapshot_at = datetime.now(tz=dt_timezone.utc)
+    previous = _read_watermark(path) if incremental else None
+    workdir = os.path.dirname(os.path.abspath(path))
+
+    if previous is None:
+        with snapshot_source(backup_pages, workdir=workdir) as source:
+            masters = source.masters()
+            watermark = max(filter(None, masters.values()), default=None)
+            rows = _export_full(source, path, chunk_size, watermark, snapshot_at)
+            exported = len(masters)
+    else:
+        with live_source() as source:
+            masters = source.masters()
+            watermark = max(filter(None, masters.values()), default=previous)
+            changed = sorted(user_id for user_id, at in masters.items() if at and at > previous - WATERMARK_OVERLAP)
+            rows = _export_changed(source, path, chunk_size, set(masters), changed, watermark, snapshot_at)
+            exported = len(changed)
+
+    return ExportResult(rows, exported, previous is not None, watermark, time.monotonic() - started)
+
+
+def _export_full(source, path, chunk_size, watermark, snapshot_at):
+    partial = f'{path}.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+    out = sqlite3.connect(partial)
+    rows = 0
+    try:
+        _create_tables(out)
+        for model, _ in EXPORT_MODELS:
+            for chunk in source.chunks(model, chunk_size):
+                _insert(out, model, chunk)
+                rows += len(chunk)
+        _write_meta(out, watermark, snapshot_at)
+        out.commit()
+    finally:
+        out.close()
+    # Readers see the old file or the new one, never a half-written export
+    os.replace(partial, path)
+    return rows
+
+
+def _export_changed(source, path, chunk_size, current, changed, watermark, snapshot_at):
+    out = sqlite3.connect(path)
+    rows = 0
+    try:
+        master_table = MasterProfile._meta.db_table
+        exported = {user_id for (user_id,) in out.execute(f'SELECT "user_id" FROM "{master_table}"')}
+        stale = sorted(set(changed) | (exported - current))
+        for start in range(0, len(stale), OWNER_BATCH_SIZE):
+            batch = stale[start:start + OWNER_BATCH_SIZE]
+            for model, owner_field in EXPORT_MODELS:
+                out.execute(
+                    f'DELETE FROM "{model._meta.db_table}" WHERE "{_owner_column(model, owner_field)}" '
+                    f'IN ({", ".join("?" * len(batch))})',
+                    batch,
+                )
+        for start in range(0, len(changed), OWNER_BATCH_SIZE):
+            batch = changed[start:start + OWNER_BATCH_SIZE]
+            for model, owner_field in EXPORT_MODELS:
+                for chunk in source.chunks(model, chunk_size, _owner_column(model, owner_field), batch):
+                    _insert(out, model, chunk)
+                    rows += len(chunk)
+        _write_meta(out, watermark, snapshot_at)
+        # One transaction: readers of the file never see a master half replaced
+        out.commit()
+    finally:
+        out.close()
+    return rows
@@ -0,0 +1,134 @@
+"""Retention for the hot schedule tables.
+
+Past slots nobody booked are deleted outright. Bookings whose start is older
+than ``SCHEDULE_ARCHIVE_AFTER_DAYS`` move, together with the slots they used,
+into ``bookings_archive`` / ``schedule_slots_archive``, where the cabinet
+history page still reads them. Work is done in short per-batch transactions,
+so the job can run next to live traffic (e.g. nightly from cron).
+"""
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from masters.versions import bump_master_version
+from .models import ScheduleSlot, Booking, ArchivedBooking, ArchivedSlot
+
+ARCHIVE_BATCH_SIZE = 500
+
+ArchiveResult = namedtuple('ArchiveResult', ['deleted_slots', 'archived_bookings', 'archived_slots', 'elapsed'])
+
+
+def archive_cutoff(days=None, now=None):
+    """Return the local date before which bookings are archived."""
+    if days is None:
+        days = settings.SCHEDULE_ARCHIVE_AFTER_DAYS
+    return timezone.localdate(now or timezone.now()) - timedelta(days=days)
+
+
+def purge_past_free_slots(batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """Delete slots that are over and never held a booking; return the number removed."""
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        rows = list(
+            ScheduleSlot.objects.filter(
+                start_date__lte=timezone.localdate(now),
+                end_at__lte=now,
+                booking__isnull=True,
+                start_bookings__isnull=True,
+            ).values_list('pk', 'owner_id')[:batch_size]
+        )
+        if not rows:
+            return removed
+        with transaction.atomic():
+            removed += ScheduleSlot.objects.filter(pk__in=[pk for pk, _ in rows]).delete()[0]
+            # The cabinet slot list can show past days; its validators follow the data version
+            for owner_id in {owner_id for _, owner_id in rows}:
+                bump_master_version(owner_id)
+
+
+def archive_booking_batch(bookings):
+    """Move ``bookings`` and the slots only they reference into the archive; return ``(bookings, slots)``."""
+    booking_ids = [booking.pk for booking in bookings]
+    # Active bookings still link their whole run; a cancelled one only knows its start slot
+    ends = dict(
+        ScheduleSlot.objects.filter(booking_id__in=booking_ids)
+        .values('booking').annotate(end=Max('end_at')).values_list('booking', 'end')
+    )
+    slot_ids = {booking.slot_id for booking in bookings}
+    slot_ids.update(ScheduleSlot.objects.filter(booking_id__in=booking_ids).values_list('pk', flat=True))
+    # A cancelled booking's start slot may have been booked again by a newer booking: leave it
+    still_used = set(
+        Booking.objects.filter(slot_id__in=slot_ids).exclude(pk__in=booking_ids).values_list('slot_id', flat=True)
+    )
+    slots = list(
+        ScheduleSlot.objects.filter(pk__in=slot_ids - still_used)
+        .filter(Q(booking__isnull=True) | Q(booking_id__in=booking_ids))
+    )
+
+    ArchivedBooking.objects.bulk_create([
+        ArchivedBooking(
+            id=booking.pk,
+            owner_id=booking.owner_id,
+            service_id=booking.service_id,
+            service_name=booking.service.name,
+            start_at=booking.slot.start_at,
+            end_at=ends.get(booking.pk, booking.slot.end_at),
+            client_name=booking.client_name,
+            client_phone=booking.client_phone,
+            notes=booking.notes,
+            status=booking.status,
+            created_at=booking.created_at,
+        )
+        for booking in bookings
+    ], ignore_conflicts=True)
+    ArchivedSlot.objects.bulk_create([
+        ArchivedSlot(
+            id=slot.pk,
+            owner_id=slot.owner_id,
+            booking_id=slot.booking_id,
+            start_at=slot.start_at,
+            end_at=slot.end_at,
+            start_date=slot.start_date,
+            status=slot.status,
+            source=slot.source,
+        )
+        for slot in slots
+    ], ignore_conflicts=True)
+
+    Booking.objects.filter(pk__in=booking_ids).delete()
+    ScheduleSlot.objects.filter(pk__in=[slot.pk for slot in slots]).delete()
+    for owner_id in {booking.owner_id for booking in bookings}:
+        bump_master_version(owner_id)
+    return len(bookings), len(slots)
+
+
+def archive_old_bookings(days=None, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """Archive bookings starting before the cutoff; return ``(bookings, slots)`` moved."""
+    cutoff = archive_cutoff(days, now)
+    moved_bookings = moved_slots = 0
+    while True:
+        with transaction.atomic():
+            bookings = list(
+                Booking.objects.filter(slot__start_date__lt=cutoff)
+                .select_related('service', 'slot')
+                .order_by('pk')[:batch_size]
+            )
+            if not bookings:
+                return moved_bookings, moved_slots
+            batch_bookings, batch_slots = archive_booking_batch(bookings)
+        moved_bookings += batch_bookings
+        moved_slots += batch_slots
+
+
+def archive_history(days=None, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """Run the whole retention pass; return ``ArchiveResult``."""
+    started = time.monotonic()
+    deleted = purge_past_free_slots(batch_size, now)
+    bookings, slots = archive_old_bookings(days, batch_size, now)
+    return ArchiveResult(deleted, bookings, slots, time.monotonic() - started)
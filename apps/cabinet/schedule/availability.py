@@ -0,0 +1,78 @@
+"""Bookable-start computation over contiguous runs of free slots.
+
+Slots are any objects with ``start_at``/``end_at`` sorted by ``start_at``.
+A run is a maximal sequence of slots where each one starts exactly when the
+previous one ends. Durations are measured in minutes, so runs may mix slots
+of different lengths.
+"""
+from datetime import timedelta
+
+
+def split_runs(slots):
+    """Split sorted slots into contiguous runs of free time."""
+    runs = []
+    current = []
+    for slot in slots:
+        if current and slot.start_at != current[-1].end_at:
+            runs.append(current)
+            current = []
+        current.append(slot)
+    if current:
+        runs.append(current)
+    return runs
+
+
+def iter_windows(run, duration_min):
+    """Yield ``(i, j)`` so that ``run[i:j]`` is the shortest cover of ``duration_min``.
+
+    Two-pointer sweep: ``j`` never moves backwards, so a run is processed in O(len(run)).
+    """
+    duration = timedelta(minutes=duration_min)
+    j = 0
+    for i, slot in enumerate(run):
+        j = max(j, i + 1)
+        while j < len(run) and run[j - 1].end_at - slot.start_at < duration:
+            j += 1
+        if run[j - 1].end_at - slot.start_at < duration:
+            # Later starts cover even less of this run
+            return
+        yield i, j
+
+
+def bookable_starts(slots, duration_min):
+    """Return slots from which ``duration_min`` minutes of continuous free time begin."""
+    starts = []
+    for run in split_runs(slots):
+        starts.extend(run[i] for i, _ in iter_windows(run, duration_min))
+    return starts
+
+
+def covering_slots(slots, duration_min):
+    """Return the slots covering ``duration_min`` from ``slots[0]``, or None if they don't fit."""
+    if not slots:
+        return None
+    run = split_runs(slots)[0]
+    for i, j in iter_windows(run, duration_min):
+        return run[i:j]
+    return None
+
+
+def earliest_starts(slots, durations):
+    """Return ``{duration_min: slot}`` with the earliest start fitting each duration.
+
+    A run of free time fits a duration iff its total length does, and then its
+    first slot is the earliest start, so one pass over the runs answers every
+    duration at once. Durations that fit nowhere are left out.
+    """
+    pending = sorted(set(durations))
+    result = {}
+    k = 0
+    for run in split_runs(slots):
+        if k == len(pending):
+            break
+        length = run[-1].end_at - run[0].start_at
+        # Shorter durations are always resolved first, so pending ones are a suffix
+        while k < len(pending) and length >= timedelta(minutes=pending[k]):
+            result[pending[k]] = run[0]
+            k += 1
+    return result
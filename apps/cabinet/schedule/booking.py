@@ -0,0 +1,200 @@
+"""Booking engine: claims the covering slots with one conditional UPDATE.
+
+Instead of row locks (``select_for_update`` is a no-op on SQLite) every
+attempt reads the candidate slots, inserts the booking, then flips the slots
+from AVAILABLE to BOOKED and points them at it in a single
+``UPDATE ... WHERE status = 'AVAILABLE'``. If fewer rows change than expected
+another booking won the race; the attempt (booking row included) is rolled
+back and retried a bounded number of times.
+
+Working-hours slots (see ``rules``) have no row until booked: the attempt
+inserts them as BOOKED, and a unique index on (owner, start_at) turns a
+concurrent insert of the same slot into a conflict.
+
+Slots held by another visitor's open booking form (see ``holds``) are refused
+before any write; the caller's own ``hold_token`` is let through.
+
+An ``idempotency_key`` is stored in the same transaction as the booking, so a
+replayed submission finds the original booking instead of a taken slot.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction, IntegrityError, OperationalError
+from django.db.models import Q
+from django.utils import timezone
+
+from .availability import covering_slots, split_runs
+from .holds import held_slots, release_hold, SLOT_HELD_MESSAGE
+from .models import ScheduleSlot, Booking, BookingIdempotencyKey
+from .rules import free_slots, find_rule_slot, parse_slot_ref
+from .summary import refresh_master_availability
+
+BOOKING_RETRY_ATTEMPTS = 3
+# Seconds before the first retry; doubled on every further attempt
+BOOKING_RETRY_DELAY = 0.02
+
+# Replays of a submission are recognised for this long
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+SLOT_TAKEN_MESSAGE = 'Этот слот уже занят. Пожалуйста, выберите другое время.'
+
+
+class SlotConflict(Exception):
+    """A concurrent booking claimed one of the slots first."""
+
+
+def is_lock_error(exc):
+    return 'locked' in str(exc).lower()
+
+
+def create_booking(owner, service, slot_id, client_name, client_phone, notes='', hold_token=None,
+                   idempotency_key=None):
+    """Book ``service`` starting at ``slot_id`` or raise ValueError with a user-facing message."""
+    delay = BOOKING_RETRY_DELAY
+    for attempt in range(1, BOOKING_RETRY_ATTEMPTS + 1):
+        try:
+            booking = _attempt_booking(
+                owner, service, slot_id, client_name, client_phone, notes, hold_token, idempotency_key
+            )
+            release_hold(hold_token)
+            return booking
+        except SlotConflict:
+            if attempt == BOOKING_RETRY_ATTEMPTS:
+                raise ValueError(SLOT_TAKEN_MESSAGE)
+        except OperationalError as e:
+            if not is_lock_error(e) or attempt == BOOKING_RETRY_ATTEMPTS:
+                raise
+        time.sleep(delay)
+        delay *= 2
+
+
+def find_replayed_booking(owner, idempotency_key, now=None):
+    """Return the booking an unexpired ``idempotency_key`` was used for, or None."""
+    if not idempotency_key:
+        return None
+    return Booking.objects.filter(
+        idempotency_keys__owner=owner,
+        idempotency_keys__key=idempotency_key,
+        idempotency_keys__expires_at__gt=now or timezone.now()
+    ).first()
+
+
+def purge_expired_idempotency_keys(batch_size=1000, now=None):
+    """Delete expired idempotency keys in batches; return the number removed."""
+    now = now or timezone.now()
+    removed = 0
+    while True:
+        pks = list(
+            BookingIdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            return removed
+        removed += BookingIdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+
+def claim_slots(slot_ids, booking, fresh_ids=()):
+    """Flip the given slots to BOOKED for ``booking`` if they are still free; return rows changed.
+
+    ``fresh_ids`` are rule slots this attempt has just stored as BOOKED; they only need linking.
+    """
+    free = Q(status=ScheduleSlot.Status.AVAILABLE)
+    if fresh_ids:
+        free |= Q(pk__in=fresh_ids)
+    return ScheduleSlot.objects.filter(free, pk__in=slot_ids).update(
+        status=ScheduleSlot.Status.BOOKED, booking=booking
+    )
+
+
+def find_start_slot(owner, slot_ref):
+    """Return the slot a storefront ref points to: a stored slot (any status) or a free rule slot."""
+    parsed = parse_slot_ref(slot_ref)
+    if parsed is None:
+        raise ValueError('Слот не найден')
+    pk, start_at = parsed
+    if pk is not None:
+        slot = ScheduleSlot.objects.filter(pk=pk, owner=owner).first()
+        if slot is None:
+            raise ValueError('Слот не найден')
+        return slot
+    slot = find_rule_slot(owner.pk, start_at)
+    if slot is None:
+        raise ValueError('Слот уже занят')
+    return slot
+
+
+def find_covering_slots(owner, service, slot_id):
+    """Return the contiguous free slots covering ``service`` from the slot ``slot_id`` refers to."""
+    start_slot = find_start_slot(owner, slot_id)
+
+    if start_slot.status != ScheduleSlot.Status.AVAILABLE:
+        raise ValueError('Слот уже занят')
+
+    if service.owner_id != start_slot.owner_id:
+        raise ValueError('Услуга и слот принадлежат разным мастерам')
+
+    candidates = [start_slot]
+    if start_slot.end_at - start_slot.start_at < timedelta(minutes=service.duration_min):
+        candidates += free_slots(
+            owner.pk,
+            start_slot.start_at + timedelta(seconds=1),
+            start_slot.start_at + timedelta(minutes=service.duration_min)
+        )
+
+    slots = covering_slots(candidates, service.duration_min)
+    if slots is None:
+        run = split_runs(candidates)[0]
+        free_minutes = int((run[-1].end_at - start_slot.start_at).total_seconds() // 60)
+        raise ValueError(
+            f'Недостаточно свободного времени подряд. '
+            f'Нужно: {service.duration_min} мин, доступно: {free_minutes} мин'
+        )
+    return slots
+
+
+def materialize_slots(slots):
+    """Store unsaved rule slots as BOOKED; raise SlotConflict if another booking stored one first."""
+    for slot in slots:
+        slot.status = ScheduleSlot.Status.BOOKED
+    try:
+        with transaction.atomic():
+            ScheduleSlot.objects.bulk_create(slots)
+    except IntegrityError:
+        raise SlotConflict()
+
+
+def _attempt_booking(owner, service, slot_id, client_name, client_phone, notes, hold_token, idempotency_key):
+    with transaction.atomic():
+        slots = find_covering_slots(owner, service, slot_id)
+        if held_slots(slots, exclude_token=hold_token):
+            raise ValueError(SLOT_HELD_MESSAGE)
+
+        # Rule slots get rows now, already BOOKED so nothing else can claim them
+        fresh = [s for s in slots if s.pk is None]
+        if fresh:
+            materialize_slots(fresh)
+
+        booking = Booking.objects.create(
+            owner=owner,
+            service=service,
+            slot=slots[0],
+            client_name=client_name,
+            client_phone=client_phone,
+            notes=notes
+        )
+        slot_ids = [s.pk for s in slots]
+        if claim_slots(slot_ids, booking, fresh_ids=[s.pk for s in fresh]) != len(slot_ids):
+            raise SlotConflict()
+        if idempotency_key:
+            now = timezone.now()
+            # An expired key the purge job has not removed yet may be reused
+            BookingIdempotencyKey.objects.filter(owner=owner, key=idempotency_key, expires_at__lte=now).delete()
+            BookingIdempotencyKey.objects.create(
+                owner=owner,
+                key=idempotency_key,
+                booking=booking,
+                expires_at=now + IDEMPOTENCY_KEY_TTL
+            )
+
+        refresh_master_availability(owner.pk)
+        return booking
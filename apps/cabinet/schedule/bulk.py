@@ -0,0 +1,67 @@
+"""Set-based bulk writes behind the admin actions.
+
+Each action runs a fixed number of ``UPDATE``/``INSERT`` statements however
+many rows are selected, instead of saving rows one by one (and firing the
+per-row signals in signals.py). The availability summary is then refreshed
+once per affected master.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import ScheduleSlot, Booking, ScheduleException
+from .summary import refresh_master_availability
+
+BLOCK_BATCH_SIZE = 500
+
+BlockedDays = namedtuple('BlockedDays', ['days', 'slots', 'masters'])
+
+CancelledBookings = namedtuple('CancelledBookings', ['bookings', 'slots', 'masters'])
+
+
+def block_days(slots):
+    """Close the masters' days of the given slots: free slots become BLOCKED, the day a day off.
+
+    Booked slots are left alone. Returns ``BlockedDays``.
+    """
+    days = set(slots.order_by().values_list('owner_id', 'start_date').distinct())
+    if not days:
+        return BlockedDays(0, 0, 0)
+    with transaction.atomic():
+        # Working-hours slots have no rows; a day-off exception closes them
+        exceptions = ScheduleException.objects.filter(
+            Exists(slots.filter(owner_id=OuterRef('owner_id'), start_date=OuterRef('date')))
+        )
+        overridden = set(exceptions.values_list('owner_id', 'date'))
+        exceptions.update(start_time=None, end_time=None)
+        ScheduleException.objects.bulk_create(
+            [ScheduleException(owner_id=owner_id, date=day) for owner_id, day in sorted(days - overridden)],
+            batch_size=BLOCK_BATCH_SIZE,
+        )
+        # Last: ``slots`` may be filtered by status, and this changes it
+        blocked = (
+            ScheduleSlot.objects
+            .filter(Exists(slots.filter(owner_id=OuterRef('owner_id'), start_date=OuterRef('start_date'))))
+            .filter(status=ScheduleSlot.Status.AVAILABLE)
+            .update(status=ScheduleSlot.Status.BLOCKED)
+        )
+    owners = sorted({owner_id for owner_id, _ in days})
+    for owner_id in owners:
+        refresh_master_availability(owner_id)
+    return BlockedDays(len(days), blocked, len(owners))
+
+
+def cancel_bookings(bookings):
+    """Cancel the active bookings among ``bookings`` and free their slots; return ``CancelledBookings``."""
+    with transaction.atomic():
+        active = Booking.objects.filter(pk__in=bookings.values('pk'), status=Booking.Status.CREATED)
+        owners = sorted(set(active.order_by().values_list('owner_id', flat=True).distinct()))
+        # Slots first: once cancelled, the bookings no longer match ``active``
+        freed = ScheduleSlot.objects.filter(booking__in=active.values('pk')).update(
+            status=ScheduleSlot.Status.AVAILABLE, booking=None
+        )
+        cancelled = active.update(status=Booking.Status.CANCELLED)
+    for owner_id in owners:
+        refresh_master_availability(owner_id)
+    return CancelledBookings(cancelled, freed, len(owners))
@@ -0,0 +1,70 @@
+"""Query plan capture used to guard hot-path queries against table scans.
+
+Wrap a block with ``capture_query_plans()`` and inspect ``table_scans()``::
+
+    with capture_query_plans() as plans:
+        client.get(url)
+    assert not table_scans(plans)
+"""
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Tables that grow with bookings/slots and must never be read by a full scan
+HOT_TABLES = ('schedule_slots', 'bookings', 'master_availability')
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+
+@dataclass
+class QueryPlan:
+    sql: str
+    plan: list
+
+
+def explain(sql):
+    """Return the plan lines for one executed statement."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        # Tiny test tables make seq scans look cheapest; only report unavoidable ones
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN {sql}')
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+@contextmanager
+def capture_query_plans(using=connection):
+    """Collect a ``QueryPlan`` for every SELECT/UPDATE/DELETE run inside the block."""
+    plans = []
+    with CaptureQueriesContext(using) as ctx:
+        yield plans
+    for query in ctx.captured_queries:
+        sql = query['sql']
+        if sql.lstrip().upper().startswith(EXPLAINABLE):
+            plans.append(QueryPlan(sql=sql, plan=explain(sql)))
+
+
+def _scan_pattern(table):
+    if connection.vendor == 'sqlite':
+        # "SCAN t" is a full table scan; "SCAN t USING INDEX" walks a whole index
+        return re.compile(rf'^SCAN {table}\b')
+    return re.compile(rf'Seq Scan on {table}\b')
+
+
+def table_scans(plans, tables=HOT_TABLES):
+    """Return ``(table, plan)`` pairs for every full scan of a hot table."""
+    scans = []
+    for plan in plans:
+        for table in tables:
+            pattern = _scan_pattern(table)
+            if any(pattern.search(line.strip()) for line in plan.plan):
+                scans.append((table, plan))
+    return scans
@@ -0,0 +1,203 @@
+"""Streaming CSV and XLSX export of a master's bookings and slots.
+
+Rows come from ``.iterator(chunk_size=EXPORT_CHUNK_SIZE)`` querysets and are
+written out as they are read, so memory stays flat however long the history
+is; filters are applied in SQL by the views. The XLSX writer needs no third
+party package: it streams a minimal workbook through ``zipfile`` with every
+cell stored as an inline string.
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Booking, ScheduleSlot
+
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = ('csv', 'xlsx')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+BOOKING_COLUMNS = ('Дата', 'Начало', 'Конец', 'Услуга', 'Клиент', 'Телефон', 'Статус', 'Комментарий', 'Создана')
+
+SLOT_COLUMNS = ('Дата', 'Начало', 'Конец', 'Статус', 'Клиент', 'Телефон')
+
+BOOKING_STATUSES = dict(Booking.Status.choices)
+
+SLOT_STATUSES = dict(ScheduleSlot.Status.choices)
+
+# Cells a spreadsheet would run as a formula; a plain phone number is left alone
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+PHONE_RE = re.compile(r'[+\d\s()-]+')
+
+# Characters XML 1.0 does not allow
+XML_ILLEGAL_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _date(value):
+    return timezone.localtime(value).strftime('%d.%m.%Y')
+
+
+def _time(value):
+    return timezone.localtime(value).strftime('%H:%M')
+
+
+def booking_rows(archived, current):
+    """Header and one row per booking: archived ones first, then the current table.
+
+    A current booking ends with the last slot of its run, as in the archive, so
+    a later change of the service duration does not move it; a cancelled booking
+    only keeps its start slot.
+    """
+    yield BOOKING_COLUMNS
+    for booking in archived.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield (
+            _date(booking.start_at), _time(booking.start_at), _time(booking.end_at), booking.service_name,
+            booking.client_name, booking.client_phone, BOOKING_STATUSES.get(booking.status, booking.status),
+            booking.notes, timezone.localtime(booking.created_at).strftime('%d.%m.%Y %H:%M'),
+        )
+    for booking in current.annotate(run_end=Max('booked_slots__end_at')).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        start = booking.slot.start_at
+        yield (
+            _date(start), _time(start), _time(booking.run_end or booking.slot.end_at),
+            booking.service.name, booking.client_name, booking.client_phone,
+            BOOKING_STATUSES.get(booking.status, booking.status), booking.notes,
+            timezone.localtime(booking.created_at).strftime('%d.%m.%Y %H:%M'),
+        )
+
+
+def slot_rows(slots):
+    """Header and one row per slot, with the client of a booked slot."""
+    yield SLOT_COLUMNS
+    for slot in slots.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        booking = slot.booking
+        yield (
+            _date(slot.start_at), _time(slot.start_at), _time(slot.end_at), SLOT_STATUSES.get(slot.status, slot.status),
+            booking.client_name if booking else '', booking.client_phone if booking else '',
+        )
+
+
+class _Echo:
+    """File-like object that hands back what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    value = str(value)
+    if value.startswith(FORMULA_PREFIXES) and not PHONE_RE.fullmatch(value):
+        return "'" + value
+    return value
+
+
+def csv_stream(rows):
+    """Encoded CSV lines; the BOM and ``;`` make Excel with a Russian locale open it as is."""
+    writer = csv.writer(_Echo(), delimiter=';')
+    yield '\ufeff'.encode()
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row]).encode()
+
+
+XLSX_PARTS = (
+    ('[Content_Types].xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+     '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+     '<Default Extension="xml" ContentType="application/xml"/>'
+     '<Override PartName="/xl/workbook.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+     '<Override PartName="/xl/worksheets/sheet1.xml" '
+     'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+     '</Types>'),
+    ('_rels/.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="xl/workbook.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+     '</Relationships>'),
+    ('xl/workbook.xml',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+     'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+     '<sheets><sheet name="Экспорт" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    ('xl/_rels/workbook.xml.rels',
+     '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+     '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+     '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+     'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+     '</Relationships>'),
+)
+
+SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+SHEET_TAIL = '</sheetData></worksheet>'
+
+
+class _Sink:
+    """Write-only stream that collects what ``zipfile`` writes until it is drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _xlsx_row(row):
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(XML_ILLEGAL_RE.sub("", str(value)))}</t></is></c>'
+        for value in row
+    )
+    return f'<row>{cells}</row>'.encode()
+
+
+def xlsx_stream(rows):
+    """Chunks of a one-sheet workbook, written as rows arrive."""
+    sink = _Sink()
+    # Without tell() zipfile writes sizes after each member, so nothing is seeked back to
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS:
+            archive.writestr(name, content)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(SHEET_HEAD.encode())
+            for row in rows:
+                sheet.write(_xlsx_row(row))
+                data = sink.drain()
+                if data:
+                    yield data
+            sheet.write(SHEET_TAIL.encode())
+    yield sink.drain()
+
+
+def export_stream(rows, export_format):
+    return xlsx_stream(rows) if export_format == 'xlsx' else csv_stream(rows)
+
+
+def export_response(rows, name, export_format):
+    """``StreamingHttpResponse`` downloading ``rows`` as ``name-<today>.csv`` or ``.xlsx``."""
+    if export_format not in FORMATS:
+        export_format = 'csv'
+    response = StreamingHttpResponse(export_stream(rows, export_format), content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y-%m-%d}.{export_format}"'
+    return response
@@ -1,13 +1,27 @@
 from django import forms
-from datetime import datetime, timedelta
+
+from .generator import generate_slots, range_days, MAX_RANGE_DAYS
+from .models import WorkingHours, ScheduleException
 
 
 class SlotCreateForm(forms.Form):
-    """Form for generating schedule slots."""
+    """Form for generating schedule slots over a date range."""
     date = forms.DateField(
-        label='Дата',
+        label='С даты',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label='По дату',
+        required=False,
         widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
     )
+    weekdays = forms.TypedMultipleChoiceField(
+        label='Дни недели',
+        choices=WorkingHours.Weekday.choices,
+        coerce=int,
+        required=False,
+        widget=forms.CheckboxSelectMultiple(attrs={'class': 'form-check-input'})
+    )
     start_time = forms.TimeField(
         label='Время начала',
         widget=forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'})
@@ -28,40 +42,91 @@ class SlotCreateForm(forms.Form):
         cleaned_data = super().clean()
         start_time = cleaned_data.get('start_time')
         end_time = cleaned_data.get('end_time')
+        date_from = cleaned_data.get('date')
+        date_to = cleaned_data.get('date_to') or date_from
 
         if start_time and end_time and start_time >= end_time:
             raise forms.ValidationError('Время начала должно быть раньше времени окончания')
 
+        if date_from and date_to:
+            if date_to < date_from:
+                raise forms.ValidationError('Дата окончания должна быть не раньше даты начала')
+            if (date_to - date_from).days >= MAX_RANGE_DAYS:
+                raise forms.ValidationError(f'Диапазон не может быть длиннее {MAX_RANGE_DAYS} дней')
+            cleaned_data['days'] = range_days(date_from, date_to, set(cleaned_data.get('weekdays') or []))
+            if not cleaned_data['days']:
+                raise forms.ValidationError('В выбранном диапазоне нет отмеченных дней недели')
+
         return cleaned_data
 
     def generate_slots(self, owner):
-        """Generate slots based on form data."""
-        from .models import ScheduleSlot
-        from django.utils import timezone
-
-        date = self.cleaned_data['date']
-        start_time = self.cleaned_data['start_time']
-        end_time = self.cleaned_data['end_time']
-        duration = self.cleaned_data['slot_duration']
-
-        slots = []
-        current_start = datetime.combine(date, start_time)
-        day_end = datetime.combine(date, end_time)
-
-        # Make timezone-aware
-        current_start = timezone.make_aware(current_start)
-        day_end = timezone.make_aware(day_end)
-
-        while current_start + timedelta(minutes=duration) <= day_end:
-            current_end = current_start + timedelta(minutes=duration)
-            slot = ScheduleSlot(
-                owner=owner,
-                start_at=current_start,
-                end_at=current_end,
-                status=ScheduleSlot.Status.AVAILABLE
+        """Create slots that do not overlap existing ones; return ``GeneratedSlots``."""
+        return generate_slots(
+            owner,
+            self.cleaned_data['days'],
+            self.cleaned_data['start_time'],
+            self.cleaned_data['end_time'],
+            self.cleaned_data['slot_duration']
+        )
+
+
+class WorkingHoursForm(forms.ModelForm):
+    """Weekly working interval."""
+
+    class Meta:
+        model = WorkingHours
+        fields = ['weekday', 'start_time', 'end_time', 'slot_minutes']
+        widgets = {
+            'weekday': forms.Select(attrs={'class': 'form-select'}),
+            'start_time': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
+            'end_time': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
+            'slot_minutes': forms.NumberInput(attrs={'class': 'form-control', 'min': 15, 'max': 480}),
+        }
+
+    def __init__(self, *args, owner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.owner = owner
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_time = cleaned_data.get('start_time')
+        end_time = cleaned_data.get('end_time')
+        weekday = cleaned_data.get('weekday')
+
+        if start_time and end_time and start_time >= end_time:
+            raise forms.ValidationError('Время начала должно быть раньше времени окончания')
+
+        if start_time and end_time and weekday is not None and self.owner is not None:
+            overlapping = self.owner.working_hours.filter(
+                weekday=weekday, start_time__lt=end_time, end_time__gt=start_time
             )
-            slots.append(slot)
-            current_start = current_end
+            if overlapping.exists():
+                raise forms.ValidationError('Интервал пересекается с уже заданными рабочими часами')
+
+        return cleaned_data
+
+
+class ScheduleExceptionForm(forms.ModelForm):
+    """Day off or special hours on one date."""
+
+    class Meta:
+        model = ScheduleException
+        fields = ['date', 'start_time', 'end_time', 'slot_minutes']
+        widgets = {
+            'date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+            'start_time': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
+            'end_time': forms.TimeInput(attrs={'class': 'form-control', 'type': 'time'}),
+            'slot_minutes': forms.NumberInput(attrs={'class': 'form-control', 'min': 15, 'max': 480}),
+        }
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_time = cleaned_data.get('start_time')
+        end_time = cleaned_data.get('end_time')
 
-        ScheduleSlot.objects.bulk_create(slots)
-        return len(slots)
+        if (start_time is None) != (end_time is None):
+            raise forms.ValidationError('Укажите и начало, и конец, или оставьте оба пустыми для выходного')
+        if start_time and end_time and start_time >= end_time:
+            raise forms.ValidationError('Время начала должно быть раньше времени окончания')
+
+        return cleaned_data
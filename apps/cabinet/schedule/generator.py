@@ -0,0 +1,103 @@
+"""Bulk generation of manual slots over a date range.
+
+Existing slots of the whole range are read in one query and merged into busy
+intervals; candidates overlapping them are skipped and reported, the rest go
+in with batched ``bulk_create``. An insert racing past this check is rejected
+by the ``slot_owner_no_overlap`` guard (migration 0010), and the plan is
+rebuilt against the fresh state.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from .models import ScheduleSlot
+from .rules import busy_intervals
+from .summary import refresh_master_availability
+
+GENERATE_BATCH_SIZE = 500
+
+GENERATE_RETRY_ATTEMPTS = 3
+
+# Longest range a single submit may cover
+MAX_RANGE_DAYS = 92
+
+GeneratedSlots = namedtuple('GeneratedSlots', ['created', 'skipped'])
+
+
+def range_days(date_from, date_to, weekdays=None):
+    """Return dates in [date_from, date_to] falling on ``weekdays`` (0 = Monday; all days if empty)."""
+    days = []
+    day = date_from
+    while day <= date_to:
+        if not weekdays or day.weekday() in weekdays:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def plan_slots(owner_id, days, start_time, end_time, minutes):
+    """Cut start_time..end_time of every day into unsaved slots of ``minutes``."""
+    step = timedelta(minutes=minutes)
+    slots = []
+    for day in days:
+        slot_start = timezone.make_aware(datetime.combine(day, start_time))
+        day_end = timezone.make_aware(datetime.combine(day, end_time))
+        while slot_start + step <= day_end:
+            slots.append(ScheduleSlot(
+                owner_id=owner_id,
+                start_at=slot_start,
+                end_at=slot_start + step,
+                start_date=day,
+                status=ScheduleSlot.Status.AVAILABLE
+            ))
+            slot_start += step
+    return slots
+
+
+def split_overlapping(candidates, busy):
+    """Split sorted candidates into ``(free, overlapping)`` against sorted disjoint ``busy`` intervals."""
+    free, overlapping = [], []
+    k = 0
+    for slot in candidates:
+        while k < len(busy) and busy[k][1] <= slot.start_at:
+            k += 1
+        if k < len(busy) and busy[k][0] < slot.end_at:
+            overlapping.append(slot)
+        else:
+            free.append(slot)
+    return free, overlapping
+
+
+def generate_slots(owner, days, start_time, end_time, minutes):
+    """Create the planned slots that do not overlap existing ones; return ``GeneratedSlots``."""
+    if not days:
+        return GeneratedSlots(0, [])
+    for attempt in range(1, GENERATE_RETRY_ATTEMPTS + 1):
+        candidates = plan_slots(owner.pk, days, start_time, end_time, minutes)
+        if not candidates:
+            return GeneratedSlots(0, [])
+        try:
+            with transaction.atomic():
+                # Slots are shorter than a day, so a day's margin catches every overlap
+                existing = (
+                    ScheduleSlot.objects
+                    .filter(
+                        owner=owner,
+                        start_date__gte=days[0] - timedelta(days=1),
+                        start_date__lte=days[-1],
+                        start_at__lt=candidates[-1].end_at,
+                    )
+                    .order_by('start_at')
+                    .only('start_at', 'end_at')
+                )
+                free, skipped = split_overlapping(candidates, busy_intervals(existing))
+                ScheduleSlot.objects.bulk_create(free, batch_size=GENERATE_BATCH_SIZE)
+            break
+        except IntegrityError:
+            # Someone inserted into the range meanwhile; plan again against the new rows
+            if attempt == GENERATE_RETRY_ATTEMPTS:
+                raise
+    refresh_master_availability(owner.pk)
+    return GeneratedSlots(len(free), skipped)
@@ -0,0 +1,112 @@
+"""Short-lived slot holds kept in the cache while a visitor fills in the booking form.
+
+A hold marks every slot of the run covering the chosen service with the
+visitor's token under ``slot_hold:<owner id>:<start timestamp>``, which also
+names working-hours slots that have no row yet. Entries expire on their own
+after ``HOLD_TTL`` seconds, so nothing is written to the database and
+abandoned forms need no cleanup. ``cache.add`` makes taking a slot atomic;
+across several processes the cache backend must be shared (Redis, Memcached).
+
+Placing or releasing a hold bumps a per-master holds version, so cached
+storefront fragments that hide held slots can key on it.
+"""
+import time
+import uuid
+
+from django.core.cache import cache
+
+# Seconds a run of slots stays reserved after the booking form is opened
+HOLD_TTL = 300
+
+HOLD_COOKIE = 'booking_hold'
+
+SLOT_HELD_MESSAGE = 'Это время сейчас оформляет другой клиент. Пожалуйста, выберите другое время.'
+
+
+def new_hold_token():
+    return uuid.uuid4().hex
+
+
+def slot_hold_key(slot):
+    return f'slot_hold:{slot.owner_id}:{int(slot.start_at.timestamp())}'
+
+
+def _token_key(token):
+    return f'slot_hold_token:{token}'
+
+
+def _version_key(owner_id):
+    return f'slot_hold_version:{owner_id}'
+
+
+def _owner_of(key):
+    return key.split(':')[1]
+
+
+def holds_version(owner_id):
+    """Return a value that changes whenever a hold on the master's slots is placed or released."""
+    return cache.get(_version_key(owner_id), 0)
+
+
+def _bump_holds_version(owner_ids):
+    for owner_id in owner_ids:
+        try:
+            cache.incr(_version_key(owner_id))
+        except ValueError:
+            # Missing or evicted: restart from a value no earlier counter can have reached
+            cache.add(_version_key(owner_id), time.time_ns(), None)
+
+
+def token_holds_for(token, owner_id):
+    """Return True if ``token`` currently holds any slot of the master."""
+    if not token:
+        return False
+    prefix = f'slot_hold:{owner_id}:'
+    return any(key.startswith(prefix) for key in cache.get(_token_key(token)) or [])
+
+
+def held_slots(slots, exclude_token=None):
+    """Return the slots held by anyone other than ``exclude_token``."""
+    keys = {slot_hold_key(slot): slot for slot in slots}
+    if not keys:
+        return []
+    holders = cache.get_many(keys)
+    return [keys[key] for key, token in holders.items() if token != exclude_token]
+
+
+def place_hold(slots, token, ttl=HOLD_TTL):
+    """Hold ``slots`` for ``token``; return False if another visitor holds any of them.
+
+    A token holds one run at a time: on success its previous hold is released.
+    """
+    previous = set(cache.get(_token_key(token)) or [])
+    keys = [slot_hold_key(slot) for slot in slots]
+    added = []
+    for key in keys:
+        if cache.add(key, token, ttl):
+            added.append(key)
+        elif cache.get(key) != token:
+            cache.delete_many(added)
+            return False
+    # Extend slots this token already held and drop the ones it no longer needs
+    cache.set_many({key: token for key in keys}, ttl)
+    cache.set(_token_key(token), keys, ttl)
+    _release_keys(previous - set(keys), token)
+    _bump_holds_version({_owner_of(key) for key in previous | set(keys)})
+    return True
+
+
+def _release_keys(keys, token):
+    if keys:
+        owned = [key for key, holder in cache.get_many(keys).items() if holder == token]
+        cache.delete_many(owned)
+
+
+def release_hold(token):
+    """Drop whatever ``token`` currently holds."""
+    if not token:
+        return
+    keys = cache.get(_token_key(token)) or []
+    _release_keys(keys, token)
+    cache.delete(_token_key(token))
+    _bump_holds_version({_owner_of(key) for key in keys})
@@ -0,0 +1,45 @@
+"""Consistency checks between slots and the bookings that hold them.
+
+A slot references at most one booking, so double claims are impossible by
+construction; what can still drift is the slot status versus that reference.
+"""
+from django.db.models import F
+
+from .models import ScheduleSlot, Booking
+
+
+def orphan_booked_slots(owner=None):
+    """Return ids of BOOKED slots that no active booking holds."""
+    slots = ScheduleSlot.objects.filter(status=ScheduleSlot.Status.BOOKED)
+    if owner is not None:
+        slots = slots.filter(owner=owner)
+    return list(slots.exclude(booking__status=Booking.Status.CREATED).values_list('pk', flat=True))
+
+
+def stale_linked_slots(owner=None):
+    """Return ids of slots pointing at a booking although they are not BOOKED by an active one."""
+    slots = ScheduleSlot.objects.filter(booking__isnull=False)
+    if owner is not None:
+        slots = slots.filter(owner=owner)
+    return list(
+        slots.exclude(status=ScheduleSlot.Status.BOOKED, booking__status=Booking.Status.CREATED)
+        .values_list('pk', flat=True)
+    )
+
+
+def unheld_start_slots(owner=None):
+    """Return ids of active bookings whose start slot is not held by them."""
+    bookings = Booking.objects.filter(status=Booking.Status.CREATED)
+    if owner is not None:
+        bookings = bookings.filter(owner=owner)
+    return list(bookings.exclude(slot__booking=F('pk')).values_list('pk', flat=True))
+
+
+def check_booking_invariants(owner=None):
+    """Return ``{problem: [ids]}`` for every violated invariant (empty if consistent)."""
+    problems = {
+        'orphan_booked': orphan_booked_slots(owner),
+        'stale_linked': stale_linked_slots(owner),
+        'unheld_start': unheld_start_slots(owner),
+    }
+    return {name: ids for name, ids in problems.items() if ids}
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from schedule.archive import archive_history, ARCHIVE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete past free slots and move old bookings with their slots to the archive tables '
+        '(run periodically, e.g. nightly from cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Archive bookings older than this many days (default: SCHEDULE_ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = archive_history(days=options['days'], batch_size=options['batch_size'])
+        rows = result.deleted_slots + result.archived_bookings + result.archived_slots
+        rate = rows / result.elapsed if result.elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {result.deleted_slots} past free slots, archived {result.archived_bookings} bookings '
+            f'and {result.archived_slots} slots in {result.elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
@@ -0,0 +1,75 @@
+import timeit
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from schedule.availability import bookable_starts
+
+
+class _Slot:
+    __slots__ = ('start_at', 'end_at')
+
+    def __init__(self, start_at, end_at):
+        self.start_at = start_at
+        self.end_at = end_at
+
+
+def legacy_filter_bookable_slots(slots, slots_needed):
+    """Previous MasterSlotsView._filter_bookable_slots, kept for comparison."""
+    if slots_needed <= 1:
+        return slots
+
+    bookable = []
+    for i, slot in enumerate(slots):
+        consecutive = 1
+        for j in range(i + 1, min(i + slots_needed, len(slots))):
+            if slots[j].start_at == slots[j - 1].end_at:
+                consecutive += 1
+            else:
+                break
+        if consecutive >= slots_needed:
+            bookable.append(slot)
+    return bookable
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark bookable start computation: legacy nested loop vs sliding window'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=14)
+        parser.add_argument('--slot-minutes', type=int, default=5)
+        parser.add_argument('--day-start', type=int, default=9, help='Working day start hour')
+        parser.add_argument('--day-end', type=int, default=21, help='Working day end hour')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--durations', type=int, nargs='+', default=[30, 60, 120, 240],
+            help='Service durations in minutes'
+        )
+
+    def handle(self, *args, **options):
+        step = timedelta(minutes=options['slot_minutes'])
+        today = timezone.localdate()
+        slots = []
+        for day in range(options['days']):
+            date = today + timedelta(days=day)
+            start = timezone.make_aware(datetime.combine(date, time(options['day_start'])))
+            day_end = timezone.make_aware(datetime.combine(date, time(options['day_end'])))
+            while start + step <= day_end:
+                slots.append(_Slot(start, start + step))
+                start += step
+
+        self.stdout.write(f'{len(slots)} slots of {options["slot_minutes"]} min over {options["days"]} days')
+        repeat = options['repeat']
+        for duration in options['durations']:
+            slots_needed = max(1, -(-duration // options['slot_minutes']))
+            legacy = timeit.timeit(
+                lambda: legacy_filter_bookable_slots(slots, slots_needed), number=repeat
+            ) / repeat
+            window = timeit.timeit(lambda: bookable_starts(slots, duration), number=repeat) / repeat
+            if len(legacy_filter_bookable_slots(slots, slots_needed)) != len(bookable_starts(slots, duration)):
+                raise CommandError(f'Implementations disagree for {duration} min')
+            self.stdout.write(
+                f'{duration:>4} min: legacy {legacy * 1000:8.2f} ms, '
+                f'sliding window {window * 1000:8.2f} ms, speedup x{legacy / window:.1f}'
+            )
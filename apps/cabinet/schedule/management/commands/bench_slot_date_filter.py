@@ -0,0 +1,110 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from accounts.models import User
+from schedule.models import ScheduleSlot
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark date-window slot queries: start_at__date (per-row timezone conversion) '
+        'vs the indexed start_date column. Creates temporary masters and slots in the '
+        'configured database and removes them afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slots', type=int, default=1_000_000, help='Total slots to generate')
+        parser.add_argument('--masters', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--keep', action='store_true', help='Keep generated data')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        masters = [
+            User.objects.create_user(
+                email=f'bench-{tag}-{i}@bench.local', username=f'bench-{tag}-{i}',
+                password=None, role=User.Role.MASTER
+            )
+            for i in range(options['masters'])
+        ]
+        try:
+            self._populate(masters, options['slots'])
+            self._run(masters[0], options['repeat'])
+        finally:
+            if not options['keep']:
+                self._cleanup(masters)
+
+    def _populate(self, masters, total):
+        per_master = total // len(masters)
+        # Spread each master's slots over a year around today, 30 minute slots 09:00-21:00
+        start_day = timezone.localdate() - timedelta(days=180)
+        started = time.monotonic()
+        for master in masters:
+            batch = []
+            day, slot_index = 0, 0
+            for _ in range(per_master):
+                date = start_day + timedelta(days=day)
+                start = timezone.make_aware(datetime(date.year, date.month, date.day, 9)) + timedelta(
+                    minutes=30 * slot_index
+                )
+                batch.append(ScheduleSlot(
+                    owner=master,
+                    start_at=start,
+                    end_at=start + timedelta(minutes=30),
+                    start_date=date,
+                ))
+                slot_index += 1
+                if slot_index == 24:
+                    day, slot_index = day + 1, 0
+            with transaction.atomic():
+                ScheduleSlot.objects.bulk_create(batch, batch_size=2000)
+        self.stdout.write(f'Generated {per_master * len(masters)} slots in {time.monotonic() - started:.1f}s')
+
+    def _time(self, label, queryset_factory, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = queryset_factory()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        self.stdout.write(f'  {label:<10} median {timings[len(timings) // 2] * 1000:9.2f} ms  (rows: {result})')
+
+    def _run(self, master, repeat):
+        today = timezone.localdate()
+        window_end = today + timedelta(days=14)
+        now = timezone.now()
+        available = ScheduleSlot.objects.filter(status=ScheduleSlot.Status.AVAILABLE, start_at__gte=now)
+        cases = [
+            (
+                'Cabinet slot list (one master, 14 days)',
+                lambda: ScheduleSlot.objects.filter(
+                    owner=master, start_at__date__gte=today, start_at__date__lte=window_end
+                ).count(),
+                lambda: ScheduleSlot.objects.filter(
+                    owner=master, start_date__gte=today, start_date__lte=window_end
+                ).count(),
+            ),
+            (
+                'Storefront window (all masters)',
+                lambda: available.filter(start_at__date__lte=window_end).values('owner_id').distinct().count(),
+                lambda: available.filter(start_date__lte=window_end).values('owner_id').distinct().count(),
+            ),
+        ]
+        self.stdout.write(f'Database vendor: {connection.vendor}')
+        for title, legacy, indexed in cases:
+            self.stdout.write(title)
+            self._time('__date', legacy, repeat)
+            self._time('start_date', indexed, repeat)
+
+    def _cleanup(self, masters):
+        ids = [m.pk for m in masters]
+        # Raw delete: collecting a million slots through the ORM would load them all
+        placeholders = ', '.join(['%s'] * len(ids))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM schedule_slots WHERE owner_id IN ({placeholders})', ids)
+        User.objects.filter(pk__in=ids).delete()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from schedule.booking import purge_expired_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired booking idempotency keys (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        removed = purge_expired_idempotency_keys(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired idempotency keys'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from schedule.summary import rebuild_all_availability, stale_availability_owners
+
+
+class Command(BaseCommand):
+    help = 'Rebuild master availability summaries (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--owner', type=int, action='append', dest='owners',
+            help='Rebuild only this master (user id); may be repeated'
+        )
+        parser.add_argument(
+            '--stale', action='store_true',
+            help='Rebuild only summaries outdated by the clock (first free time passed, or a new day)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        owner_ids = options['owners']
+        if options['stale']:
+            owner_ids = sorted(set(owner_ids or []) | set(stale_availability_owners()))
+        count = rebuild_all_availability(owner_ids=owner_ids)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt availability for {count} masters in {elapsed:.2f}s'
+        ))
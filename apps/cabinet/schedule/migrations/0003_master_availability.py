@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-16 22:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schedule', '0002_booking_booked_slots_alter_booking_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('has_availability', models.BooleanField(default=False, verbose_name='Есть свободное время')),
+                ('next_available_at', models.DateTimeField(blank=True, null=True, verbose_name='Ближайший свободный слот')),
+                ('last_available_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний свободный слот')),
+                ('day_counts', models.JSONField(blank=True, default=dict, verbose_name='Свободных слотов по дням')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to=settings.AUTH_USER_MODEL, verbose_name='Мастер')),
+            ],
+            options={
+                'verbose_name': 'Доступность мастера',
+                'verbose_name_plural': 'Доступность мастеров',
+                'db_table': 'master_availability',
+                'indexes': [models.Index(fields=['has_availability', 'next_available_at'], name='availability_next_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0003_master_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='masteravailability',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия расписания'),
+        ),
+    ]
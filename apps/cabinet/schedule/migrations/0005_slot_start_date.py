@@ -0,0 +1,38 @@
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_start_date(apps, schema_editor):
+    ScheduleSlot = apps.get_model('schedule', 'ScheduleSlot')
+    last_pk = 0
+    while True:
+        batch = list(
+            ScheduleSlot.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'start_at')[:2000]
+        )
+        if not batch:
+            break
+        for slot in batch:
+            slot.start_date = timezone.localdate(slot.start_at)
+        ScheduleSlot.objects.bulk_update(batch, ['start_date'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0004_availability_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduleslot',
+            name='start_date',
+            field=models.DateField(editable=False, null=True, verbose_name='Дата'),
+        ),
+        migrations.RunPython(backfill_start_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='scheduleslot',
+            name='start_date',
+            field=models.DateField(db_index=True, editable=False, verbose_name='Дата'),
+        ),
+    ]
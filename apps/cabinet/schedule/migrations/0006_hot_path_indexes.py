@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0005_slot_start_date'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='masteravailability',
+            name='availability_next_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['owner', '-created_at'], name='booking_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['owner', 'status', '-created_at'], name='booking_owner_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='masteravailability',
+            index=models.Index(fields=['last_available_at'], name='availability_last_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleslot',
+            index=models.Index(fields=['owner', 'status', 'start_at'], name='slot_owner_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleslot',
+            index=models.Index(fields=['owner', 'start_date', 'start_at'], name='slot_owner_date_idx'),
+        ),
+    ]
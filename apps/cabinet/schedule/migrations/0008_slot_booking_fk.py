@@ -0,0 +1,74 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_slots_to_bookings(apps, schema_editor):
+    """Copy active bookings' M2M links (and start slots) into ScheduleSlot.booking."""
+    Booking = apps.get_model('schedule', 'Booking')
+    ScheduleSlot = apps.get_model('schedule', 'ScheduleSlot')
+    Through = Booking.booked_slots.through
+    last_pk = 0
+    while True:
+        batch = list(
+            Booking.objects.filter(pk__gt=last_pk, status='CREATED').order_by('pk').values_list('pk', 'slot_id')[:500]
+        )
+        if not batch:
+            break
+        slot_ids = {booking_id: {slot_id} for booking_id, slot_id in batch}
+        links = Through.objects.filter(booking_id__in=slot_ids).values_list('booking_id', 'scheduleslot_id')
+        for booking_id, slot_id in links:
+            slot_ids[booking_id].add(slot_id)
+        for booking_id, ids in slot_ids.items():
+            ScheduleSlot.objects.filter(pk__in=ids).update(booking_id=booking_id)
+        last_pk = batch[-1][0]
+
+
+def unlink_slots(apps, schema_editor):
+    """Rebuild the M2M rows from ScheduleSlot.booking."""
+    Booking = apps.get_model('schedule', 'Booking')
+    ScheduleSlot = apps.get_model('schedule', 'ScheduleSlot')
+    Through = Booking.booked_slots.through
+    last_pk = 0
+    while True:
+        batch = list(
+            ScheduleSlot.objects.filter(pk__gt=last_pk, booking__isnull=False)
+            .order_by('pk').values_list('pk', 'booking_id')[:2000]
+        )
+        if not batch:
+            break
+        Through.objects.bulk_create(
+            [Through(booking_id=booking_id, scheduleslot_id=slot_id) for slot_id, booking_id in batch],
+            ignore_conflicts=True
+        )
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0007_booking_idempotency_key'),
+    ]
+
+    operations = [
+        # Free the "booking" name on ScheduleSlot before adding the field
+        migrations.AlterField(
+            model_name='booking',
+            name='slot',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='start_bookings', to='schedule.scheduleslot', verbose_name='Начальный слот'),
+        ),
+        migrations.AddField(
+            model_name='scheduleslot',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booked_slots_fk', to='schedule.booking', verbose_name='Запись'),
+        ),
+        migrations.RunPython(link_slots_to_bookings, unlink_slots),
+        migrations.RemoveField(
+            model_name='booking',
+            name='booked_slots',
+        ),
+        migrations.AlterField(
+            model_name='scheduleslot',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booked_slots', to='schedule.booking', verbose_name='Запись'),
+        ),
+    ]
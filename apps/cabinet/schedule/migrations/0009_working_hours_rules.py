@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schedule', '0008_slot_booking_fk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='Начало')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='Конец')),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30, verbose_name='Длительность слота (мин)')),
+            ],
+            options={
+                'verbose_name': 'Исключение в расписании',
+                'verbose_name_plural': 'Исключения в расписании',
+                'db_table': 'schedule_exceptions',
+                'ordering': ['date', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')], verbose_name='День недели')),
+                ('start_time', models.TimeField(verbose_name='Начало')),
+                ('end_time', models.TimeField(verbose_name='Конец')),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30, verbose_name='Длительность слота (мин)')),
+            ],
+            options={
+                'verbose_name': 'Рабочие часы',
+                'verbose_name_plural': 'Рабочие часы',
+                'db_table': 'working_hours',
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='scheduleslot',
+            name='source',
+            field=models.CharField(choices=[('MANUAL', 'Создан вручную'), ('RULE', 'По рабочим часам')], default='MANUAL', max_length=10, verbose_name='Источник'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleslot',
+            constraint=models.UniqueConstraint(condition=models.Q(('source', 'RULE')), fields=('owner', 'start_at'), name='slot_rule_owner_start_uniq'),
+        ),
+        migrations.AddField(
+            model_name='workinghours',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to=settings.AUTH_USER_MODEL, verbose_name='Мастер'),
+        ),
+        migrations.AddField(
+            model_name='scheduleexception',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to=settings.AUTH_USER_MODEL, verbose_name='Мастер'),
+        ),
+        migrations.AddIndex(
+            model_name='workinghours',
+            index=models.Index(fields=['owner', 'weekday'], name='hours_owner_weekday_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleexception',
+            index=models.Index(fields=['owner', 'date'], name='exception_owner_date_idx'),
+        ),
+    ]
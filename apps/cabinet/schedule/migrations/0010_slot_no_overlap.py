@@ -0,0 +1,116 @@
+from django.db import migrations
+from django.db.models import Exists, OuterRef
+
+
+# SQLite has a single writer, so a BEFORE trigger sees every committed row.
+# Slots are shorter than a day: the start_date window keeps the lookup on slot_owner_date_idx.
+SQLITE_OVERLAP_CHECK = """
+    SELECT 1 FROM schedule_slots
+    WHERE owner_id = NEW.owner_id
+      AND start_date BETWEEN date(NEW.start_date, '-1 day') AND date(NEW.start_date, '+1 day')
+      AND start_at < NEW.end_at AND end_at > NEW.start_at
+"""
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER slot_owner_no_overlap_insert
+    BEFORE INSERT ON schedule_slots
+    WHEN EXISTS ({SQLITE_OVERLAP_CHECK})
+    BEGIN
+        SELECT RAISE(ABORT, 'slot_owner_no_overlap');
+    END
+    """,
+    f"""
+    CREATE TRIGGER slot_owner_no_overlap_update
+    BEFORE UPDATE OF owner_id, start_at, end_at, start_date ON schedule_slots
+    WHEN EXISTS ({SQLITE_OVERLAP_CHECK} AND id != NEW.id)
+    BEGIN
+        SELECT RAISE(ABORT, 'slot_owner_no_overlap');
+    END
+    """,
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS slot_owner_no_overlap_insert',
+    'DROP TRIGGER IF EXISTS slot_owner_no_overlap_update',
+]
+
+# Concurrent transactions do not see each other's rows, so PostgreSQL needs an exclusion constraint
+POSTGRES_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    """
+    ALTER TABLE schedule_slots ADD CONSTRAINT slot_owner_no_overlap
+    EXCLUDE USING gist (owner_id WITH =, tstzrange(start_at, end_at) WITH &&)
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    'ALTER TABLE schedule_slots DROP CONSTRAINT IF EXISTS slot_owner_no_overlap',
+]
+
+
+def drop_overlapping_free_slots(apps, schema_editor):
+    """Delete free, unlinked slots that overlap another slot of the same master (double submits).
+
+    A slot that is some booking's start slot is never free here: deleting it would cascade
+    to that booking, cancelled ones included. Overlaps between slots that are all in use
+    cannot be resolved without losing bookings, so they stop the migration with a list.
+    """
+    ScheduleSlot = apps.get_model('schedule', 'ScheduleSlot')
+    Booking = apps.get_model('schedule', 'Booking')
+    rows = (
+        ScheduleSlot.objects.order_by('owner_id', 'start_at', 'pk')
+        .annotate(anchors=Exists(Booking.objects.filter(slot_id=OuterRef('pk'))))
+        .values_list('pk', 'owner_id', 'start_at', 'end_at', 'status', 'booking_id', 'anchors')
+        .iterator(chunk_size=2000)
+    )
+    doomed, conflicts = [], []
+    last = None  # (pk, owner_id, end_at, free) of the last kept slot
+    for pk, owner_id, start_at, end_at, status, booking_id, anchors in rows:
+        free = status == 'AVAILABLE' and booking_id is None and not anchors
+        if last is None or last[1] != owner_id or start_at >= last[2]:
+            last = (pk, owner_id, end_at, free)
+        elif free:
+            doomed.append(pk)
+        elif last[3]:
+            # A booked, blocked or booking-anchoring slot wins over the free one it overlaps
+            doomed.append(last[0])
+            last = (pk, owner_id, end_at, free)
+        else:
+            conflicts.append((last[0], pk))
+            last = (pk, owner_id, max(last[2], end_at), free)
+    if conflicts:
+        pairs = ', '.join(f'{a}/{b}' for a, b in conflicts[:20])
+        raise RuntimeError(
+            f'{len(conflicts)} pairs of overlapping slots are both in use (slot ids: {pairs}'
+            f'{", ..." if len(conflicts) > 20 else ""}). Move or delete one slot of each pair '
+            'and run the migration again.'
+        )
+    for i in range(0, len(doomed), 500):
+        ScheduleSlot.objects.filter(pk__in=doomed[i:i + 500]).delete()
+
+
+def add_overlap_guard(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_overlap_guard(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0009_working_hours_rules'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_overlapping_free_slots, migrations.RunPython.noop),
+        migrations.RunPython(add_overlap_guard, drop_overlap_guard),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-16 23:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('masters', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schedule', '0010_slot_no_overlap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('service_name', models.CharField(max_length=200, verbose_name='Название услуги')),
+                ('start_at', models.DateTimeField(verbose_name='Начало')),
+                ('end_at', models.DateTimeField(verbose_name='Конец')),
+                ('client_name', models.CharField(max_length=100, verbose_name='Имя клиента')),
+                ('client_phone', models.CharField(max_length=20, verbose_name='Телефон клиента')),
+                ('notes', models.TextField(blank=True, verbose_name='Комментарий')),
+                ('status', models.CharField(choices=[('CREATED', 'Создана'), ('CANCELLED', 'Отменена')], max_length=10, verbose_name='Статус')),
+                ('created_at', models.DateTimeField(verbose_name='Создана')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Перенесена в архив')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL, verbose_name='Мастер')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to='masters.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Архивная запись',
+                'verbose_name_plural': 'Архив записей',
+                'db_table': 'bookings_archive',
+                'ordering': ['-start_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSlot',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_at', models.DateTimeField(verbose_name='Начало')),
+                ('end_at', models.DateTimeField(verbose_name='Конец')),
+                ('start_date', models.DateField(verbose_name='Дата')),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Доступен'), ('BOOKED', 'Забронирован'), ('BLOCKED', 'Заблокирован')], max_length=10, verbose_name='Статус')),
+                ('source', models.CharField(choices=[('MANUAL', 'Создан вручную'), ('RULE', 'По рабочим часам')], max_length=10, verbose_name='Источник')),
+                ('booking', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slots', to='schedule.archivedbooking', verbose_name='Запись')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_slots', to=settings.AUTH_USER_MODEL, verbose_name='Мастер')),
+            ],
+            options={
+                'verbose_name': 'Архивный слот',
+                'verbose_name_plural': 'Архив слотов',
+                'db_table': 'schedule_slots_archive',
+                'ordering': ['start_at'],
+                'indexes': [models.Index(fields=['owner', 'start_date'], name='archive_slot_owner_date_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedbooking',
+            index=models.Index(fields=['owner', '-start_at'], name='archive_booking_owner_idx'),
+        ),
+    ]
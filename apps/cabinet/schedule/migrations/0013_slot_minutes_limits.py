@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:02
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0012_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scheduleexception',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(15), django.core.validators.MaxValueValidator(480)], verbose_name='Длительность слота (мин)'),
+        ),
+        migrations.AlterField(
+            model_name='workinghours',
+            name='slot_minutes',
+            field=models.PositiveSmallIntegerField(default=30, validators=[django.core.validators.MinValueValidator(15), django.core.validators.MaxValueValidator(480)], verbose_name='Длительность слота (мин)'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def backfill_owner(apps, schema_editor):
+    BookingIdempotencyKey = apps.get_model('schedule', 'BookingIdempotencyKey')
+    Booking = apps.get_model('schedule', 'Booking')
+    BookingIdempotencyKey.objects.update(
+        owner_id=Subquery(Booking.objects.filter(pk=OuterRef('booking_id')).values('owner_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('schedule', '0013_slot_minutes_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bookingidempotencykey',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='booking_idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='Мастер'),
+        ),
+        migrations.RunPython(backfill_owner, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='bookingidempotencykey',
+            name='owner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='Мастер'),
+        ),
+        migrations.AlterField(
+            model_name='bookingidempotencykey',
+            name='key',
+            field=models.CharField(max_length=64, verbose_name='Ключ'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookingidempotencykey',
+            constraint=models.UniqueConstraint(fields=('owner', 'key'), name='idempotency_owner_key_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:06
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schedule', '0014_idempotency_key_per_owner'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='masteravailability',
+            name='version',
+        ),
+    ]
@@ -1,5 +1,7 @@
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 
 class ScheduleSlot(models.Model):
@@ -10,6 +12,10 @@ class ScheduleSlot(models.Model):
         BOOKED = 'BOOKED', 'Забронирован'
         BLOCKED = 'BLOCKED', 'Заблокирован'
 
+    class Source(models.TextChoices):
+        MANUAL = 'MANUAL', 'Создан вручную'
+        RULE = 'RULE', 'По рабочим часам'
+
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -18,22 +24,60 @@ class ScheduleSlot(models.Model):
     )
     start_at = models.DateTimeField('Начало')
     end_at = models.DateTimeField('Конец')
+    # Local (TIME_ZONE) date of start_at, stored so date filters can use an index
+    start_date = models.DateField('Дата', db_index=True, editable=False)
     status = models.CharField(
         'Статус',
         max_length=10,
         choices=Status.choices,
         default=Status.AVAILABLE
     )
+    # RULE slots are stored only once booked from working hours (see rules.py)
+    source = models.CharField(
+        'Источник',
+        max_length=10,
+        choices=Source.choices,
+        default=Source.MANUAL
+    )
+    # Active booking holding this slot (every slot of a multi-slot booking points here)
+    booking = models.ForeignKey(
+        'Booking',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='booked_slots',
+        verbose_name='Запись'
+    )
 
     class Meta:
         db_table = 'schedule_slots'
         verbose_name = 'Слот расписания'
         verbose_name_plural = 'Слоты расписания'
         ordering = ['start_at']
+        indexes = [
+            # Storefront windows, availability summary and booking candidates
+            models.Index(fields=['owner', 'status', 'start_at'], name='slot_owner_status_start_idx'),
+            # Cabinet slot list filtered by local date
+            models.Index(fields=['owner', 'start_date', 'start_at'], name='slot_owner_date_idx'),
+        ]
+        constraints = [
+            # Two bookings materializing the same working-hours slot: the second insert fails
+            models.UniqueConstraint(
+                fields=['owner', 'start_at'],
+                condition=models.Q(source='RULE'),
+                name='slot_rule_owner_start_uniq'
+            ),
+        ]
+        # Overlapping slots of one master are rejected by slot_owner_no_overlap,
+        # a trigger (SQLite) or exclusion constraint (PostgreSQL) added in migration 0010
 
     def __str__(self):
         return f"{self.start_at.strftime('%d.%m.%Y %H:%M')} - {self.end_at.strftime('%H:%M')}"
 
+    def save(self, *args, **kwargs):
+        self.start_date = timezone.localdate(self.start_at)
+        super().save(*args, **kwargs)
+
     @property
     def duration_minutes(self):
         """Return slot duration in minutes."""
@@ -43,6 +87,11 @@ class ScheduleSlot(models.Model):
     def is_available(self):
         return self.status == self.Status.AVAILABLE
 
+    @property
+    def ref(self):
+        """Storefront identifier: pk of a stored slot, ``r<timestamp>`` of a working-hours slot."""
+        return str(self.pk) if self.pk else f'r{int(self.start_at.timestamp())}'
+
 
 class Booking(models.Model):
     """Client booking."""
@@ -63,18 +112,13 @@ class Booking(models.Model):
         related_name='bookings',
         verbose_name='Услуга'
     )
-    slot = models.OneToOneField(
+    # A freed slot can be booked again, so several (cancelled) bookings may share a start slot
+    slot = models.ForeignKey(
         ScheduleSlot,
         on_delete=models.CASCADE,
-        related_name='booking',
+        related_name='start_bookings',
         verbose_name='Начальный слот'
     )
-    booked_slots = models.ManyToManyField(
-        ScheduleSlot,
-        related_name='bookings_all',
-        verbose_name='Все забронированные слоты',
-        blank=True
-    )
     client_name = models.CharField('Имя клиента', max_length=100)
     client_phone = models.CharField('Телефон клиента', max_length=20)
     notes = models.TextField('Комментарий', blank=True)
@@ -91,12 +135,233 @@ class Booking(models.Model):
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
         ordering = ['-created_at']
+        indexes = [
+            # Cabinet booking list, with and without the status filter
+            models.Index(fields=['owner', '-created_at'], name='booking_owner_created_idx'),
+            models.Index(fields=['owner', 'status', '-created_at'], name='booking_owner_status_idx'),
+            # Admin date drill-down across all masters
+            models.Index(fields=['created_at'], name='booking_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.client_name} - {self.service.name} ({self.slot.start_at.strftime('%d.%m.%Y %H:%M')})"
 
     def cancel(self):
         """Cancel booking and free all booked slots."""
+        from .summary import refresh_master_availability
+
         self.status = self.Status.CANCELLED
-        self.booked_slots.update(status=ScheduleSlot.Status.AVAILABLE)
+        self.booked_slots.update(status=ScheduleSlot.Status.AVAILABLE, booking=None)
         self.save()
+        refresh_master_availability(self.owner_id)
+
+
+class MasterAvailability(models.Model):
+    """Denormalized availability summary used by the storefront catalog."""
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='availability',
+        verbose_name='Мастер'
+    )
+    has_availability = models.BooleanField('Есть свободное время', default=False)
+    next_available_at = models.DateTimeField('Ближайший свободный слот', null=True, blank=True)
+    last_available_at = models.DateTimeField('Последний свободный слот', null=True, blank=True)
+    day_counts = models.JSONField('Свободных слотов по дням', default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'master_availability'
+        verbose_name = 'Доступность мастера'
+        verbose_name_plural = 'Доступность мастеров'
+        indexes = [
+            # Catalog: masters with a free slot at or after now
+            models.Index(fields=['last_available_at'], name='availability_last_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.owner} ({self.next_available_at or '—'})"
+
+
+class BookingIdempotencyKey(models.Model):
+    """Client-supplied key of a public booking submission, so replays return the original booking."""
+    # Keys are the client's, so they are unique per master only
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='booking_idempotency_keys',
+        verbose_name='Мастер'
+    )
+    key = models.CharField('Ключ', max_length=64)
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name='Запись'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField('Действует до', db_index=True)
+
+    class Meta:
+        db_table = 'booking_idempotency_keys'
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='idempotency_owner_key_uniq'),
+        ]
+
+    def __str__(self):
+        return self.key
+
+
+class WorkingHours(models.Model):
+    """Weekly working interval; several intervals on one weekday leave breaks between them."""
+
+    class Weekday(models.IntegerChoices):
+        MONDAY = 0, 'Понедельник'
+        TUESDAY = 1, 'Вторник'
+        WEDNESDAY = 2, 'Среда'
+        THURSDAY = 3, 'Четверг'
+        FRIDAY = 4, 'Пятница'
+        SATURDAY = 5, 'Суббота'
+        SUNDAY = 6, 'Воскресенье'
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='working_hours',
+        verbose_name='Мастер'
+    )
+    weekday = models.PositiveSmallIntegerField('День недели', choices=Weekday.choices)
+    start_time = models.TimeField('Начало')
+    end_time = models.TimeField('Конец')
+    slot_minutes = models.PositiveSmallIntegerField(
+        'Длительность слота (мин)', default=30, validators=[MinValueValidator(15), MaxValueValidator(480)]
+    )
+
+    class Meta:
+        db_table = 'working_hours'
+        verbose_name = 'Рабочие часы'
+        verbose_name_plural = 'Рабочие часы'
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['owner', 'weekday'], name='hours_owner_weekday_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.start_time:%H:%M}–{self.end_time:%H:%M}"
+
+
+class ScheduleException(models.Model):
+    """Override of the weekly hours on one date: a day off, or other hours."""
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='schedule_exceptions',
+        verbose_name='Мастер'
+    )
+    date = models.DateField('Дата')
+    # Both empty: day off
+    start_time = models.TimeField('Начало', null=True, blank=True)
+    end_time = models.TimeField('Конец', null=True, blank=True)
+    slot_minutes = models.PositiveSmallIntegerField(
+        'Длительность слота (мин)', default=30, validators=[MinValueValidator(15), MaxValueValidator(480)]
+    )
+
+    class Meta:
+        db_table = 'schedule_exceptions'
+        verbose_name = 'Исключение в расписании'
+        verbose_name_plural = 'Исключения в расписании'
+        ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(fields=['owner', 'date'], name='exception_owner_date_idx'),
+        ]
+
+    def __str__(self):
+        if self.is_day_off:
+            return f"{self.date:%d.%m.%Y}: выходной"
+        return f"{self.date:%d.%m.%Y} {self.start_time:%H:%M}–{self.end_time:%H:%M}"
+
+    @property
+    def is_day_off(self):
+        return self.start_time is None
+
+
+class ArchivedBooking(models.Model):
+    """Booking moved out of the hot table once its slot is past the retention horizon (see archive.py)."""
+    # Same id as the live booking it was moved from
+    id = models.BigIntegerField(primary_key=True)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_bookings',
+        verbose_name='Мастер'
+    )
+    service = models.ForeignKey(
+        'masters.Service',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_bookings',
+        verbose_name='Услуга'
+    )
+    # Kept so history still reads well after the service is removed
+    service_name = models.CharField('Название услуги', max_length=200)
+    start_at = models.DateTimeField('Начало')
+    end_at = models.DateTimeField('Конец')
+    client_name = models.CharField('Имя клиента', max_length=100)
+    client_phone = models.CharField('Телефон клиента', max_length=20)
+    notes = models.TextField('Комментарий', blank=True)
+    status = models.CharField('Статус', max_length=10, choices=Booking.Status.choices)
+    created_at = models.DateTimeField('Создана')
+    archived_at = models.DateTimeField('Перенесена в архив', auto_now_add=True)
+
+    class Meta:
+        db_table = 'bookings_archive'
+        verbose_name = 'Архивная запись'
+        verbose_name_plural = 'Архив записей'
+        ordering = ['-start_at']
+        indexes = [
+            models.Index(fields=['owner', '-start_at'], name='archive_booking_owner_idx'),
+            models.Index(fields=['start_at'], name='archive_booking_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.client_name} - {self.service_name} ({self.start_at.strftime('%d.%m.%Y %H:%M')})"
+
+
+class ArchivedSlot(models.Model):
+    """Slot moved to the archive together with the bookings that used it."""
+    id = models.BigIntegerField(primary_key=True)
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_slots',
+        verbose_name='Мастер'
+    )
+    booking = models.ForeignKey(
+        ArchivedBooking,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='slots',
+        verbose_name='Запись'
+    )
+    start_at = models.DateTimeField('Начало')
+    end_at = models.DateTimeField('Конец')
+    start_date = models.DateField('Дата')
+    status = models.CharField('Статус', max_length=10, choices=ScheduleSlot.Status.choices)
+    source = models.CharField('Источник', max_length=10, choices=ScheduleSlot.Source.choices)
+
+    class Meta:
+        db_table = 'schedule_slots_archive'
+        verbose_name = 'Архивный слот'
+        verbose_name_plural = 'Архив слотов'
+        ordering = ['start_at']
+        indexes = [
+            models.Index(fields=['owner', 'start_date'], name='archive_slot_owner_date_idx'),
+            models.Index(fields=['start_date'], name='archive_slot_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.start_at.strftime('%d.%m.%Y %H:%M')} - {self.end_at.strftime('%H:%M')}"
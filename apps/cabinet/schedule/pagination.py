@@ -0,0 +1,166 @@
+"""Keyset (cursor) pagination for long lists.
+
+A page is read as ``WHERE (key) > (cursor) ORDER BY key LIMIT size + 1``: the
+extra row tells whether another page follows, so there is no ``COUNT(*)`` and
+no ``OFFSET`` scan, and rows inserted or deleted before the cursor do not
+shift the pages after it. The key is the list's ordering and must end with
+the primary key so that it is unique; its fields must not be null.
+
+A cursor is the key of a page's boundary row, JSON in URL-safe base64, passed
+as ``?after=`` (next page) or ``?before=`` (previous page). A cursor that does
+not decode or does not fit the key is ignored and the first page is shown.
+"""
+import base64
+import binascii
+import json
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 50
+
+# Upper bound for ?size=
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, date) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """Return the key values in ``cursor``, or ``None`` if it is not a cursor of ``length`` values."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        return None
+    if not isinstance(values, list) or len(values) != length:
+        return None
+    if not all(isinstance(value, (str, int)) and not isinstance(value, bool) for value in values):
+        return None
+    return values
+
+
+def _key_value(obj, field):
+    for attr in ('pk' if field == 'pk' else field).split('__'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _after(ordering, values):
+    """``Q`` for rows strictly after ``values`` in ``ordering``."""
+    condition = Q()
+    for index in reversed(range(len(ordering))):
+        field = ordering[index].lstrip('-')
+        lookup = 'lt' if ordering[index].startswith('-') else 'gt'
+        equal = {ordering[i].lstrip('-'): values[i] for i in range(index)}
+        step = Q(**equal, **{f'{field}__{lookup}': values[index]})
+        condition = step if index == len(ordering) - 1 else step | condition
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+class KeysetPage:
+    """One page of rows; iterate it like a list. ``next_url``/``previous_url`` keep the other GET parameters."""
+
+    def __init__(self, items, ordering, request, prefix, has_next, has_previous):
+        self.items = items
+        self.ordering = ordering
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._request = request
+        self._prefix = prefix
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_url(self):
+        if self.has_next:
+            return self._url('after', self.items[-1])
+        return None
+
+    @property
+    def previous_url(self):
+        if self.has_previous:
+            if not self.items:
+                return self._url(None, None)
+            return self._url('before', self.items[0])
+        return None
+
+    def _url(self, direction, row):
+        query = self._request.GET.copy()
+        query.pop(f'{self._prefix}after', None)
+        query.pop(f'{self._prefix}before', None)
+        if direction is not None:
+            query[f'{self._prefix}{direction}'] = encode_cursor([_key_value(row, field.lstrip('-')) for field in self.ordering])
+        return f'?{query.urlencode()}' if query else self._request.path
+
+
+def page_size(request, default=PAGE_SIZE, prefix=''):
+    """``?size=`` clamped to ``1..MAX_PAGE_SIZE``, or ``default``."""
+    try:
+        size = int(request.GET.get(f'{prefix}size', default))
+    except ValueError:
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(request, queryset, ordering, size=PAGE_SIZE, prefix=''):
+    """Return the ``KeysetPage`` of ``queryset`` in ``ordering`` selected by the request's cursor.
+
+    ``prefix`` names the cursor parameters, so one page can paginate several lists.
+    """
+    ordering = list(ordering)
+    for direction in ('after', 'before'):
+        cursor = request.GET.get(f'{prefix}{direction}')
+        values = decode_cursor(cursor, len(ordering)) if cursor else None
+        if values is None:
+            continue
+        try:
+            if direction == 'after':
+                rows = list(queryset.filter(_after(ordering, values)).order_by(*ordering)[:size + 1])
+                return KeysetPage(rows[:size], ordering, request, prefix, len(rows) > size, True)
+            rows = list(queryset.filter(_after(_reverse(ordering), values)).order_by(*_reverse(ordering))[:size + 1])
+            return KeysetPage(rows[:size][::-1], ordering, request, prefix, True, len(rows) > size)
+        except (ValidationError, ValueError, TypeError):
+            # A value of the wrong type for its field: fall back to the first page
+            break
+
+    rows = list(queryset.order_by(*ordering)[:size + 1])
+    return KeysetPage(rows[:size], ordering, request, prefix, len(rows) > size, False)
+
+
+class KeysetPaginationMixin:
+    """``ListView`` mixin: the context object is a ``KeysetPage`` of ``keyset_ordering``, also as ``page``."""
+    keyset_ordering = ('pk',)
+    page_size = PAGE_SIZE
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def get_context_data(self, **kwargs):
+        page = keyset_page(
+            self.request, self.object_list, self.get_keyset_ordering(), size=page_size(self.request, self.page_size)
+        )
+        kwargs.setdefault('object_list', page)
+        context = super().get_context_data(**kwargs)
+        context['page'] = page
+        return context
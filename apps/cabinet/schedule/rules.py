@@ -0,0 +1,135 @@
+"""Free time computed from working-hours rules instead of stored slot rows.
+
+Weekly ``WorkingHours`` (with ``ScheduleException`` overrides per date) are
+cut into a grid of unsaved ``ScheduleSlot`` objects on every read. Stored
+slots take precedence: manual slots, blocks and booked slots hide any rule
+slot they overlap, and stored AVAILABLE slots are offered as before. A rule
+slot becomes a row only when it is booked, so storage grows with bookings,
+not with the calendar.
+
+A cancelled booking leaves its rule rows behind as AVAILABLE (the start slot
+still anchors the booking). Such a row is offered only while the current
+rules still cover it; outside them it is ignored, so a later day off or
+removed hours close it like any other rule slot.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from .models import ScheduleSlot, WorkingHours, ScheduleException
+
+
+def _aware(day, at):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def rule_intervals(owner_id, first_day, last_day):
+    """Return sorted ``(start, end, slot_minutes)`` working intervals for the dates, inclusive."""
+    weekly = {}
+    for hours in WorkingHours.objects.filter(owner_id=owner_id):
+        weekly.setdefault(hours.weekday, []).append(hours)
+    overrides = {}
+    for exception in ScheduleException.objects.filter(owner_id=owner_id, date__gte=first_day, date__lte=last_day):
+        overrides.setdefault(exception.date, []).append(exception)
+    if not weekly and not overrides:
+        return []
+
+    intervals = []
+    day = first_day
+    while day <= last_day:
+        # Any exception on a date replaces that weekday's hours; a day-off row leaves it empty
+        rules = overrides.get(day, weekly.get(day.weekday(), []))
+        for rule in rules:
+            if rule.start_time is not None and rule.start_time < rule.end_time:
+                intervals.append((_aware(day, rule.start_time), _aware(day, rule.end_time), rule.slot_minutes))
+        day += timedelta(days=1)
+    return sorted(intervals)
+
+
+def busy_intervals(stored):
+    """Merge stored slots (sorted by ``start_at``) into disjoint sorted ``(start, end)`` intervals."""
+    busy = []
+    for slot in stored:
+        if busy and slot.start_at <= busy[-1][1]:
+            busy[-1] = (busy[-1][0], max(busy[-1][1], slot.end_at))
+        else:
+            busy.append((slot.start_at, slot.end_at))
+    return busy
+
+
+def expand_intervals(owner_id, intervals, start, end, busy):
+    """Cut working intervals into unsaved rule slots starting in [start, end) outside ``busy``."""
+    slots = []
+    k = 0
+    for interval_start, interval_end, minutes in intervals:
+        if minutes <= 0:
+            # A zero step would never reach the interval end (rows saved before validation existed)
+            continue
+        step = timedelta(minutes=minutes)
+        slot_start = interval_start
+        while slot_start + step <= interval_end and slot_start < end:
+            slot_end = slot_start + step
+            while k < len(busy) and busy[k][1] <= slot_start:
+                k += 1
+            overlapped = k < len(busy) and busy[k][0] < slot_end
+            if slot_start >= start and not overlapped:
+                slots.append(ScheduleSlot(
+                    owner_id=owner_id,
+                    start_at=slot_start,
+                    end_at=slot_end,
+                    start_date=timezone.localdate(slot_start),
+                    status=ScheduleSlot.Status.AVAILABLE,
+                    source=ScheduleSlot.Source.RULE,
+                ))
+            slot_start = slot_end
+    return slots
+
+
+def _within(slot, intervals):
+    return any(start <= slot.start_at and slot.end_at <= end for start, end, _ in intervals)
+
+
+def free_slots(owner_id, start, end):
+    """Return free slots starting in [start, end): stored AVAILABLE ones plus rule slots, sorted."""
+    intervals = rule_intervals(owner_id, timezone.localdate(start), timezone.localdate(end))
+    stored = ScheduleSlot.objects.filter(owner_id=owner_id, start_at__lt=end).order_by('start_at')
+    if not intervals:
+        # No rules: only stored free slots, read through the owner/status/start index
+        return list(
+            stored.filter(status=ScheduleSlot.Status.AVAILABLE, start_at__gte=start)
+            .exclude(source=ScheduleSlot.Source.RULE)
+        )
+
+    # Slots longer than a day are not generated, so this lower bound catches every overlap
+    first_day = timezone.localdate(start) - timedelta(days=1)
+    stored = [
+        s for s in stored.filter(start_date__gte=first_day)
+        if s.status != ScheduleSlot.Status.AVAILABLE or s.source != ScheduleSlot.Source.RULE
+        or _within(s, intervals)
+    ]
+    rule_slots = expand_intervals(owner_id, intervals, start, end, busy_intervals(stored))
+    free = [s for s in stored if s.status == ScheduleSlot.Status.AVAILABLE and s.start_at >= start]
+    return sorted(free + rule_slots, key=lambda s: s.start_at)
+
+
+def parse_slot_ref(ref):
+    """Return ``(pk, None)`` for a stored slot ref, ``(None, start_at)`` for a rule slot, or None."""
+    ref = str(ref)
+    if ref.isdigit():
+        return int(ref), None
+    if ref.startswith('r') and ref[1:].isdigit():
+        return None, datetime.fromtimestamp(int(ref[1:]), tz=dt_timezone.utc)
+    return None
+
+
+def find_rule_slot(owner_id, start_at):
+    """Return the free slot starting exactly at ``start_at``, or None.
+
+    Usually an unsaved rule slot; a row left free by a cancelled booking at
+    that time is returned instead, so refs in grids rendered before it was
+    stored still resolve.
+    """
+    for slot in free_slots(owner_id, start_at, start_at + timedelta(seconds=1)):
+        if slot.start_at == start_at:
+            return slot
+    return None
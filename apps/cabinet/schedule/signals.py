@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ScheduleSlot, WorkingHours, ScheduleException
+from .summary import refresh_master_availability
+
+
+@receiver(post_save, sender=ScheduleSlot)
+def slot_saved(sender, instance, **kwargs):
+    """Keep the availability summary current for single-slot writes (admin, shell)."""
+    refresh_master_availability(instance.owner_id)
+
+
+@receiver(post_delete, sender=ScheduleSlot)
+def slot_deleted(sender, instance, origin=None, **kwargs):
+    """Refresh the summary when a slot is deleted on its own, not via cascade."""
+    if instance.end_at <= timezone.now():
+        # Past slots never count as availability (archive.py deletes them in bulk)
+        return
+    if isinstance(origin, ScheduleSlot) or getattr(origin, 'model', None) is ScheduleSlot:
+        refresh_master_availability(instance.owner_id)
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_save, sender=ScheduleException)
+def rule_saved(sender, instance, **kwargs):
+    """Working hours feed the computed availability, so any rule edit refreshes the summary."""
+    refresh_master_availability(instance.owner_id)
+
+
+@receiver(post_delete, sender=WorkingHours)
+@receiver(post_delete, sender=ScheduleException)
+def rule_deleted(sender, instance, origin=None, **kwargs):
+    """Refresh on a direct rule delete; a cascade from the master being removed needs nothing."""
+    if isinstance(origin, sender) or getattr(origin, 'model', None) is sender:
+        refresh_master_availability(instance.owner_id)
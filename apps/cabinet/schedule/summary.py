@@ -0,0 +1,75 @@
+"""Per-master availability summary kept in sync with slot and booking writes."""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from masters.versions import bump_master_version
+from .models import ScheduleSlot, MasterAvailability, WorkingHours
+from .rules import free_slots
+
+# Storefront shows availability for today plus this many days ahead
+AVAILABILITY_WINDOW_DAYS = 14
+
+
+def availability_window(now=None):
+    """Return (start, end) bounds of the storefront availability window."""
+    now = now or timezone.now()
+    last_day = timezone.localdate(now) + timedelta(days=AVAILABILITY_WINDOW_DAYS)
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+    return now, end
+
+
+def refresh_master_availability(owner_id, now=None):
+    """Recompute the availability summary row for one master and bump its data version."""
+    start, end = availability_window(now)
+    starts = [slot.start_at for slot in free_slots(owner_id, start, end)]
+
+    day_counts = Counter(timezone.localdate(s).isoformat() for s in starts)
+    fields = {
+        'has_availability': bool(starts),
+        'next_available_at': starts[0] if starts else None,
+        'last_available_at': starts[-1] if starts else None,
+        'day_counts': dict(day_counts),
+    }
+    updated = MasterAvailability.objects.filter(owner_id=owner_id).update(updated_at=timezone.now(), **fields)
+    if not updated:
+        MasterAvailability.objects.create(owner_id=owner_id, **fields)
+    bump_master_version(owner_id)
+
+
+def stale_availability_owners(now=None):
+    """Return masters whose summary the clock has overtaken since their last write.
+
+    That is: the first free time has started, or the window has moved on a day
+    since the summary was computed and working hours fill the new days (or the
+    master has working hours but no summary yet).
+    """
+    now = now or timezone.now()
+    midnight = timezone.make_aware(datetime.combine(timezone.localdate(now), time.min))
+    owners = set(
+        MasterAvailability.objects.filter(has_availability=True, next_available_at__lt=now)
+        .values_list('owner_id', flat=True)
+    )
+    owners.update(
+        WorkingHours.objects.filter(owner__availability__updated_at__lt=midnight)
+        .values_list('owner_id', flat=True).distinct()
+    )
+    owners.update(
+        WorkingHours.objects.filter(owner__availability__isnull=True).values_list('owner_id', flat=True).distinct()
+    )
+    return sorted(owners)
+
+
+def rebuild_all_availability(owner_ids=None, now=None):
+    """Rebuild summaries for the given masters (default: every slot owner)."""
+    if owner_ids is None:
+        # Include existing summaries so masters whose slots were all removed get cleared
+        owner_ids = set(ScheduleSlot.objects.values_list('owner_id', flat=True).distinct())
+        owner_ids.update(WorkingHours.objects.values_list('owner_id', flat=True).distinct())
+        owner_ids.update(MasterAvailability.objects.values_list('owner_id', flat=True))
+    count = 0
+    for owner_id in owner_ids:
+        refresh_master_availability(owner_id, now=now)
+        count += 1
+    return count
@@ -1,13 +1,42 @@
-from datetime import datetime, timedelta
+import os
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from importlib import import_module
+from io import BytesIO, StringIO
 
-from django.test import TestCase
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction, IntegrityError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from accounts.models import User
-from masters.models import Salon, Service
-from .models import ScheduleSlot, Booking
+from masters.models import MasterProfile, Salon, Service
+from .models import (
+    ScheduleSlot, Booking, MasterAvailability, BookingIdempotencyKey, WorkingHours, ScheduleException,
+    ArchivedBooking, ArchivedSlot
+)
 from .forms import SlotCreateForm
+from .availability import bookable_starts, covering_slots, split_runs, earliest_starts
+from . import booking as booking_engine
+from .integrity import check_booking_invariants
+from .explain import capture_query_plans, table_scans
+from .summary import refresh_master_availability, stale_availability_owners
+from .writer import MasterWriteQueue, WriteQueueTimeout, run_booking_write
+from .rules import free_slots
+from . import analytics
+from .analytics import export_analytics, SnapshotBusy
+from .archive import archive_history
+from .pagination import encode_cursor
+from .changelist import ADMIN_COUNT_LIMIT, ApproximateCountPaginator
 
 
 def make_slot(owner, start, minutes=30, status=ScheduleSlot.Status.AVAILABLE):
@@ -15,6 +44,10 @@ def make_slot(owner, start, minutes=30, status=ScheduleSlot.Status.AVAILABLE):
     return ScheduleSlot.objects.create(owner=owner, start_at=start, end_at=end, status=status)
 
 
+def data_version(user):
+    return MasterProfile.objects.values_list('data_version', flat=True).get(user=user)
+
+
 class ScheduleSlotModelTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -39,6 +72,12 @@ class ScheduleSlotModelTest(TestCase):
         slot = make_slot(self.user, now)
         self.assertIn('-', str(slot))
 
+    def test_start_date_is_local_date(self):
+        # 23:30 UTC is already the next day in Moscow
+        start = datetime(2026, 3, 1, 23, 30, tzinfo=dt_timezone.utc)
+        slot = make_slot(self.user, start)
+        self.assertEqual(slot.start_date, date(2026, 3, 2))
+
 
 class BookingModelTest(TestCase):
     def setUp(self):
@@ -100,6 +139,24 @@ class BookingModelTest(TestCase):
         for s in [slot1, slot2, slot3]:
             s.refresh_from_db()
             self.assertEqual(s.status, ScheduleSlot.Status.AVAILABLE)
+            self.assertIsNone(s.booking_id)
+
+    def test_freed_start_slot_can_be_booked_again(self):
+        self.slot.status = ScheduleSlot.Status.BOOKED
+        self.slot.save()
+        first = Booking.objects.create(
+            owner=self.user, service=self.service, slot=self.slot,
+            client_name='Первый', client_phone='+7999'
+        )
+        first.booked_slots.set([self.slot])
+        first.cancel()
+
+        second = booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=self.slot.pk,
+            client_name='Второй', client_phone='+7999'
+        )
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.booking, second)
 
 
 class SlotCreateFormTest(TestCase):
@@ -133,9 +190,85 @@ class SlotCreateFormTest(TestCase):
             'slot_duration': 30,
         })
         form.is_valid()
-        count = form.generate_slots(user)
-        self.assertEqual(count, 4)  # 10:00, 10:30, 11:00, 11:30
-        self.assertEqual(ScheduleSlot.objects.filter(owner=user).count(), 4)
+        result = form.generate_slots(user)
+        self.assertEqual(result.created, 4)  # 10:00, 10:30, 11:00, 11:30
+        self.assertEqual(ScheduleSlot.objects.filter(owner=user, start_date=date(2026, 3, 1)).count(), 4)
+
+
+class SlotRangeGenerationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='range@test.com', username='range', password='pass123',
+            role=User.Role.MASTER
+        )
+
+    def _form(self, **data):
+        fields = {
+            'date': '2026-03-02',  # Monday
+            'date_to': '2026-03-15',
+            'start_time': '10:00',
+            'end_time': '12:00',
+            'slot_duration': 60,
+        }
+        fields.update(data)
+        return SlotCreateForm(data=fields)
+
+    def test_weekday_pattern_over_range(self):
+        form = self._form(weekdays=['0', '1', '2', '3', '4'])
+        self.assertTrue(form.is_valid(), form.errors)
+        result = form.generate_slots(self.user)
+        self.assertEqual(result.created, 20)  # 10 working days x 2 slots
+        days = set(ScheduleSlot.objects.filter(owner=self.user).values_list('start_date', flat=True))
+        self.assertEqual(len(days), 10)
+        self.assertTrue(all(day.weekday() < 5 for day in days))
+
+    def test_resubmit_skips_existing_slots(self):
+        form = self._form()
+        form.is_valid()
+        form.generate_slots(self.user)
+
+        again = self._form(start_time='11:30', end_time='13:30')
+        again.is_valid()
+        with self.assertNumQueries(9):
+            result = again.generate_slots(self.user)
+        # 11:30 overlaps 11:00-12:00 on each of 14 days; 12:30 is new
+        self.assertEqual(result.created, 14)
+        self.assertEqual(len(result.skipped), 14)
+        self.assertEqual(ScheduleSlot.objects.filter(owner=self.user).count(), 42)
+
+    def test_other_masters_slots_do_not_overlap(self):
+        other = User.objects.create_user(
+            email='range2@test.com', username='range2', password='pass123',
+            role=User.Role.MASTER
+        )
+        form = self._form(date_to='')
+        form.is_valid()
+        form.generate_slots(other)
+        self.assertEqual(form.generate_slots(self.user).created, 2)
+
+    def test_invalid_ranges(self):
+        self.assertFalse(self._form(date_to='2026-03-01').is_valid())
+        self.assertFalse(self._form(date_to='2026-09-01').is_valid())
+        self.assertFalse(self._form(date_to='2026-03-03', weekdays=['5', '6']).is_valid())
+
+    def test_database_rejects_overlapping_slot(self):
+        start = timezone.make_aware(datetime(2026, 3, 2, 10))
+        make_slot(self.user, start, minutes=60)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_slot(self.user, start + timedelta(minutes=30))
+        late = make_slot(self.user, start + timedelta(hours=1))
+        late.start_at = start + timedelta(minutes=45)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            late.save()
+
+    def test_view_reports_skipped_slots(self):
+        self.client.login(username='range@test.com', password='pass123')
+        data = {'date': '2026-03-02', 'start_time': '10:00', 'end_time': '11:00', 'slot_duration': 30}
+        self.client.post(reverse('slot_create'), data)
+        resp = self.client.post(reverse('slot_create'), data, follow=True)
+        self.assertContains(resp, 'Создано слотов: 0')
+        self.assertContains(resp, 'пересекающихся с существующими: 2 (02.03 10:00, 02.03 10:30)')
+        self.assertEqual(ScheduleSlot.objects.filter(owner=self.user).count(), 2)
 
 
 class SlotViewTest(TestCase):
@@ -150,6 +283,64 @@ class SlotViewTest(TestCase):
         resp = self.client.get(reverse('slot_list'))
         self.assertEqual(resp.status_code, 200)
 
+    def test_slot_list_date_filter(self):
+        tomorrow = timezone.now() + timedelta(days=1)
+        in_range = make_slot(self.user, tomorrow)
+        later = make_slot(self.user, tomorrow + timedelta(days=3))
+        day = timezone.localdate(tomorrow).isoformat()
+        resp = self.client.get(reverse('slot_list'), {'from': day, 'to': day})
+        self.assertIn(in_range, resp.context['slots'])
+        self.assertNotIn(later, resp.context['slots'])
+
+    def test_slot_list_pages_by_cursor(self):
+        start = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        slots = [make_slot(self.user, start + timedelta(minutes=30 * i)) for i in range(5)]
+        with self.assertNumQueries(3):
+            # Session, user and one page query: no COUNT(*)
+            first = self.client.get(reverse('slot_list'), {'size': 2}).context['page']
+        self.assertEqual(list(first), slots[:2])
+        self.assertFalse(first.has_previous)
+
+        # A slot added before the cursor does not shift the next page
+        make_slot(self.user, start - timedelta(hours=1))
+        second = self.client.get(reverse('slot_list') + first.next_url).context['page']
+        self.assertEqual(list(second), slots[2:4])
+        self.assertIn('size=2', second.next_url)
+        last = self.client.get(reverse('slot_list') + second.next_url).context['page']
+        self.assertEqual(list(last), slots[4:])
+        self.assertIsNone(last.next_url)
+
+        back = self.client.get(reverse('slot_list') + last.previous_url).context['page']
+        self.assertEqual(list(back), slots[2:4])
+        self.assertTrue(back.has_previous)
+
+    def test_slot_list_ignores_broken_cursor(self):
+        tomorrow = timezone.now() + timedelta(days=1)
+        slot = make_slot(self.user, tomorrow)
+        for cursor in ('garbage', 'WyJ4IiwgMV0', 'WzFd'):
+            resp = self.client.get(reverse('slot_list'), {'after': cursor})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(list(resp.context['slots']), [slot])
+
+    def test_booked_rows_link_their_booking_in_one_query(self):
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        service = Service.objects.create(owner=self.user, salon=salon, name='Педикюр', duration_min=90, price=1)
+        start = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        slots = [make_slot(self.user, start + timedelta(minutes=30 * i)) for i in range(3)]
+        self.client.get(reverse('slot_list'))
+        with CaptureQueriesContext(connection) as free:
+            self.client.get(reverse('slot_list'))
+
+        booking = booking_engine.create_booking(
+            owner=self.user, service=service, slot_id=slots[0].pk,
+            client_name='Клиент', client_phone='+7999'
+        )
+        with CaptureQueriesContext(connection) as booked:
+            resp = self.client.get(reverse('slot_list'))
+        # Continuation slots link the booking too (desktop table + mobile cards)
+        self.assertContains(resp, reverse('booking_detail', args=[booking.pk]), count=6)
+        self.assertEqual(len(booked), len(free))
+
     def test_slot_create(self):
         resp = self.client.post(reverse('slot_create'), {
             'date': '2026-03-15',
@@ -191,6 +382,26 @@ class BookingViewTest(TestCase):
         resp = self.client.get(reverse('booking_list'))
         self.assertEqual(resp.status_code, 200)
 
+    def test_booking_list_pages_newest_first(self):
+        tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        bookings = [
+            Booking.objects.create(
+                owner=self.user, service=self.service, slot=make_slot(self.user, tomorrow + timedelta(hours=i)),
+                client_name=f'Клиент {i}', client_phone='+7999'
+            )
+            for i in range(3)
+        ]
+        # Same created_at: the primary key breaks the tie
+        Booking.objects.filter(pk__in=[b.pk for b in bookings]).update(created_at=timezone.now())
+        resp = self.client.get(reverse('booking_list'), {'size': 2, 'status': 'CREATED'})
+        self.assertEqual(list(resp.context['bookings']), bookings[:0:-1])
+        self.assertContains(resp, 'Вперёд')
+        resp = self.client.get(reverse('booking_list') + resp.context['page'].next_url)
+        self.assertEqual(list(resp.context['bookings']), bookings[:1])
+        self.assertEqual(resp.context['request'].GET['status'], 'CREATED')
+        self.assertContains(resp, 'Назад')
+        self.assertNotContains(resp, 'Вперёд')
+
     def test_booking_cancel(self):
         tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
         slot = make_slot(self.user, tomorrow, status=ScheduleSlot.Status.BOOKED)
@@ -222,3 +433,1084 @@ class BookingViewTest(TestCase):
         )
         resp = self.client.post(reverse('booking_cancel', args=[booking.pk]))
         self.assertEqual(resp.status_code, 404)
+
+
+class MasterAvailabilityTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='av@test.com', username='av', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=self.salon,
+            name='Маникюр', duration_min=30, price=1500
+        )
+        self.tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    def test_summary_counts_available_slots_per_day(self):
+        make_slot(self.user, self.tomorrow)
+        make_slot(self.user, self.tomorrow + timedelta(minutes=30))
+        make_slot(self.user, self.tomorrow + timedelta(days=1))
+        summary = MasterAvailability.objects.get(owner=self.user)
+        self.assertTrue(summary.has_availability)
+        self.assertEqual(summary.next_available_at, self.tomorrow)
+        self.assertEqual(summary.last_available_at, self.tomorrow + timedelta(days=1))
+        self.assertEqual(summary.day_counts[timezone.localdate(self.tomorrow).isoformat()], 2)
+
+    def test_slots_outside_window_ignored(self):
+        make_slot(self.user, self.tomorrow + timedelta(days=30))
+        refresh_master_availability(self.user.pk)
+        summary = MasterAvailability.objects.get(owner=self.user)
+        self.assertFalse(summary.has_availability)
+        self.assertIsNone(summary.next_available_at)
+
+    def test_generate_slots_refreshes_summary(self):
+        form = SlotCreateForm(data={
+            'date': timezone.localdate(self.tomorrow).isoformat(),
+            'start_time': '10:00',
+            'end_time': '11:00',
+            'slot_duration': 30,
+        })
+        form.is_valid()
+        form.generate_slots(self.user)
+        summary = MasterAvailability.objects.get(owner=self.user)
+        self.assertEqual(sum(summary.day_counts.values()), 2)
+
+    def test_delete_and_cancel_refresh_summary(self):
+        slot = make_slot(self.user, self.tomorrow)
+        slot.status = ScheduleSlot.Status.BOOKED
+        slot.save()
+        self.assertFalse(MasterAvailability.objects.get(owner=self.user).has_availability)
+
+        booking = Booking.objects.create(
+            owner=self.user, service=self.service, slot=slot,
+            client_name='Клиент', client_phone='+7999'
+        )
+        booking.booked_slots.set([slot])
+        booking.cancel()
+        self.assertTrue(MasterAvailability.objects.get(owner=self.user).has_availability)
+
+        slot.delete()
+        self.assertFalse(MasterAvailability.objects.get(owner=self.user).has_availability)
+
+    def test_writes_bump_data_version(self):
+        make_slot(self.user, self.tomorrow)
+        version = data_version(self.user)
+        make_slot(self.user, self.tomorrow + timedelta(minutes=30))
+        self.assertEqual(data_version(self.user), version + 1)
+
+    def test_stale_rebuild_refreshes_only_outdated_summaries(self):
+        other = User.objects.create_user(
+            email='avail2@test.com', username='avail2', password='pass123', role=User.Role.MASTER
+        )
+        soon = timezone.now() + timedelta(minutes=10)
+        make_slot(self.user, soon)
+        make_slot(self.user, self.tomorrow)
+        make_slot(other, self.tomorrow)
+        later = soon + timedelta(minutes=20)
+        self.assertEqual(stale_availability_owners(now=later), [self.user.pk])
+
+        out = StringIO()
+        with mock.patch('schedule.management.commands.rebuild_availability.stale_availability_owners',
+                        return_value=stale_availability_owners(now=later)):
+            call_command('rebuild_availability', '--stale', stdout=out)
+        self.assertIn('for 1 masters', out.getvalue())
+
+        day = timezone.localdate() + timedelta(days=1)
+        WorkingHours.objects.create(owner=other, weekday=day.weekday(), start_time=time(10), end_time=time(12))
+        # The window moves on at midnight and the new day may hold working hours
+        self.assertIn(other.pk, stale_availability_owners(now=timezone.now() + timedelta(days=1)))
+
+    def test_rebuild_command(self):
+        make_slot(self.user, self.tomorrow)
+        MasterAvailability.objects.all().delete()
+        call_command('rebuild_availability', stdout=StringIO())
+        self.assertTrue(MasterAvailability.objects.get(owner=self.user).has_availability)
+
+
+class FakeSlot:
+    def __init__(self, start, minutes=30):
+        self.start_at = start
+        self.end_at = start + timedelta(minutes=minutes)
+
+
+def fake_run(base, *durations):
+    slots = []
+    start = base
+    for minutes in durations:
+        slots.append(FakeSlot(start, minutes))
+        start = slots[-1].end_at
+    return slots
+
+
+class BookableStartsTest(TestCase):
+    """Unit tests for the sliding-window availability engine."""
+
+    def setUp(self):
+        self.base = timezone.now().replace(second=0, microsecond=0)
+
+    def test_short_service_returns_all(self):
+        slots = fake_run(self.base, 30, 30, 30)
+        self.assertEqual(bookable_starts(slots, 30), slots)
+
+    def test_consecutive_slots_found(self):
+        slots = fake_run(self.base, 30, 30, 30, 30)
+        # slots 0, 1 can start a 90 minute sequence
+        self.assertEqual(bookable_starts(slots, 90), slots[:2])
+
+    def test_gap_breaks_sequence(self):
+        slot1 = FakeSlot(self.base)
+        slot2 = FakeSlot(self.base + timedelta(minutes=60))  # gap!
+        self.assertEqual(bookable_starts([slot1, slot2], 60), [])
+        self.assertEqual(split_runs([slot1, slot2]), [[slot1], [slot2]])
+
+    def test_mixed_durations_measured_in_minutes(self):
+        slots = fake_run(self.base, 15, 15, 60, 30)
+        # Minutes left in the run from each start: 120, 105, 90, 30
+        self.assertEqual(bookable_starts(slots, 60), slots[:3])
+        self.assertEqual(bookable_starts(slots, 110), slots[:1])
+
+    def test_partial_slot_counts_as_whole(self):
+        # A 45 minute service occupies both 30 minute slots
+        slots = fake_run(self.base, 30, 30)
+        self.assertEqual(covering_slots(slots, 45), slots)
+
+    def test_earliest_starts_for_many_durations(self):
+        first = fake_run(self.base, 30)
+        second = fake_run(self.base + timedelta(hours=2), 30, 30, 30)
+        third = fake_run(self.base + timedelta(hours=5), 60, 60, 60)
+        result = earliest_starts(first + second + third, [30, 60, 90, 180, 240])
+        self.assertEqual(result, {
+            30: first[0], 60: second[0], 90: second[0], 180: third[0],
+        })
+
+    def test_covering_slots_is_shortest_prefix(self):
+        slots = fake_run(self.base, 15, 45, 30)
+        self.assertEqual(covering_slots(slots, 60), slots[:2])
+        self.assertIsNone(covering_slots(slots, 120))
+        self.assertIsNone(covering_slots([], 30))
+
+
+class QueryPlanTest(TestCase):
+    """Fail when a storefront or cabinet view regresses to a full scan of a hot table."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='qp@test.com', username='qp', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        self.salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=self.salon,
+            name='Маникюр', duration_min=60, price=2000
+        )
+        tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.slots = [make_slot(self.user, tomorrow + timedelta(minutes=30 * i)) for i in range(4)]
+        booked = make_slot(self.user, tomorrow + timedelta(hours=3), status=ScheduleSlot.Status.BOOKED)
+        booking = Booking.objects.create(
+            owner=self.user, service=self.service, slot=booked,
+            client_name='Клиент', client_phone='+7999'
+        )
+        booking.booked_slots.set([booked])
+        cache.clear()
+
+    def assertNoTableScans(self, method, url, data=None):
+        with capture_query_plans() as plans:
+            resp = getattr(self.client, method)(url, data or {})
+        self.assertIn(resp.status_code, (200, 302))
+        self.assertTrue(plans)
+        scans = table_scans(plans)
+        self.assertFalse(scans, '\n'.join(f'{table}: {plan.sql}\n  {plan.plan}' for table, plan in scans))
+
+    def test_storefront_views(self):
+        self.assertNoTableScans('get', reverse('masters_catalog'), {'sort': 'soonest'})
+        self.assertNoTableScans('get', reverse('master_page', args=[self.profile.slug]))
+        self.assertNoTableScans('get', reverse('master_slots', args=[self.profile.slug]))
+        self.assertNoTableScans(
+            'get', reverse('master_slots', args=[self.profile.slug]), {'service': self.service.pk}
+        )
+
+    def test_booking_create(self):
+        self.assertNoTableScans('post', reverse('booking_create', args=[self.profile.slug]), {
+            'service_id': self.service.pk,
+            'slot_id': self.slots[0].pk,
+            'client_name': 'План',
+            'client_phone': '+7 000',
+            'notes': '',
+        })
+
+    def test_cabinet_views(self):
+        self.client.login(username='qp@test.com', password='pass123')
+        day = timezone.localdate(self.slots[0].start_at).isoformat()
+        self.assertNoTableScans('get', reverse('slot_list'))
+        self.assertNoTableScans('get', reverse('slot_list'), {'from': day, 'to': day})
+        self.assertNoTableScans('get', reverse('booking_list'))
+        self.assertNoTableScans('get', reverse('booking_list'), {'status': 'CREATED'})
+        after = self.client.get(reverse('slot_list'), {'size': 1}).context['page'].next_url
+        self.assertNoTableScans('get', reverse('slot_list') + after)
+        booking = Booking.objects.get(owner=self.user)
+        self.assertNoTableScans('get', reverse('booking_list'), {'after': encode_cursor([booking.created_at, booking.pk])})
+
+
+class BookingEngineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='eng@test.com', username='eng', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=self.salon,
+            name='Маникюр', duration_min=90, price=3000
+        )
+        tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.slots = [make_slot(self.user, tomorrow + timedelta(minutes=30 * i)) for i in range(4)]
+
+    def book(self, slot):
+        return booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=slot.pk,
+            client_name='Клиент', client_phone='+7999'
+        )
+
+    def test_claims_all_covering_slots(self):
+        booking = self.book(self.slots[0])
+        self.assertEqual(set(booking.booked_slots.all()), set(self.slots[:3]))
+        self.assertEqual(
+            ScheduleSlot.objects.filter(status=ScheduleSlot.Status.BOOKED).count(), 3
+        )
+
+    def test_fixed_statement_count(self):
+        # savepoint, start slot, rules + exceptions, candidates, booking, claim,
+        # summary (rules + exceptions, free slots, write), data version, release
+        with self.assertNumQueries(13):
+            self.book(self.slots[0])
+
+    def test_taken_continuation_slot_rejected(self):
+        self.slots[2].status = ScheduleSlot.Status.BOOKED
+        self.slots[2].save()
+        with self.assertRaises(ValueError):
+            self.book(self.slots[0])
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_lost_race_is_retried(self):
+        real_claim = booking_engine.claim_slots
+        calls = []
+
+        def racing_claim(slot_ids, booking, fresh_ids=()):
+            calls.append(slot_ids)
+            return 0 if len(calls) == 1 else real_claim(slot_ids, booking, fresh_ids)
+
+        with mock.patch.object(booking_engine, 'claim_slots', racing_claim), \
+                mock.patch.object(booking_engine.time, 'sleep'):
+            booking = self.book(self.slots[0])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(booking.booked_slots.count(), 3)
+
+    def test_conflict_after_retries_rolls_back(self):
+        with mock.patch.object(booking_engine, 'claim_slots', return_value=1), \
+                mock.patch.object(booking_engine.time, 'sleep'):
+            with self.assertRaisesMessage(ValueError, booking_engine.SLOT_TAKEN_MESSAGE):
+                self.book(self.slots[0])
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertFalse(ScheduleSlot.objects.filter(status=ScheduleSlot.Status.BOOKED).exists())
+
+
+class BookingInvariantsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='inv@test.com', username='inv', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=self.salon,
+            name='Маникюр', duration_min=30, price=1500
+        )
+        tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.slot1 = make_slot(self.user, tomorrow, status=ScheduleSlot.Status.BOOKED)
+        self.slot2 = make_slot(self.user, tomorrow + timedelta(minutes=30), status=ScheduleSlot.Status.BOOKED)
+
+    def make_booking(self, start, slots):
+        booking = Booking.objects.create(
+            owner=self.user, service=self.service, slot=start,
+            client_name='Клиент', client_phone='+7999'
+        )
+        booking.booked_slots.set(slots)
+        return booking
+
+    def test_consistent_bookings(self):
+        self.make_booking(self.slot1, [self.slot1, self.slot2])
+        self.assertEqual(check_booking_invariants(), {})
+
+    def test_slot_freed_without_unlinking(self):
+        self.make_booking(self.slot1, [self.slot1, self.slot2])
+        ScheduleSlot.objects.filter(pk=self.slot2.pk).update(status=ScheduleSlot.Status.AVAILABLE)
+        self.assertEqual(check_booking_invariants(self.user), {'stale_linked': [self.slot2.pk]})
+
+    def test_start_slot_not_held(self):
+        booking = self.make_booking(self.slot1, [self.slot2])
+        self.assertEqual(
+            check_booking_invariants(self.user),
+            {'orphan_booked': [self.slot1.pk], 'unheld_start': [booking.pk]}
+        )
+
+    def test_orphan_booked_slot(self):
+        self.make_booking(self.slot1, [self.slot1])
+        self.assertEqual(check_booking_invariants(), {'orphan_booked': [self.slot2.pk]})
+
+
+class MasterWriteQueueTest(TestCase):
+    """Queue mechanics with plain callables; workers run outside the test transaction."""
+
+    def setUp(self):
+        self.queue = MasterWriteQueue(idle_timeout=0.05, serialize=False)
+
+    def test_jobs_for_one_master_run_in_order(self):
+        done = []
+        futures = [self.queue.submit(1, done.append, i) for i in range(20)]
+        for future in futures:
+            future.result(timeout=1)
+        self.assertEqual(done, list(range(20)))
+
+    def test_result_and_exception_are_returned_to_caller(self):
+        self.assertEqual(self.queue.run(1, lambda a, b: a + b, 2, b=3, timeout=1), 5)
+
+        def fail():
+            raise ValueError('Слот уже занят')
+
+        with self.assertRaisesMessage(ValueError, 'Слот уже занят'):
+            self.queue.run(1, fail, timeout=1)
+
+    def test_timed_out_job_is_cancelled_before_it_runs(self):
+        release = threading.Event()
+        done = []
+        self.queue.submit(1, release.wait, 1)
+        with self.assertRaises(WriteQueueTimeout):
+            self.queue.run(1, done.append, 'late', timeout=0.05)
+        release.set()
+        self.queue.run(1, done.append, 'next', timeout=1)
+        self.assertEqual(done, ['next'])
+
+    def test_masters_do_not_wait_on_each_other(self):
+        release = threading.Event()
+        blocked = self.queue.submit(1, release.wait, 1)
+        self.assertEqual(self.queue.run(2, lambda: 'free', timeout=0.5), 'free')
+        release.set()
+        blocked.result(timeout=1)
+
+    def test_idle_workers_exit(self):
+        self.queue.run(1, lambda: None, timeout=1)
+        for _ in range(50):
+            if not self.queue.active_workers():
+                break
+            threading.Event().wait(0.02)
+        self.assertEqual(self.queue.active_workers(), 0)
+        # A new job after exit starts a fresh worker
+        self.assertEqual(self.queue.run(1, lambda: 'again', timeout=1), 'again')
+
+    @override_settings(BOOKING_WRITE_QUEUE=False)
+    def test_disabled_queue_runs_inline(self):
+        self.assertEqual(run_booking_write(1, threading.get_ident), threading.get_ident())
+
+
+class IdempotencyKeyPurgeTest(TestCase):
+    def test_purge_removes_only_expired_keys(self):
+        user = User.objects.create_user(email='purge@test.com', username='purge', password='pass123')
+        salon = Salon.objects.create(owner=user, name='Салон')
+        service = Service.objects.create(owner=user, salon=salon, name='Маникюр', duration_min=30, price=1)
+        slot = make_slot(user, timezone.now() + timedelta(days=1))
+        booking = Booking.objects.create(owner=user, service=service, slot=slot, client_name='К', client_phone='1')
+        now = timezone.now()
+        BookingIdempotencyKey.objects.bulk_create([
+            BookingIdempotencyKey(owner=user, key=f'old{i}', booking=booking, expires_at=now - timedelta(minutes=1))
+            for i in range(5)
+        ] + [BookingIdempotencyKey(owner=user, key='live', booking=booking, expires_at=now + timedelta(hours=1))])
+
+        self.assertEqual(booking_engine.purge_expired_idempotency_keys(batch_size=2), 5)
+        self.assertEqual(list(BookingIdempotencyKey.objects.values_list('key', flat=True)), ['live'])
+        self.assertEqual(booking_engine.find_replayed_booking(user, 'live'), booking)
+
+
+class MasterDataVersionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='dver@test.com', username='dver', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=30, price=1)
+        self.start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.client.login(username='dver@test.com', password='pass123')
+
+    def test_schedule_and_booking_writes_bump(self):
+        versions = [data_version(self.user)]
+        slot = make_slot(self.user, self.start)
+        versions.append(data_version(self.user))
+        booking = booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=slot.pk,
+            client_name='Клиент', client_phone='+7999'
+        )
+        versions.append(data_version(self.user))
+        # Cancel frees slots with a bulk update(), which sends no signals
+        self.client.post(reverse('booking_cancel', args=[booking.pk]))
+        versions.append(data_version(self.user))
+        self.client.post(reverse('slot_delete', args=[slot.pk]))
+        versions.append(data_version(self.user))
+        form = SlotCreateForm(data={
+            'date': timezone.localdate(self.start).isoformat(),
+            'start_time': '10:00', 'end_time': '11:00', 'slot_duration': 30,
+        })
+        form.is_valid()
+        form.generate_slots(self.user)
+        versions.append(data_version(self.user))
+        self.assertEqual(versions, sorted(set(versions)))
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='cond@test.com', username='cond', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=30, price=1)
+        self.slot = make_slot(self.user, timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1))
+        self.client.login(username='cond@test.com', password='pass123')
+
+    def test_unchanged_list_answered_with_304(self):
+        # The first page issues the CSRF cookie its forms are bound to, which is part of the tag
+        self.client.get(reverse('booking_list'))
+        for url in (reverse('booking_list'), reverse('slot_list')):
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('private', resp['Cache-Control'])
+            self.assertTrue(resp.has_header('Last-Modified'))
+            # Session and user only: the view does not run
+            with self.assertNumQueries(2):
+                resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+            self.assertEqual(resp.status_code, 304)
+            self.assertTrue(resp.has_header('ETag'))
+
+    def test_booking_changes_etag(self):
+        etag = self.client.get(reverse('booking_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = booking_engine.create_booking(
+                owner=self.user, service=self.service, slot_id=self.slot.pk,
+                client_name='Клиент', client_phone='+7999'
+            )
+        resp = self.client.get(reverse('booking_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Клиент')
+
+        # The redirect after cancelling carries a message, which is shown even on a matching tag
+        self.client.post(reverse('booking_cancel', args=[booking.pk]))
+        resp = self.client.get(reverse('booking_list'), HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+
+    def test_anonymous_still_redirected(self):
+        self.client.logout()
+        resp = self.client.get(reverse('booking_list'), HTTP_IF_NONE_MATCH='"x"')
+        self.assertEqual(resp.status_code, 302)
+
+
+class ArchiveHistoryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='arch@test.com', username='arch', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=60, price=1)
+        self.now = timezone.now().replace(microsecond=0)
+
+    def book(self, start, status=Booking.Status.CREATED):
+        slots = [make_slot(self.user, start), make_slot(self.user, start + timedelta(minutes=30))]
+        booking = Booking.objects.create(
+            owner=self.user, service=self.service, slot=slots[0],
+            client_name='Клиент', client_phone='+7999', status=status
+        )
+        if status == Booking.Status.CREATED:
+            ScheduleSlot.objects.filter(pk__in=[s.pk for s in slots]).update(
+                status=ScheduleSlot.Status.BOOKED, booking=booking
+            )
+        return booking, slots
+
+    def test_past_free_slots_are_deleted(self):
+        past = make_slot(self.user, self.now - timedelta(days=2))
+        future = make_slot(self.user, self.now + timedelta(days=2))
+        recent, recent_slots = self.book(self.now - timedelta(days=3))
+
+        result = archive_history(days=180, now=self.now)
+        self.assertEqual(result.deleted_slots, 1)
+        self.assertFalse(ScheduleSlot.objects.filter(pk=past.pk).exists())
+        self.assertTrue(ScheduleSlot.objects.filter(pk=future.pk).exists())
+        # Inside the horizon: booking and its run stay in the hot tables
+        self.assertEqual(ScheduleSlot.objects.filter(booking=recent).count(), 2)
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    def test_old_bookings_move_to_archive(self):
+        old, old_slots = self.book(self.now - timedelta(days=200))
+        cancelled, cancelled_slots = self.book(self.now - timedelta(days=190), status=Booking.Status.CANCELLED)
+
+        result = archive_history(days=180, batch_size=1, now=self.now)
+        self.assertEqual(result.archived_bookings, 2)
+        self.assertFalse(Booking.objects.exists())
+        archived = ArchivedBooking.objects.get(pk=old.pk)
+        self.assertEqual((archived.start_at, archived.end_at), (old_slots[0].start_at, old_slots[1].end_at))
+        self.assertEqual(archived.service_name, 'Стрижка')
+        self.assertEqual(ArchivedSlot.objects.filter(booking=archived).count(), 2)
+        self.assertEqual(ArchivedBooking.objects.get(pk=cancelled.pk).status, Booking.Status.CANCELLED)
+        # The cancelled booking's freed continuation slot is simply deleted; its start slot is archived
+        self.assertTrue(ArchivedSlot.objects.filter(pk=cancelled_slots[0].pk).exists())
+        self.assertFalse(ScheduleSlot.objects.filter(owner=self.user).exists())
+
+    def test_start_slot_rebooked_by_newer_booking_stays(self):
+        cancelled, slots = self.book(self.now - timedelta(days=200), status=Booking.Status.CANCELLED)
+        newer = Booking.objects.create(
+            owner=self.user, service=self.service, slot=slots[0], client_name='Новый', client_phone='+7998',
+            created_at=self.now
+        )
+        ScheduleSlot.objects.filter(pk=slots[0].pk).update(status=ScheduleSlot.Status.BOOKED, booking=newer)
+
+        archive_history(days=180, batch_size=1, now=self.now)
+        # Both bookings start in the same past slot, so both move and the slot goes with the last one
+        self.assertEqual(set(ArchivedBooking.objects.values_list('pk', flat=True)), {cancelled.pk, newer.pk})
+        self.assertEqual(ArchivedSlot.objects.get(pk=slots[0].pk).booking_id, newer.pk)
+        self.assertFalse(ScheduleSlot.objects.filter(owner=self.user).exists())
+
+    def test_history_view_and_command(self):
+        old, _ = self.book(self.now - timedelta(days=400))
+        out = StringIO()
+        call_command('archive_history', stdout=out)
+        self.assertIn('archived 1 bookings and 2 slots', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+        other = User.objects.create_user(
+            email='arch2@test.com', username='arch2', password='pass123', role=User.Role.MASTER
+        )
+        self.client.login(username='arch2@test.com', password='pass123')
+        self.assertNotContains(self.client.get(reverse('booking_history')), '+7999')
+        self.client.login(username='arch@test.com', password='pass123')
+        resp = self.client.get(reverse('booking_history'))
+        self.assertContains(resp, '+7999')
+        self.assertEqual(list(resp.context['bookings']), [ArchivedBooking.objects.get(pk=old.pk)])
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='exp@test.com', username='exp', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=60, price=1)
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        self.client.login(username='exp@test.com', password='pass123')
+
+    def book(self, start, client_name='Клиент', status=Booking.Status.CREATED):
+        slot = make_slot(self.user, start, minutes=60, status=ScheduleSlot.Status.BOOKED)
+        booking = Booking.objects.create(
+            owner=self.user, service=self.service, slot=slot,
+            client_name=client_name, client_phone='+7 999 000-00-00', status=status
+        )
+        ScheduleSlot.objects.filter(pk=slot.pk).update(booking=booking)
+        return booking
+
+    def export(self, name, **params):
+        resp = self.client.get(reverse(name), params)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return b''.join(resp.streaming_content)
+
+    def csv_rows(self, name, **params):
+        content = self.export(name, **params).decode('utf-8-sig')
+        return [line.split(';') for line in content.splitlines()]
+
+    def test_bookings_csv_includes_archive_in_time_order(self):
+        self.book(self.now - timedelta(days=200), client_name='Старый')
+        archive_history(days=180, now=self.now)
+        self.book(self.now + timedelta(days=1), client_name='=HYPERLINK("x")')
+        self.book(self.now + timedelta(days=2), client_name='Отмена', status=Booking.Status.CANCELLED)
+
+        rows = self.csv_rows('booking_export')
+        self.assertEqual(rows[0][:4], ['Дата', 'Начало', 'Конец', 'Услуга'])
+        self.assertEqual([row[4] for row in rows[1:]], ['Старый', '"\'=HYPERLINK(""x"")"', 'Отмена'])
+        # Phone numbers stay as they are; statuses are human readable
+        self.assertEqual(rows[2][5], '+7 999 000-00-00')
+        self.assertEqual(rows[3][6], 'Отменена')
+        start = timezone.localtime(self.now + timedelta(days=1))
+        self.assertEqual(rows[2][1:3], [f'{start:%H:%M}', f'{start + timedelta(hours=1):%H:%M}'])
+
+    def test_booking_end_follows_booked_run(self):
+        start = self.now + timedelta(days=1)
+        booking = self.book(start)
+        make_slot(self.user, start + timedelta(hours=1), status=ScheduleSlot.Status.BOOKED)
+        ScheduleSlot.objects.filter(start_at=start + timedelta(hours=1)).update(booking=booking)
+        cancelled = self.book(start + timedelta(days=1), status=Booking.Status.CANCELLED)
+        ScheduleSlot.objects.filter(booking=cancelled).update(booking=None, status=ScheduleSlot.Status.AVAILABLE)
+        Service.objects.filter(pk=self.service.pk).update(duration_min=30)
+
+        rows = self.csv_rows('booking_export')
+        start = timezone.localtime(start)
+        self.assertEqual(rows[1][1:3], [f'{start:%H:%M}', f'{start + timedelta(minutes=90):%H:%M}'])
+        self.assertEqual(rows[2][1:3], [f'{start:%H:%M}', f'{start + timedelta(hours=1):%H:%M}'])
+
+    def test_booking_filters_run_in_sql(self):
+        self.book(self.now - timedelta(days=200), client_name='Старый')
+        archive_history(days=180, now=self.now)
+        kept = self.book(self.now + timedelta(days=1), client_name='Нужный')
+        self.book(self.now + timedelta(days=5), client_name='Поздний')
+        self.book(self.now + timedelta(days=1, hours=2), client_name='Отмена', status=Booking.Status.CANCELLED)
+        day = timezone.localdate(kept.slot.start_at).isoformat()
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.csv_rows('booking_export', status='CREATED', **{'from': day, 'to': day})
+        self.assertEqual([row[4] for row in rows[1:]], ['Нужный'])
+        exports = [q['sql'] for q in queries if 'bookings' in q['sql'] and 'WHERE' in q['sql']]
+        self.assertTrue(exports)
+        self.assertTrue(all('"status" = ' in sql for sql in exports[-2:]))
+
+    def test_slots_export_matches_list_filters(self):
+        booked = self.book(self.now + timedelta(days=1), client_name='Анна')
+        make_slot(self.user, self.now + timedelta(days=1, hours=2))
+        make_slot(self.user, self.now - timedelta(days=2))
+        rows = self.csv_rows('slot_export')
+        self.assertEqual(rows[0], ['Дата', 'Начало', 'Конец', 'Статус', 'Клиент', 'Телефон'])
+        self.assertEqual([row[3] for row in rows[1:]], ['Забронирован', 'Доступен'])
+        self.assertEqual(rows[1][4], booked.client_name)
+
+    def test_xlsx_is_a_workbook(self):
+        self.book(self.now + timedelta(days=1), client_name='Иван <&>')
+        content = self.export('booking_export', format='xlsx')
+        with zipfile.ZipFile(BytesIO(content)) as workbook:
+            self.assertIn('xl/workbook.xml', workbook.namelist())
+            sheet = workbook.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 2)
+        self.assertIn('Иван &lt;&amp;&gt;', sheet)
+
+    def test_export_requires_master(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('booking_export')).status_code, 302)
+
+
+@override_settings(STOREFRONT_SNAPSHOT_ASYNC=False)
+class AnalyticsExportTest(TransactionTestCase):
+    """The export copies committed data, so these tests commit."""
+
+    def setUp(self):
+        cache.clear()
+        self.masters = [
+            User.objects.create_user(
+                email=f'an{i}@test.com', username=f'an{i}', password='pass123', role=User.Role.MASTER
+            )
+            for i in range(3)
+        ]
+        tomorrow = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        for master in self.masters:
+            salon = Salon.objects.create(owner=master, name='Салон')
+            service = Service.objects.create(owner=master, salon=salon, name='Стрижка', duration_min=30, price=1)
+            slots = [make_slot(master, tomorrow + timedelta(minutes=30 * i)) for i in range(3)]
+            Booking.objects.create(
+                owner=master, service=service, slot=slots[0], client_name='Клиент', client_phone='+7999'
+            )
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'analytics.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def query(self, sql, *params):
+        out = sqlite3.connect(self.path)
+        try:
+            return out.execute(sql, params).fetchall()
+        finally:
+            out.close()
+
+    def test_full_export_copies_every_table_in_chunks(self):
+        result = export_analytics(self.path, chunk_size=2, backup_pages=1)
+        self.assertFalse(result.incremental)
+        self.assertEqual(result.masters, 3)
+        self.assertEqual(self.query('SELECT COUNT(*) FROM schedule_slots'), [(9,)])
+        self.assertEqual(self.query('SELECT COUNT(*) FROM bookings'), [(3,)])
+        self.assertEqual(self.query('SELECT COUNT(*) FROM master_profiles'), [(3,)])
+        self.assertEqual(result.rows, 3 + 3 + 9 + 3)
+        watermark = self.query("SELECT value FROM export_meta WHERE key = 'watermark'")[0][0]
+        self.assertEqual(watermark, result.watermark.isoformat())
+
+    def test_incremental_export_replaces_only_changed_masters(self):
+        export_analytics(self.path)
+        changed, untouched, removed = self.masters
+        out = sqlite3.connect(self.path)
+        out.execute("UPDATE master_profiles SET display_name = 'как было' WHERE user_id = ?", [untouched.pk])
+        out.commit()
+        out.close()
+
+        make_slot(changed, timezone.now() + timedelta(days=3))
+        refresh_master_availability(changed.pk)
+        removed.delete()
+        with mock.patch('schedule.analytics.WATERMARK_OVERLAP', timedelta(0)):
+            result = export_analytics(self.path, incremental=True)
+
+        self.assertTrue(result.incremental)
+        self.assertEqual(result.masters, 1)
+        self.assertEqual(self.query('SELECT COUNT(*) FROM schedule_slots WHERE owner_id = ?', changed.pk), [(4,)])
+        self.assertEqual(
+            self.query('SELECT display_name FROM master_profiles WHERE user_id = ?', untouched.pk), [('как было',)]
+        )
+        self.assertEqual(self.query('SELECT COUNT(*) FROM bookings WHERE owner_id = ?', removed.pk), [(0,)])
+        self.assertEqual(self.query('SELECT COUNT(*) FROM bookings'), [(2,)])
+
+    def test_incremental_export_reads_live_database_without_copy(self):
+        export_analytics(self.path)
+        make_slot(self.masters[0], timezone.now() + timedelta(days=3))
+        refresh_master_availability(self.masters[0].pk)
+        with mock.patch('schedule.analytics._backup', side_effect=AssertionError('copied the database')):
+            result = export_analytics(self.path, incremental=True)
+        self.assertTrue(result.incremental)
+        self.assertEqual(
+            self.query('SELECT COUNT(*) FROM schedule_slots WHERE owner_id = ?', self.masters[0].pk), [(4,)]
+        )
+
+    def test_busy_backup_gives_up_at_capped_step(self):
+        steps = []
+
+        class Restarting:
+            def backup(self, target, pages, progress, sleep):
+                steps.append(pages)
+                progress(sqlite3.SQLITE_OK, 10, 20)
+                progress(sqlite3.SQLITE_OK, 15, 20)
+
+        with mock.patch.multiple(analytics, BACKUP_RETRY_DELAY=0, BACKUP_ATTEMPTS=3):
+            with self.assertRaises(SnapshotBusy):
+                analytics._backup(Restarting(), None, 1, max_pages=4)
+        self.assertEqual(steps, [1, 2, 4, 4, 4])
+
+    def test_command_reports_busy_database(self):
+        with mock.patch('schedule.analytics._backup', side_effect=SnapshotBusy('busy')):
+            with self.assertRaisesMessage(CommandError, 'try again later'):
+                call_command('export_analytics', self.path, stdout=StringIO())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_incremental_without_previous_export_is_full(self):
+        self.assertFalse(export_analytics(self.path, incremental=True).incremental)
+        self.assertTrue(export_analytics(self.path, incremental=True).incremental)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_analytics', self.path, stdout=out)
+        self.assertIn('of 3 masters (full)', out.getvalue())
+
+    def test_refuses_inside_transaction(self):
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                export_analytics(self.path)
+
+
+class WorkingHoursRulesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='rules@test.com', username='rules', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Педикюр', duration_min=60, price=2500
+        )
+        self.day = timezone.localdate() + timedelta(days=2)
+        WorkingHours.objects.create(owner=self.user, weekday=self.day.weekday(), start_time=time(10), end_time=time(12))
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, time(hour, minute)))
+
+    def free_starts(self):
+        start = self.at(0)
+        return [s.start_at for s in free_slots(self.user.pk, start, start + timedelta(days=1))]
+
+    def test_hours_expand_to_slots_without_rows(self):
+        self.assertEqual(self.free_starts(), [self.at(10), self.at(10, 30), self.at(11), self.at(11, 30)])
+        self.assertFalse(ScheduleSlot.objects.exists())
+
+    def test_break_between_intervals(self):
+        WorkingHours.objects.create(owner=self.user, weekday=self.day.weekday(), start_time=time(13), end_time=time(14))
+        self.assertEqual(self.free_starts()[4:], [self.at(13), self.at(13, 30)])
+
+    def test_exceptions_replace_weekly_hours(self):
+        exception = ScheduleException.objects.create(owner=self.user, date=self.day)
+        self.assertEqual(self.free_starts(), [])
+        exception.start_time, exception.end_time = time(15), time(16)
+        exception.save()
+        self.assertEqual(self.free_starts(), [self.at(15), self.at(15, 30)])
+
+    def test_stored_slots_take_precedence(self):
+        make_slot(self.user, self.at(10, 15), minutes=30, status=ScheduleSlot.Status.BLOCKED)
+        make_slot(self.user, self.at(9))
+        # 10:00 and 10:30 overlap the block; the stored 9:00 slot is offered as before
+        self.assertEqual(self.free_starts(), [self.at(9), self.at(11), self.at(11, 30)])
+
+    def test_summary_counts_rule_slots(self):
+        refresh_master_availability(self.user.pk)
+        availability = MasterAvailability.objects.get(owner=self.user)
+        self.assertTrue(availability.has_availability)
+        # The weekly rule repeats a week later inside the 14-day window
+        next_week = self.day + timedelta(days=7)
+        self.assertEqual(availability.day_counts, {self.day.isoformat(): 4, next_week.isoformat(): 4})
+
+    def test_booking_materializes_only_the_booked_slots(self):
+        ref = free_slots(self.user.pk, self.at(11), self.at(12))[0].ref
+        booking = booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=ref,
+            client_name='Клиент', client_phone='+7999'
+        )
+        booked = list(booking.booked_slots.order_by('start_at'))
+        self.assertEqual([s.start_at for s in booked], [self.at(11), self.at(11, 30)])
+        self.assertTrue(all(s.source == ScheduleSlot.Source.RULE for s in booked))
+        self.assertEqual(booking.slot, booked[0])
+        self.assertEqual(ScheduleSlot.objects.count(), 2)
+        self.assertEqual(self.free_starts(), [self.at(10), self.at(10, 30)])
+
+        with self.assertRaisesMessage(ValueError, 'Слот уже занят'):
+            booking_engine.create_booking(
+                owner=self.user, service=self.service, slot_id=ref,
+                client_name='Второй', client_phone='+7999'
+            )
+
+    def test_cancelled_rule_slots_follow_the_rules(self):
+        ref = free_slots(self.user.pk, self.at(11), self.at(12))[0].ref
+        booking = booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=ref,
+            client_name='Клиент', client_phone='+7999'
+        )
+        booking.cancel()
+        self.assertEqual(self.free_starts(), [self.at(10), self.at(10, 30), self.at(11), self.at(11, 30)])
+
+        # A ref from a grid rendered before the booking still books the stored row
+        again = booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=ref,
+            client_name='Снова', client_phone='+7999'
+        )
+        self.assertEqual(again.slot, booking.slot)
+        again.cancel()
+
+        ScheduleException.objects.create(owner=self.user, date=self.day)
+        WorkingHours.objects.filter(owner=self.user).delete()
+        self.assertEqual(self.free_starts(), [])
+        self.assertFalse(MasterAvailability.objects.get(owner=self.user).has_availability)
+        self.assertEqual(Booking.objects.filter(status=Booking.Status.CANCELLED).count(), 2)
+
+    def test_concurrent_materialization_is_a_conflict(self):
+        slot = free_slots(self.user.pk, self.at(10), self.at(11))[0]
+        ScheduleSlot.objects.create(
+            owner=self.user, start_at=slot.start_at, end_at=slot.end_at,
+            status=ScheduleSlot.Status.BOOKED, source=ScheduleSlot.Source.RULE
+        )
+        with self.assertRaises(booking_engine.SlotConflict):
+            booking_engine.materialize_slots([slot])
+
+    def test_cabinet_page_adds_hours_and_rejects_overlap(self):
+        self.client.login(username='rules@test.com', password='pass123')
+        url = reverse('working_hours')
+        resp = self.client.post(url, {
+            'weekday': self.day.weekday(), 'start_time': '13:00', 'end_time': '15:00', 'slot_minutes': 60,
+            'add_hours': '1',
+        })
+        self.assertRedirects(resp, url)
+        resp = self.client.post(url, {
+            'weekday': self.day.weekday(), 'start_time': '11:00', 'end_time': '13:30', 'slot_minutes': 30,
+            'add_hours': '1',
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(WorkingHours.objects.filter(owner=self.user).count(), 2)
+
+        resp = self.client.post(url, {'date': self.day.isoformat(), 'slot_minutes': 30, 'add_exception': '1'})
+        self.assertRedirects(resp, url)
+        self.assertNotIn(self.day.isoformat(), MasterAvailability.objects.get(owner=self.user).day_counts)
+
+    def test_zero_slot_minutes_rejected(self):
+        self.client.login(username='rules@test.com', password='pass123')
+        url = reverse('working_hours')
+        resp = self.client.post(url, {
+            'weekday': self.day.weekday(), 'start_time': '13:00', 'end_time': '15:00', 'slot_minutes': 0,
+            'add_hours': '1',
+        })
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context['hours_form'].has_error('slot_minutes'))
+        resp = self.client.post(url, {'date': self.day.isoformat(), 'slot_minutes': 0, 'add_exception': '1'})
+        self.assertTrue(resp.context['exception_form'].has_error('slot_minutes'))
+        self.assertEqual(WorkingHours.objects.filter(owner=self.user).count(), 1)
+        self.assertFalse(ScheduleException.objects.exists())
+
+    def test_zero_step_interval_is_skipped(self):
+        # A row stored before the validators existed must not hang the expansion
+        WorkingHours.objects.filter(owner=self.user).update(slot_minutes=0)
+        self.assertEqual(self.free_starts(), [])
+
+
+class AdminScaleTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            email='admin@test.com', username='admin', password='pass123', role=User.Role.ADMIN
+        )
+        self.user = User.objects.create_user(
+            email='adm@test.com', username='adm', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.other = User.objects.create_user(
+            email='adm2@test.com', username='adm2', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=30, price=1)
+        self.day = timezone.localdate() + timedelta(days=2)
+        self.client.login(username='admin@test.com', password='pass123')
+
+    def at(self, hour, day=None):
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour)))
+
+    def book(self, slot):
+        booking = Booking.objects.create(
+            owner=slot.owner, service=self.service, slot=slot, client_name='Клиент', client_phone='+79990000000'
+        )
+        ScheduleSlot.objects.filter(pk=slot.pk).update(status=ScheduleSlot.Status.BOOKED, booking=booking)
+        return booking
+
+    def test_changelists_filter_by_owner_and_period(self):
+        make_slot(self.user, self.at(10))
+        make_slot(self.other, self.at(11))
+        make_slot(self.user, self.at(10, self.day + timedelta(days=40)))
+        url = reverse('admin:schedule_scheduleslot_changelist')
+        resp = self.client.get(url, {'owner': self.user.pk, 'start_date_period': f'{self.day:%Y-%m-%d}'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([slot.start_at for slot in resp.context['cl'].result_list], [self.at(10)])
+        # The master filter is an autocomplete box, not a list of every user
+        self.assertContains(resp, 'id="owner_filter"')
+        self.assertNotContains(resp, 'adm2@test.com</a>')
+
+        resp = self.client.get(url, {'start_date_period': f'{self.day:%Y-%m}'})
+        self.assertContains(resp, f'start_date_period={self.day:%Y-%m-%d}')
+        self.assertEqual(resp.context['cl'].result_count, 2)
+
+        for name in ('booking', 'workinghours', 'scheduleexception', 'archivedbooking', 'archivedslot'):
+            resp = self.client.get(reverse(f'admin:schedule_{name}_changelist'), {'owner': self.user.pk})
+            self.assertEqual(resp.status_code, 200, name)
+
+    def test_booking_changelist_query_count_does_not_grow(self):
+        for hour in range(9, 19):
+            self.book(make_slot(self.user, self.at(hour)))
+        url = reverse('admin:schedule_booking_changelist')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for hour in range(9, 19):
+            self.book(make_slot(self.user, self.at(hour, self.day + timedelta(days=1))))
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(url)
+        self.assertEqual(len(many), len(few))
+
+    def test_paginator_caps_count_and_uses_table_statistics(self):
+        for hour in range(9, 12):
+            make_slot(self.user, self.at(hour))
+        paginator = ApproximateCountPaginator(ScheduleSlot.objects.all(), 100)
+        self.assertEqual(paginator.count, 3)
+        with mock.patch('schedule.changelist.ADMIN_COUNT_LIMIT', 2):
+            self.assertEqual(ApproximateCountPaginator(ScheduleSlot.objects.all(), 100).count, 2)
+            with mock.patch('schedule.changelist.table_row_estimate', return_value=ADMIN_COUNT_LIMIT * 3):
+                # Unfiltered lists are sized from the statistics; filtered ones are counted
+                self.assertEqual(ApproximateCountPaginator(ScheduleSlot.objects.all(), 100).count, ADMIN_COUNT_LIMIT * 3)
+                filtered = ScheduleSlot.objects.filter(owner=self.user)
+                self.assertEqual(ApproximateCountPaginator(filtered, 100).count, 2)
+
+    def test_block_day_action(self):
+        free = make_slot(self.user, self.at(10))
+        other_free = make_slot(self.user, self.at(12))
+        booking = self.book(make_slot(self.user, self.at(11)))
+        ScheduleException.objects.create(owner=self.user, date=self.day, start_time=time(9), end_time=time(18))
+        untouched = make_slot(self.other, self.at(10))
+        refresh_master_availability(self.user.pk)
+        version = data_version(self.user)
+
+        resp = self.client.post(reverse('admin:schedule_scheduleslot_changelist'), {
+            'action': 'block_master_days', '_selected_action': [free.pk],
+        }, follow=True)
+        self.assertContains(resp, 'Закрыто дней: 1')
+        statuses = dict(ScheduleSlot.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[free.pk], ScheduleSlot.Status.BLOCKED)
+        self.assertEqual(statuses[other_free.pk], ScheduleSlot.Status.BLOCKED)
+        self.assertEqual(statuses[booking.slot_id], ScheduleSlot.Status.BOOKED)
+        self.assertEqual(statuses[untouched.pk], ScheduleSlot.Status.AVAILABLE)
+        self.assertTrue(all(e.is_day_off for e in ScheduleException.objects.filter(owner=self.user, date=self.day)))
+        self.assertFalse(ScheduleException.objects.filter(owner=self.other).exists())
+        self.assertFalse(MasterAvailability.objects.get(owner=self.user).has_availability)
+        self.assertGreater(data_version(self.user), version)
+
+    def test_block_day_creates_day_off_without_exception(self):
+        WorkingHours.objects.create(owner=self.user, weekday=self.day.weekday(), start_time=time(10), end_time=time(12))
+        slot = make_slot(self.user, self.at(14))
+        self.client.post(reverse('admin:schedule_scheduleslot_changelist'), {
+            'action': 'block_master_days', '_selected_action': [slot.pk],
+        })
+        exception = ScheduleException.objects.get(owner=self.user)
+        self.assertEqual(exception.date, self.day)
+        self.assertTrue(exception.is_day_off)
+        start = self.at(0)
+        self.assertEqual(free_slots(self.user.pk, start, start + timedelta(days=1)), [])
+
+    def test_cancel_bookings_action_is_set_based(self):
+        bookings = [self.book(make_slot(self.user, self.at(hour))) for hour in range(9, 15)]
+        cancelled = self.book(make_slot(self.user, self.at(16)))
+        cancelled.cancel()
+        refresh_master_availability(self.user.pk)
+
+        selected = [booking.pk for booking in bookings + [cancelled]]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(reverse('admin:schedule_booking_changelist'), {
+                'action': 'cancel_selected', '_selected_action': selected,
+            })
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(
+            len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE "bookings"')]), 1
+        )
+        self.assertEqual(Booking.objects.filter(status=Booking.Status.CANCELLED).count(), 7)
+        self.assertFalse(ScheduleSlot.objects.exclude(status=ScheduleSlot.Status.AVAILABLE).exists())
+        self.assertFalse(ScheduleSlot.objects.filter(booking__isnull=False).exists())
+        self.assertTrue(MasterAvailability.objects.get(owner=self.user).has_availability)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite overlap triggers')
+class OverlapMigrationTest(TestCase):
+    migration = import_module('schedule.migrations.0010_slot_no_overlap')
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='mig@test.com', username='mig', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(owner=self.user, salon=salon, name='Стрижка', duration_min=30, price=1)
+        self.start = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+        # Rows from before the guard existed; the test transaction restores the triggers
+        with connection.cursor() as cursor:
+            for sql in self.migration.SQLITE_BACKWARD:
+                cursor.execute(sql)
+
+    def test_cancelled_booking_start_slot_is_kept(self):
+        kept = make_slot(self.user, self.start)
+        anchor = make_slot(self.user, self.start)
+        booking = Booking.objects.create(
+            owner=self.user, service=self.service, slot=anchor, client_name='К', client_phone='1',
+            status=Booking.Status.CANCELLED
+        )
+        self.migration.drop_overlapping_free_slots(apps, None)
+        self.assertTrue(Booking.objects.filter(pk=booking.pk).exists())
+        self.assertEqual(list(ScheduleSlot.objects.values_list('pk', flat=True)), [anchor.pk])
+        self.assertFalse(ScheduleSlot.objects.filter(pk=kept.pk).exists())
+
+    def test_overlapping_slots_in_use_are_reported(self):
+        first = make_slot(self.user, self.start, status=ScheduleSlot.Status.BLOCKED)
+        second = make_slot(self.user, self.start + timedelta(minutes=15), status=ScheduleSlot.Status.BOOKED)
+        with self.assertRaisesMessage(RuntimeError, f'{first.pk}/{second.pk}'):
+            self.migration.drop_overlapping_free_slots(apps, None)
+        self.assertEqual(ScheduleSlot.objects.count(), 2)
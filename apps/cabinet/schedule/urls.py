@@ -1,14 +1,28 @@
 from django.urls import path
+
+from masters.conditional import conditional_page, cabinet_master
 from . import views
 
 urlpatterns = [
     # Slots
-    path('slots/', views.SlotListView.as_view(), name='slot_list'),
+    path('slots/', conditional_page(cabinet_master)(views.SlotListView.as_view()), name='slot_list'),
+    path('slots/export/', views.SlotExportView.as_view(), name='slot_export'),
     path('slots/create/', views.SlotCreateView.as_view(), name='slot_create'),
     path('slots/<int:pk>/delete/', views.SlotDeleteView.as_view(), name='slot_delete'),
 
+    # Working hours
+    path('hours/', views.WorkingHoursView.as_view(), name='working_hours'),
+    path('hours/<int:pk>/delete/', views.WorkingHoursDeleteView.as_view(), name='working_hours_delete'),
+    path(
+        'hours/exceptions/<int:pk>/delete/',
+        views.ScheduleExceptionDeleteView.as_view(),
+        name='schedule_exception_delete'
+    ),
+
     # Bookings
-    path('bookings/', views.BookingListView.as_view(), name='booking_list'),
+    path('bookings/', conditional_page(cabinet_master)(views.BookingListView.as_view()), name='booking_list'),
+    path('bookings/export/', views.BookingExportView.as_view(), name='booking_export'),
+    path('bookings/history/', views.BookingHistoryView.as_view(), name='booking_history'),
     path('bookings/<int:pk>/', views.BookingDetailView.as_view(), name='booking_detail'),
     path('bookings/<int:pk>/cancel/', views.BookingCancelView.as_view(), name='booking_cancel'),
 ]
@@ -1,50 +1,75 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.utils import timezone
-from django.views.generic import ListView, DetailView, FormView, DeleteView, View
+from django.views.generic import ListView, DetailView, FormView, DeleteView, TemplateView, View
 
 from masters.views import MasterRequiredMixin
-from .models import ScheduleSlot, Booking
-from .forms import SlotCreateForm
+from .models import ScheduleSlot, Booking, WorkingHours, ScheduleException, ArchivedBooking
+from .export import booking_rows, export_response, slot_rows
+from .forms import SlotCreateForm, WorkingHoursForm, ScheduleExceptionForm
+from .pagination import KeysetPaginationMixin
+from .writer import run_booking_write, WriteQueueTimeout, WRITE_TIMEOUT_MESSAGE
+
+
+def parse_date(value):
+    """``YYYY-MM-DD`` as a date, or ``None``."""
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def filter_slots(request):
+    """The master's slots narrowed by the ``from``/``to`` dates in the query string (default: from today)."""
+    queryset = ScheduleSlot.objects.filter(owner=request.user)
+
+    # Filter by date range
+    date_from = request.GET.get('from')
+    date_to = request.GET.get('to')
+
+    if date_from:
+        try:
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+            queryset = queryset.filter(start_date__gte=date_from)
+        except ValueError:
+            pass
+
+    if date_to:
+        try:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
+            queryset = queryset.filter(start_date__lte=date_to)
+        except ValueError:
+            pass
+
+    # Default: show slots from today
+    if not date_from and not date_to:
+        queryset = queryset.filter(start_date__gte=timezone.localdate())
+
+    return queryset
 
 
 # Slot views
-class SlotListView(MasterRequiredMixin, ListView):
+class SlotListView(MasterRequiredMixin, KeysetPaginationMixin, ListView):
     """List master's schedule slots."""
     model = ScheduleSlot
     template_name = 'schedule/slot_list.html'
     context_object_name = 'slots'
+    keyset_ordering = ('start_at', 'pk')
 
     def get_queryset(self):
-        queryset = ScheduleSlot.objects.filter(owner=self.request.user)
-
-        # Filter by date range
-        date_from = self.request.GET.get('from')
-        date_to = self.request.GET.get('to')
-
-        if date_from:
-            try:
-                date_from = datetime.strptime(date_from, '%Y-%m-%d')
-                queryset = queryset.filter(start_at__date__gte=date_from)
-            except ValueError:
-                pass
+        queryset = filter_slots(self.request)
 
-        if date_to:
-            try:
-                date_to = datetime.strptime(date_to, '%Y-%m-%d')
-                queryset = queryset.filter(start_at__date__lte=date_to)
-            except ValueError:
-                pass
-
-        # Default: show slots from today
-        if not date_from and not date_to:
-            queryset = queryset.filter(start_at__date__gte=timezone.now().date())
-
-        return queryset.order_by('start_at')
+        # Booked rows show their client; one LEFT JOIN instead of a lookup per row
+        return queryset.select_related('booking').order_by('start_at')
 
 
 class SlotCreateView(MasterRequiredMixin, FormView):
@@ -54,8 +79,18 @@ class SlotCreateView(MasterRequiredMixin, FormView):
     success_url = reverse_lazy('slot_list')
 
     def form_valid(self, form):
-        count = form.generate_slots(self.request.user)
-        messages.success(self.request, f'Создано слотов: {count}')
+        result = form.generate_slots(self.request.user)
+        messages.success(self.request, f'Создано слотов: {result.created}')
+        if result.skipped:
+            # Re-submits of the same week land here instead of duplicating rows
+            shown = ', '.join(
+                timezone.localtime(slot.start_at).strftime('%d.%m %H:%M') for slot in result.skipped[:5]
+            )
+            more = ' и др.' if len(result.skipped) > 5 else ''
+            messages.warning(
+                self.request,
+                f'Пропущено слотов, пересекающихся с существующими: {len(result.skipped)} ({shown}{more})'
+            )
         return super().form_valid(form)
 
 
@@ -72,12 +107,70 @@ class SlotDeleteView(MasterRequiredMixin, DeleteView):
         )
 
 
+class SlotExportView(MasterRequiredMixin, View):
+    """Download the slots the slot list shows, every page of them, as CSV or XLSX."""
+
+    def get(self, request):
+        slots = filter_slots(request).select_related('booking').order_by('start_at', 'pk')
+        return export_response(slot_rows(slots), 'slots', request.GET.get('format'))
+
+
+# Working hours views
+class WorkingHoursView(MasterRequiredMixin, TemplateView):
+    """Weekly working hours and date exceptions; free time is computed from them."""
+    template_name = 'schedule/working_hours.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['hours'] = WorkingHours.objects.filter(owner=self.request.user)
+        context['exceptions'] = ScheduleException.objects.filter(
+            owner=self.request.user,
+            date__gte=timezone.localdate()
+        )
+        context.setdefault('hours_form', WorkingHoursForm(owner=self.request.user))
+        context.setdefault('exception_form', ScheduleExceptionForm())
+        return context
+
+    def post(self, request):
+        # Both forms post here; the submit button names the one that was sent
+        if 'add_exception' in request.POST:
+            form, name, message = ScheduleExceptionForm(request.POST), 'exception_form', 'Исключение добавлено'
+        else:
+            form, name, message = WorkingHoursForm(request.POST, owner=request.user), 'hours_form', 'Рабочие часы добавлены'
+
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(**{name: form}))
+        form.instance.owner = request.user
+        form.save()
+        messages.success(request, message)
+        return redirect('working_hours')
+
+
+class WorkingHoursDeleteView(MasterRequiredMixin, View):
+    """Remove a weekly interval."""
+
+    def post(self, request, pk):
+        get_object_or_404(WorkingHours, pk=pk, owner=request.user).delete()
+        messages.success(request, 'Рабочие часы удалены')
+        return redirect('working_hours')
+
+
+class ScheduleExceptionDeleteView(MasterRequiredMixin, View):
+    """Remove a date exception."""
+
+    def post(self, request, pk):
+        get_object_or_404(ScheduleException, pk=pk, owner=request.user).delete()
+        messages.success(request, 'Исключение удалено')
+        return redirect('working_hours')
+
+
 # Booking views
-class BookingListView(MasterRequiredMixin, ListView):
+class BookingListView(MasterRequiredMixin, KeysetPaginationMixin, ListView):
     """List master's bookings."""
     model = Booking
     template_name = 'schedule/booking_list.html'
     context_object_name = 'bookings'
+    keyset_ordering = ('-created_at', '-pk')
 
     def get_queryset(self):
         queryset = Booking.objects.filter(owner=self.request.user)
@@ -90,6 +183,54 @@ class BookingListView(MasterRequiredMixin, ListView):
         return queryset.select_related('service', 'slot')
 
 
+class BookingHistoryView(MasterRequiredMixin, KeysetPaginationMixin, ListView):
+    """Bookings moved to the archive by the retention job."""
+    model = ArchivedBooking
+    template_name = 'schedule/booking_history.html'
+    context_object_name = 'bookings'
+    keyset_ordering = ('-start_at', '-pk')
+
+    def get_queryset(self):
+        queryset = ArchivedBooking.objects.filter(owner=self.request.user)
+
+        status = self.request.GET.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+
+        return queryset.order_by('-start_at')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['archive_days'] = settings.SCHEDULE_ARCHIVE_AFTER_DAYS
+        return context
+
+
+class BookingExportView(MasterRequiredMixin, View):
+    """Download bookings, archived ones included, as CSV or XLSX; ``status``, ``from`` and ``to`` filter in SQL."""
+
+    def get(self, request):
+        archived = ArchivedBooking.objects.filter(owner=request.user)
+        current = Booking.objects.filter(owner=request.user).select_related('service', 'slot')
+
+        status = request.GET.get('status')
+        if status:
+            archived = archived.filter(status=status)
+            current = current.filter(status=status)
+
+        date_from = parse_date(request.GET.get('from'))
+        if date_from:
+            archived = archived.filter(start_at__gte=day_start(date_from))
+            current = current.filter(slot__start_date__gte=date_from)
+
+        date_to = parse_date(request.GET.get('to'))
+        if date_to:
+            archived = archived.filter(start_at__lt=day_start(date_to + timedelta(days=1)))
+            current = current.filter(slot__start_date__lte=date_to)
+
+        rows = booking_rows(archived.order_by('start_at', 'pk'), current.order_by('slot__start_at', 'pk'))
+        return export_response(rows, 'bookings', request.GET.get('format'))
+
+
 class BookingDetailView(MasterRequiredMixin, DetailView):
     """View booking details."""
     model = Booking
@@ -110,6 +251,10 @@ class BookingCancelView(MasterRequiredMixin, View):
             owner=request.user,
             status=Booking.Status.CREATED
         )
-        booking.cancel()
+        try:
+            run_booking_write(booking.owner_id, booking.cancel)
+        except WriteQueueTimeout:
+            messages.error(request, WRITE_TIMEOUT_MESSAGE)
+            return redirect('booking_list')
         messages.success(request, 'Запись отменена')
         return redirect('booking_list')
@@ -0,0 +1,115 @@
+"""Optional per-master write queue for booking creation and cancellation.
+
+SQLite allows a single writer, so concurrent booking transactions mostly wait
+on each other and fail with "database is locked". With
+``BOOKING_WRITE_QUEUE`` enabled, writes for one master are appended to that
+master's queue and executed in order by a dedicated worker thread; the HTTP
+request waits on a future for at most ``BOOKING_WRITE_TIMEOUT`` seconds.
+On SQLite all workers additionally share one process-wide lock, so in-process
+writers never contend for the database lock at all.
+
+Workers are started on first use and exit after ``WORKER_IDLE_TIMEOUT``
+seconds without jobs.
+"""
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+from django.db import connection, close_old_connections
+
+# Seconds an idle worker waits for new jobs before exiting
+WORKER_IDLE_TIMEOUT = 60
+
+DEFAULT_WRITE_TIMEOUT = 5
+
+WRITE_TIMEOUT_MESSAGE = 'Сервис записи перегружен. Пожалуйста, попробуйте ещё раз.'
+
+
+class WriteQueueTimeout(Exception):
+    """The queued write did not start before the request timeout."""
+
+
+class MasterWriteQueue:
+    """Per-master FIFO queues, each drained by its own worker thread."""
+
+    def __init__(self, idle_timeout=WORKER_IDLE_TIMEOUT, serialize=None):
+        self.idle_timeout = idle_timeout
+        # None: decide per job from the database vendor
+        self.serialize = serialize
+        self._queues = {}
+        self._registry_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def submit(self, owner_id, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` behind earlier writes for ``owner_id``; return a Future."""
+        future = Future()
+        with self._registry_lock:
+            jobs = self._queues.get(owner_id)
+            if jobs is None:
+                jobs = self._queues[owner_id] = queue.Queue()
+                threading.Thread(
+                    target=self._drain, args=(owner_id, jobs),
+                    name=f'booking-writer-{owner_id}', daemon=True
+                ).start()
+            jobs.put((future, fn, args, kwargs))
+        return future
+
+    def run(self, owner_id, fn, *args, timeout=None, **kwargs):
+        """Submit a write and wait for its result, re-raising any exception it raised."""
+        future = self.submit(owner_id, fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise WriteQueueTimeout()
+            # Already running: the transaction is short, let it finish so the caller sees its outcome
+            return future.result()
+
+    def active_workers(self):
+        with self._registry_lock:
+            return len(self._queues)
+
+    def _drain(self, owner_id, jobs):
+        try:
+            while True:
+                try:
+                    future, fn, args, kwargs = jobs.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    with self._registry_lock:
+                        # submit() puts under the same lock, so nothing can slip in after this check
+                        if jobs.empty():
+                            del self._queues[owner_id]
+                            return
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    continue
+                close_old_connections()
+                try:
+                    result = self._execute(fn, args, kwargs)
+                except BaseException as exc:
+                    future.set_exception(exc)
+                else:
+                    future.set_result(result)
+        finally:
+            connection.close()
+
+    def _execute(self, fn, args, kwargs):
+        serialize = self.serialize
+        if serialize is None:
+            serialize = connection.vendor == 'sqlite'
+        if not serialize:
+            return fn(*args, **kwargs)
+        with self._write_lock:
+            return fn(*args, **kwargs)
+
+
+write_queue = MasterWriteQueue()
+
+
+def run_booking_write(owner_id, fn, *args, **kwargs):
+    """Run a booking write through the master's queue if enabled, else in the calling thread."""
+    if not getattr(settings, 'BOOKING_WRITE_QUEUE', False):
+        return fn(*args, **kwargs)
+    timeout = getattr(settings, 'BOOKING_WRITE_TIMEOUT', DEFAULT_WRITE_TIMEOUT)
+    return write_queue.run(owner_id, fn, *args, timeout=timeout, **kwargs)
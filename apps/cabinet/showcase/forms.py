@@ -4,7 +4,10 @@ from django import forms
 class PublicBookingForm(forms.Form):
     """Booking form for visitors."""
     service_id = forms.IntegerField(widget=forms.HiddenInput())
-    slot_id = forms.IntegerField(widget=forms.HiddenInput())
+    # Stored slot pk or ``r<timestamp>`` of a working-hours slot (ScheduleSlot.ref)
+    slot_id = forms.CharField(widget=forms.HiddenInput(), max_length=20)
+    hold_token = forms.CharField(widget=forms.HiddenInput(), required=False, max_length=32)
+    idempotency_key = forms.CharField(widget=forms.HiddenInput(), required=False, max_length=64)
     client_name = forms.CharField(
         label='Ваше имя',
         max_length=100,
@@ -0,0 +1,56 @@
+"""Versioned fragment cache for storefront templates, with hit/miss counters.
+
+Fragments are keyed on the master's ``data_version`` (see masters/versions.py)
+plus whatever else the block varies on, so a write never leaves a stale
+fragment behind; timeouts only bound how long time-dependent content (free
+slots, "nearest time") may lag behind the clock. Counters live in the cache
+so every process reports into the same numbers.
+"""
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+# Profile and salon cards: only edits change them, and edits bump the version
+PROFILE_FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+# Anything showing free time drifts as slots start, regardless of writes
+SCHEDULE_FRAGMENT_TIMEOUT = 60
+
+FRAGMENT_NAMES = ('master_profile', 'master_services', 'master_slots')
+
+
+def _counter_key(name, outcome):
+    return f'fragment_stats:{name}:{outcome}'
+
+
+def record(name, outcome):
+    """Count one ``outcome`` ('hits', 'misses', ...) of the named cache."""
+    key = _counter_key(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_or_render(name, vary_on, timeout, render):
+    """Return the cached fragment for ``(name, vary_on)``, rendering and storing it on a miss."""
+    key = make_template_fragment_key(name, vary_on)
+    value = cache.get(key)
+    if value is not None:
+        record(name, 'hits')
+        return value
+    record(name, 'misses')
+    value = render()
+    cache.set(key, value, timeout)
+    return value
+
+
+def fragment_stats(names=FRAGMENT_NAMES, outcomes=('hits', 'misses')):
+    """Return ``{name: (count per outcome, ...)}``."""
+    keys = {(name, outcome): _counter_key(name, outcome) for name in names for outcome in outcomes}
+    values = cache.get_many(keys.values())
+    return {name: tuple(values.get(keys[name, outcome], 0) for outcome in outcomes) for name in names}
+
+
+def reset_fragment_stats(names=FRAGMENT_NAMES, outcomes=('hits', 'misses')):
+    cache.delete_many([_counter_key(name, outcome) for name in names for outcome in outcomes])
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from showcase.fragments import fragment_stats, reset_fragment_stats
+from showcase.page_cache import PAGE_NAMES, PAGE_OUTCOMES
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the storefront fragment and page caches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing')
+
+    def handle(self, *args, **options):
+        for name, (hits, misses) in fragment_stats().items():
+            self._line(name, hits, misses)
+        for name, (hits, stale, fallbacks, misses) in fragment_stats(PAGE_NAMES, PAGE_OUTCOMES).items():
+            self._line(name, hits, misses, f'  stale {stale:>8}  fallbacks {fallbacks:>8}')
+        if options['reset']:
+            reset_fragment_stats()
+            reset_fragment_stats(PAGE_NAMES, PAGE_OUTCOMES)
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
+
+    def _line(self, name, hits, misses, extra=''):
+        total = hits + misses
+        ratio = hits / total * 100 if total else 0
+        self.stdout.write(f'{name:<20} hits {hits:>8}  misses {misses:>8}{extra}  hit rate {ratio:5.1f}%')
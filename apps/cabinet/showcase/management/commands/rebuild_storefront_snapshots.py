@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from showcase.snapshots import rebuild_all_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild storefront snapshots of all masters (after a deploy or bulk import, or from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--owner', type=int, action='append', dest='owners',
+            help='Rebuild only this master (user id); may be repeated'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = rebuild_all_snapshots(owner_ids=options['owners'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt storefront snapshots for {count} masters in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,164 @@
+import random
+import statistics
+import time
+import uuid
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, OperationalError
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import User
+from masters.models import Salon, Service
+from schedule.booking import is_lock_error
+from schedule.integrity import check_booking_invariants
+from schedule.models import ScheduleSlot, Booking
+from showcase.views import BookingCreateView
+
+SUCCESS, CONFLICT, LOCKED, ERROR = 'success', 'conflict', 'lock_error', 'error'
+
+
+def _post_bookings(slug, service_id, slot_ids, requests, seed):
+    """Worker: POST ``requests`` bookings at random starts, return (latency, outcome) pairs.
+
+    The view is called through ``RequestFactory`` rather than the test ``Client``:
+    the client collects exceptions via a global signal and would pick up errors
+    raised by requests running in other threads.
+    """
+    rng = random.Random(seed)
+    factory = RequestFactory()
+    view = BookingCreateView.as_view()
+    url = reverse('booking_create', args=[slug])
+    results = []
+    try:
+        for i in range(requests):
+            request = factory.post(url, {
+                'service_id': service_id,
+                'slot_id': rng.choice(slot_ids),
+                'client_name': f'Stress {seed}-{i}',
+                'client_phone': '+7 000',
+                'notes': '',
+            })
+            started = time.perf_counter()
+            try:
+                response = view(request, slug=slug)
+                outcome = SUCCESS if response.status_code == 302 else CONFLICT
+            except OperationalError as e:
+                outcome = LOCKED if is_lock_error(e) else ERROR
+            except Exception:
+                outcome = ERROR
+            results.append((time.perf_counter() - started, outcome))
+    finally:
+        connections.close_all()
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer one master\'s schedule with concurrent public booking POSTs, report '
+        'throughput/latency/conflicts and verify slot/booking invariants afterwards. '
+        'Runs against the configured database (file-based SQLite or PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--requests', type=int, default=50, help='Booking attempts per worker')
+        parser.add_argument('--slots', type=int, default=200, help='30 minute slots to create')
+        parser.add_argument('--service-minutes', type=int, default=60)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--write-queue', action='store_true',
+            help='Route bookings through the per-master write queue (BOOKING_WRITE_QUEUE)'
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the generated master and bookings')
+
+    def handle(self, *args, **options):
+        master, service, slot_ids = self._setup(options)
+        try:
+            queue_settings = override_settings(BOOKING_WRITE_QUEUE=True) if options['write_queue'] else nullcontext()
+            with queue_settings:
+                results, elapsed = self._run(master, service, slot_ids, options)
+                succeeded = self._report(master, results, elapsed)
+            problems = check_booking_invariants(master)
+            active = Booking.objects.filter(owner=master, status=Booking.Status.CREATED).count()
+            if active != succeeded:
+                # Every stored booking must correspond to exactly one success response
+                problems['unreported_bookings'] = active - succeeded
+            if problems:
+                raise CommandError(f'Invariant violations: {problems}')
+            self.stdout.write(self.style.SUCCESS('Invariants hold'))
+        finally:
+            if not options['keep']:
+                master.delete()
+
+    def _setup(self, options):
+        tag = uuid.uuid4().hex[:8]
+        master = User.objects.create_user(
+            email=f'stress-{tag}@stress.local', username=f'stress-{tag}',
+            password=None, role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=master, name='Stress')
+        service = Service.objects.create(
+            owner=master, salon=salon, name='Stress',
+            duration_min=options['service_minutes'], price=1
+        )
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        slots = [
+            ScheduleSlot(
+                owner=master,
+                start_at=start + timedelta(minutes=30 * i),
+                end_at=start + timedelta(minutes=30 * (i + 1)),
+                start_date=timezone.localdate(start + timedelta(minutes=30 * i)),
+            )
+            for i in range(options['slots'])
+        ]
+        ScheduleSlot.objects.bulk_create(slots)
+        slot_ids = list(ScheduleSlot.objects.filter(owner=master).values_list('pk', flat=True))
+        return master, service, slot_ids
+
+    def _run(self, master, service, slot_ids, options):
+        slug = master.master_profile.slug
+        workers = options['workers']
+        if options['mode'] == 'process':
+            # Forked workers must not share the parent's database connection
+            connection.close()
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+        started = time.perf_counter()
+        with executor:
+            futures = [
+                executor.submit(
+                    _post_bookings, slug, service.pk, slot_ids, options['requests'], options['seed'] + i
+                )
+                for i in range(workers)
+            ]
+            results = [r for f in futures for r in f.result()]
+        return results, time.perf_counter() - started
+
+    def _report(self, master, results, elapsed):
+        latencies = sorted(latency for latency, _ in results)
+        counts = {outcome: 0 for outcome in (SUCCESS, CONFLICT, LOCKED, ERROR)}
+        for _, outcome in results:
+            counts[outcome] += 1
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        self.stdout.write(f'Database: {connection.vendor}, write queue: {settings.BOOKING_WRITE_QUEUE}, requests: {len(results)}, wall time: {elapsed:.2f}s')
+        self.stdout.write(f'Bookings/sec: {counts[SUCCESS] / elapsed:.1f}')
+        self.stdout.write(
+            f'Latency p50: {percentile(0.5):.1f} ms, p99: {percentile(0.99):.1f} ms, '
+            f'mean: {statistics.mean(latencies) * 1000:.1f} ms'
+        )
+        self.stdout.write(
+            'Outcomes: ' + ', '.join(f'{name}={count}' for name, count in counts.items())
+        )
+        return counts[SUCCESS]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorefrontSnapshot',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='storefront_snapshot', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Мастер')),
+                ('data_version', models.PositiveIntegerField(verbose_name='Версия данных мастера')),
+                ('window_end', models.DateTimeField(verbose_name='Конец окна доступности')),
+                ('payload', models.JSONField(default=dict, verbose_name='Данные витрины')),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Снимок витрины',
+                'verbose_name_plural': 'Снимки витрины',
+                'db_table': 'storefront_snapshots',
+            },
+        ),
+    ]
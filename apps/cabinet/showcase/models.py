@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.db import models
+
+
+class StorefrontSnapshot(models.Model):
+    """Precomputed storefront read model of one master (see snapshots.py)."""
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='storefront_snapshot',
+        verbose_name='Мастер'
+    )
+    # MasterProfile.data_version the snapshot was built from
+    data_version = models.PositiveIntegerField('Версия данных мастера')
+    window_end = models.DateTimeField('Конец окна доступности')
+    payload = models.JSONField('Данные витрины', default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'storefront_snapshots'
+        verbose_name = 'Снимок витрины'
+        verbose_name_plural = 'Снимки витрины'
+
+    def __str__(self):
+        return f'{self.owner_id} v{self.data_version}'
@@ -0,0 +1,204 @@
+"""Full-response cache for anonymous storefront pages.
+
+A cached page is served without touching the database. The entry remembers
+which master it shows and stays valid while that master's page generation
+(see masters/versions.py) and, for the slot grid, the holds version are
+unchanged, for at most ``PAGE_CACHE_TIMEOUT`` seconds. Once an entry is
+outdated, one request rebuilds it and everyone else gets the old copy
+meanwhile.
+
+The rebuild runs within ``STOREFRONT_READ_BUDGET`` (see read_budget.py). If
+the database is locked or too slow, the old copy is served with a notice of
+when it was rendered and the rebuild is retried in the background. Only
+reads degrade: booking still re-checks the slot in its own transaction, so a
+stale grid cannot lead to a double booking.
+
+Only visitors without a session or pending messages are served from here.
+Responses that set cookies (a CSRF token, for one) are never stored. The
+booking form is not page-cached and issues its own token when it is opened,
+so cached pages need no per-visitor data.
+"""
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.formats import time_format
+
+from masters.resolver import resolver
+from masters.versions import CATALOG_GENERATION_KEY, page_generation_key
+from schedule.holds import HOLD_COOKIE, holds_version, token_holds_for
+
+from .fragments import record
+from .read_budget import read_budget, run_in_background
+
+# Free time drifts with the clock, so even an unchanged master is re-rendered this often
+PAGE_CACHE_TIMEOUT = 60
+
+# How long an outdated entry is kept around to be served while it is rebuilt or the database is unavailable
+PAGE_STALE_TIMEOUT = 60 * 60
+
+REBUILD_LOCK_TIMEOUT = 10
+
+PAGE_NAMES = ('page_masters_catalog', 'page_master_page', 'page_master_slots')
+
+PAGE_OUTCOMES = ('hits', 'stale', 'fallbacks', 'misses')
+
+STALE_NOTICE_MARKER = b'<!--stale-page-notice-->'
+
+
+def is_cacheable_request(request):
+    """Anonymous GETs only: a session may mean a logged-in user, a messages cookie pending messages."""
+    if not settings.STOREFRONT_PAGE_CACHE or request.method not in ('GET', 'HEAD'):
+        return False
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and 'messages' not in request.COOKIES
+
+
+def _page_key(name, request):
+    return f'page:{name}:{md5(request.get_full_path().encode()).hexdigest()}'
+
+
+def _validators(master_id, with_holds):
+    """Return the values a page of the master depends on, as they are now."""
+    key = page_generation_key(master_id) if master_id else CATALOG_GENERATION_KEY
+    validators = {'generation': cache.get(key)}
+    if with_holds:
+        validators['holds'] = holds_version(master_id)
+    return validators
+
+
+def _generation_before(kwargs):
+    """Return ``(master_id, generation)`` for the page about to render.
+
+    Read before the view runs: a write committing while it renders must leave
+    the stored page outdated, not mark old content with the new generation.
+    """
+    slug = kwargs.get('slug')
+    if slug is None:
+        return None, cache.get(CATALOG_GENERATION_KEY)
+    # Only the id is taken here; the view resolves the master again, after this read
+    master = resolver.get(slug)
+    if master is None:
+        return None, None
+    return master.user_id, cache.get(page_generation_key(master.user_id))
+
+
+def _is_fresh(entry):
+    return entry['expires'] > time.time() and entry['validators'] == _validators(
+        entry['master_id'], 'holds' in entry['validators']
+    )
+
+
+def _store(key, request, response, before):
+    if response.status_code != 200 or response.cookies or request.META.get('CSRF_COOKIE_NEEDED'):
+        return
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    context = getattr(response, 'context_data', None) or {}
+    if context.get('viewer'):
+        # This visitor sees their own held slots; the page is theirs alone
+        return
+    profile = context.get('profile')
+    master_id = profile.user_id if profile else None
+    expected_id, generation = before
+    if master_id != expected_id:
+        # The slug moved to another master while the page rendered
+        return
+    validators = {'generation': generation}
+    if 'holds_version' in context:
+        validators['holds'] = context['holds_version']
+    now = time.time()
+    cache.set(key, {
+        'master_id': master_id,
+        'validators': validators,
+        'rendered_at': now,
+        'expires': now + PAGE_CACHE_TIMEOUT,
+        'content': response.content,
+        'content_type': response['Content-Type'],
+    }, PAGE_CACHE_TIMEOUT + PAGE_STALE_TIMEOUT)
+
+
+def _cached_response(entry, outcome):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Page-Cache'] = outcome
+    return response
+
+
+def _fallback_response(entry):
+    """Serve an outdated entry with a notice of when it was rendered."""
+    rendered_at = timezone.localtime(datetime.fromtimestamp(entry['rendered_at'], tz=dt_timezone.utc))
+    notice = (
+        '<div class="alert alert-warning" role="status">'
+        f'Показаны данные на {time_format(rendered_at, "H:i")} — расписание обновляется. '
+        'Свободность времени проверяется при записи.'
+        '</div>'
+    )
+    response = _cached_response(entry, 'fallback')
+    response.content = entry['content'].replace(STALE_NOTICE_MARKER, notice.encode(), 1)
+    return response
+
+
+def _revalidate(key, view, request, args, kwargs):
+    """Rebuild the entry in the background, then release the rebuild lock."""
+    def rebuild():
+        before = _generation_before(kwargs)
+        _store(key, request, view(request, *args, **kwargs), before)
+
+    return run_in_background(rebuild, cleanup=lambda: cache.delete(f'{key}:lock'))
+
+
+def cache_page_for_anonymous(name):
+    """Decorate a storefront view with the anonymous full-page cache; ``name`` labels its counters."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            key = _page_key(name, request)
+            entry = cache.get(key)
+            if entry is not None:
+                if 'holds' in entry['validators'] and token_holds_for(
+                    request.COOKIES.get(HOLD_COOKIE), entry['master_id']
+                ):
+                    return view(request, *args, **kwargs)
+                if _is_fresh(entry):
+                    record(name, 'hits')
+                    return _cached_response(entry, 'hit')
+                if not cache.add(f'{key}:lock', 1, REBUILD_LOCK_TIMEOUT):
+                    # Someone is already rebuilding this page
+                    record(name, 'stale')
+                    return _cached_response(entry, 'stale')
+
+            if entry is None:
+                record(name, 'misses')
+                before = _generation_before(kwargs)
+                response = view(request, *args, **kwargs)
+                _store(key, request, response, before)
+                response['X-Page-Cache'] = 'miss'
+                return response
+
+            try:
+                with read_budget(settings.STOREFRONT_READ_BUDGET):
+                    before = _generation_before(kwargs)
+                    response = view(request, *args, **kwargs)
+                    _store(key, request, response, before)
+            except OperationalError:
+                # Locked or slow database: show the last good copy; the lock is released by the background rebuild
+                record(name, 'fallbacks')
+                _revalidate(key, view, request, args, kwargs)
+                return _fallback_response(entry)
+            except Exception:
+                cache.delete(f'{key}:lock')
+                raise
+            cache.delete(f'{key}:lock')
+            record(name, 'misses')
+            response['X-Page-Cache'] = 'miss'
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,89 @@
+"""Bounded database reads for storefront rebuilds.
+
+Inside ``read_budget(seconds)`` a read that waits on a lock or runs past the
+budget fails fast with ``OperationalError`` instead of blocking the request
+for the driver's full timeout: SQLite gets a shorter busy timeout and a
+progress handler that interrupts statements past the deadline; PostgreSQL
+gets ``lock_timeout`` and ``statement_timeout``. Other backends run unbounded.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import close_old_connections, connection, OperationalError
+
+# VM instructions between deadline checks of a running SQLite statement
+SQLITE_PROGRESS_STEPS = 10000
+
+
+@contextmanager
+def read_budget(seconds):
+    """Make database reads in the block fail with ``OperationalError`` once ``seconds`` have passed."""
+    if not seconds or connection.in_atomic_block:
+        # A transaction opened by the caller owns the connection settings; leave them alone
+        yield
+        return
+    connection.ensure_connection()
+    if connection.vendor == 'sqlite':
+        with _sqlite_budget(seconds):
+            yield
+    elif connection.vendor == 'postgresql':
+        with _postgres_budget(seconds):
+            yield
+    else:
+        yield
+
+
+@contextmanager
+def _sqlite_budget(seconds):
+    raw = connection.connection
+    deadline = time.monotonic() + seconds
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA busy_timeout')
+        previous = cursor.fetchone()[0]
+        cursor.execute(f'PRAGMA busy_timeout = {int(seconds * 1000)}')
+    # A non-zero return aborts the statement with "interrupted"
+    raw.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+    try:
+        yield
+    finally:
+        raw.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA busy_timeout = {int(previous)}')
+
+
+@contextmanager
+def _postgres_budget(seconds):
+    milliseconds = int(seconds * 1000)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SET lock_timeout = {milliseconds}')
+        cursor.execute(f'SET statement_timeout = {milliseconds}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET lock_timeout')
+            cursor.execute('RESET statement_timeout')
+
+
+def run_in_background(fn, cleanup=None, attempts=3, delay=0.5, name='page-revalidate'):
+    """Run ``fn`` in a daemon thread, retrying ``OperationalError`` with a growing delay; ``cleanup`` runs last."""
+    def target():
+        close_old_connections()
+        try:
+            for attempt in range(1, attempts + 1):
+                try:
+                    fn()
+                    return
+                except OperationalError:
+                    if attempt == attempts:
+                        return
+                    time.sleep(delay * attempt)
+        finally:
+            connection.close()
+            if cleanup is not None:
+                cleanup()
+
+    thread = threading.Thread(target=target, name=name, daemon=True)
+    thread.start()
+    return thread
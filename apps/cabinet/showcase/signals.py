@@ -0,0 +1,10 @@
+from django.dispatch import receiver
+
+from masters.versions import master_data_committed
+from .snapshots import schedule_rebuild
+
+
+@receiver(master_data_committed)
+def rebuild_storefront_snapshot(sender, user_id, **kwargs):
+    """Refresh the master's snapshot once a change is committed."""
+    schedule_rebuild(user_id)
@@ -0,0 +1,204 @@
+"""Per-master storefront snapshots: everything the master page and slot grid read, in one row.
+
+A snapshot holds the master's active services and the free slots of the
+availability window, serialized into ``StorefrontSnapshot.payload`` together
+with the ``data_version`` it was built from. Profile fields and the salon card
+come from the slug resolver (masters/resolver.py), which already serves them
+without a query.
+
+Every committed change to a master's data queues a rebuild on a background
+worker (``STOREFRONT_SNAPSHOT_ASYNC``), so readers usually find the snapshot
+current. A reader that finds it older than the resolved data version, or
+ending before the availability window does, builds the payload in memory for
+its own response, so a snapshot is never served stale, and leaves storing it
+to the worker: storefront reads do not become writers during booking bursts.
+Holds and slots that have started are applied at read
+time; the booking POST still checks slots in its own transaction.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, close_old_connections, DatabaseError, IntegrityError, transaction
+from django.utils import timezone
+
+from masters.models import MasterProfile, Service
+from schedule.availability import earliest_starts
+from schedule.models import ScheduleSlot
+from schedule.rules import free_slots
+from schedule.summary import availability_window
+
+from .models import StorefrontSnapshot
+
+# Seconds an idle rebuild worker waits for new jobs before exiting
+WORKER_IDLE_TIMEOUT = 60
+
+SERVICE_FIELDS = ('id', 'name', 'description', 'duration_min', 'price')
+
+Snapshot = namedtuple('Snapshot', ['services', 'slots'])
+
+
+def _timestamp(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+
+
+def build_payload(owner_id, now=None):
+    """Return ``(payload, window_end)`` for the master as of ``now``."""
+    start, end = availability_window(now)
+    services = [
+        {**service, 'price': str(service['price'])}
+        for service in Service.objects.filter(owner_id=owner_id, is_active=True).order_by('pk').values(*SERVICE_FIELDS)
+    ]
+    # A rule slot has no pk until it is booked
+    slots = [
+        [slot.pk, slot.start_at.timestamp(), slot.end_at.timestamp(), slot.source]
+        for slot in free_slots(owner_id, start, end)
+    ]
+    return {'services': services, 'slots': slots}, end
+
+
+def rebuild_snapshot(owner_id, now=None):
+    """Rebuild and store the master's snapshot; return it, or None if the master has no profile."""
+    # Read the version first: a write committed meanwhile leaves the snapshot outdated, not wrong
+    version = MasterProfile.objects.filter(user_id=owner_id).values_list('data_version', flat=True).first()
+    if version is None:
+        StorefrontSnapshot.objects.filter(owner_id=owner_id).delete()
+        return None
+    payload, window_end = build_payload(owner_id, now)
+    return store_snapshot(owner_id, version, payload, window_end)
+
+
+def store_snapshot(owner_id, version, payload, window_end):
+    """Save a payload built from ``version`` unless a newer snapshot is stored; return it unsaved."""
+    fields = {'data_version': version, 'window_end': window_end, 'payload': payload}
+    # Never overwrite a snapshot built from newer data by a concurrent rebuild
+    if not StorefrontSnapshot.objects.filter(owner_id=owner_id, data_version__lte=version).update(
+        built_at=timezone.now(), **fields
+    ):
+        try:
+            with transaction.atomic():
+                StorefrontSnapshot.objects.create(owner_id=owner_id, **fields)
+        except IntegrityError:
+            pass
+    return StorefrontSnapshot(owner_id=owner_id, **fields)
+
+
+def rebuild_all_snapshots(owner_ids=None, now=None):
+    """Rebuild snapshots of the given masters (default: every master); return how many were built."""
+    if owner_ids is None:
+        owner_ids = MasterProfile.objects.values_list('user_id', flat=True).order_by('user_id')
+    return sum(1 for owner_id in owner_ids if rebuild_snapshot(owner_id, now=now) is not None)
+
+
+def load_snapshot(record, now=None):
+    """Return the master's ``Snapshot`` for the resolved ``record``, built afresh if the stored one is outdated."""
+    now = now or timezone.now()
+    row = StorefrontSnapshot.objects.filter(owner_id=record.user_id).only(
+        'data_version', 'window_end', 'payload'
+    ).first()
+    if row is None or row.data_version < record.data_version or row.window_end < availability_window(now)[1]:
+        payload, window_end = build_payload(record.user_id, now)
+        if background_rebuilds():
+            rebuilder.submit(record.user_id)
+        else:
+            store_snapshot(record.user_id, record.data_version, payload, window_end)
+        row = StorefrontSnapshot(owner_id=record.user_id, payload=payload)
+
+    services = [
+        Service(owner_id=record.user_id, is_active=True, **{**service, 'price': Decimal(service['price'])})
+        for service in row.payload['services']
+    ]
+    threshold = now.timestamp()
+    slots = [
+        _slot(record.user_id, pk, _timestamp(start), _timestamp(end), source)
+        for pk, start, end, source in row.payload['slots']
+        if start >= threshold
+    ]
+    return Snapshot(services, slots)
+
+
+def _slot(owner_id, pk, start_at, end_at, source):
+    return ScheduleSlot(
+        pk=pk,
+        owner_id=owner_id,
+        start_at=start_at,
+        end_at=end_at,
+        start_date=timezone.localdate(start_at),
+        status=ScheduleSlot.Status.AVAILABLE,
+        source=source,
+    )
+
+
+def with_next_available(services, slots):
+    """Set ``next_available_at`` on each service from the snapshot's free slots."""
+    found = earliest_starts(slots, [service.duration_min for service in services])
+    for service in services:
+        slot = found.get(service.duration_min)
+        service.next_available_at = slot.start_at if slot else None
+    return services
+
+
+class SnapshotRebuilder:
+    """One daemon thread rebuilding queued masters; a master already queued is not queued twice."""
+
+    def __init__(self, idle_timeout=WORKER_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._worker = None
+
+    def submit(self, owner_id):
+        with self._cond:
+            self._pending[owner_id] = None
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._drain, name='snapshot-rebuilder', daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return list(self._pending)
+
+    def _next(self):
+        with self._cond:
+            while not self._pending:
+                if not self._cond.wait(timeout=self.idle_timeout) and not self._pending:
+                    # submit() starts a new worker under the same lock once this one is gone
+                    self._worker = None
+                    return None
+            owner_id, _ = self._pending.popitem(last=False)
+            return owner_id
+
+    def _drain(self):
+        try:
+            while True:
+                owner_id = self._next()
+                if owner_id is None:
+                    return
+                close_old_connections()
+                try:
+                    rebuild_snapshot(owner_id)
+                except DatabaseError:
+                    # Locked or failing database: the next reader rebuilds the snapshot inline
+                    pass
+        finally:
+            connection.close()
+
+
+rebuilder = SnapshotRebuilder()
+
+
+def background_rebuilds():
+    """Whether snapshots are stored by the worker rather than by the caller."""
+    # An open transaction (callbacks run early under TestCase) would be invisible to the worker
+    return settings.STOREFRONT_SNAPSHOT_ASYNC and not connection.in_atomic_block
+
+
+def schedule_rebuild(owner_id):
+    """Rebuild the master's snapshot in the background, or right away when that is off or impossible."""
+    if background_rebuilds():
+        rebuilder.submit(owner_id)
+    else:
+        rebuild_snapshot(owner_id)
@@ -0,0 +1,42 @@
+from django import template
+
+from showcase.fragments import get_or_render
+
+register = template.Library()
+
+
+class VersionedCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_render(self.name, vary_on, timeout, lambda: self.nodelist.render(context))
+
+
+@register.tag('versioned_cache')
+def do_versioned_cache(parser, token):
+    """Cache the block like ``{% cache %}`` and count hits and misses per fragment name.
+
+        {% versioned_cache timeout 'name' var1 var2 ... %} ... {% endversioned_cache %}
+
+    Pass the master's ``data_version`` among the vary-on values.
+    """
+    nodelist = parser.parse(('endversioned_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least 2 arguments.")
+    name = bits[2]
+    if name[0] in ('"', "'") and name[-1] == name[0]:
+        name = name[1:-1]
+    return VersionedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        name,
+        [parser.compile_filter(bit) for bit in bits[3:]]
+    )
@@ -1,13 +1,29 @@
-from datetime import timedelta
-
-from django.test import TestCase
+import threading
+from datetime import datetime, time, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, OperationalError
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from accounts.models import User
 from masters.models import MasterProfile, Salon, Service
-from schedule.models import ScheduleSlot, Booking
-from showcase.views import MasterSlotsView
+from masters.resolver import resolver
+from masters.versions import page_generation_key
+from schedule.holds import HOLD_COOKIE, SLOT_HELD_MESSAGE, held_slots
+from schedule import booking as booking_engine
+from schedule.models import ScheduleSlot, Booking, BookingIdempotencyKey, MasterAvailability, WorkingHours
+from .fragments import fragment_stats
+from .models import StorefrontSnapshot
+from .page_cache import PAGE_NAMES, PAGE_OUTCOMES, _page_key
+from .read_budget import read_budget
+from .snapshots import SnapshotRebuilder, load_snapshot
+from .views import MasterSlotsView
 
 
 def make_slot(owner, start, minutes=30, status=ScheduleSlot.Status.AVAILABLE):
@@ -23,6 +39,7 @@ def tomorrow_at(hour, minute=0):
 
 class MastersCatalogViewTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             email='cat@test.com', username='cat', password='pass123',
             role=User.Role.MASTER
@@ -42,9 +59,60 @@ class MastersCatalogViewTest(TestCase):
         resp = self.client.get(reverse('masters_catalog'))
         self.assertNotIn(self.profile, resp.context['masters'])
 
-    def test_all_masters_always_present(self):
+    def test_master_without_slots_listed_once_below(self):
+        resp = self.client.get(reverse('masters_catalog'))
+        self.assertIn(self.profile, resp.context['other_masters'])
+        make_slot(self.user, tomorrow_at(10))
+        cache.clear()
         resp = self.client.get(reverse('masters_catalog'))
-        self.assertIn(self.profile, resp.context['all_masters'])
+        self.assertNotIn(self.profile, resp.context['other_masters'])
+        self.assertContains(resp, reverse('master_page', args=[self.profile.slug]), count=1)
+
+    def test_catalog_pages_by_cursor(self):
+        others = [
+            User.objects.create_user(
+                email=f'page{i}@test.com', username=f'page{i}', password='pass123', role=User.Role.MASTER
+            )
+            for i in range(3)
+        ]
+        for hour, user in zip((15, 9, 12), others):
+            make_slot(user, tomorrow_at(hour))
+        make_slot(self.user, tomorrow_at(11))
+        resp = self.client.get(reverse('masters_catalog'), {'sort': 'soonest', 'size': 3})
+        page = resp.context['masters']
+        self.assertEqual([p.user for p in page], [others[1], self.user, others[2]])
+        self.assertIn('sort=soonest', page.next_url)
+        resp = self.client.get(reverse('masters_catalog') + page.next_url)
+        self.assertEqual([p.user for p in resp.context['masters']], [others[0]])
+        self.assertFalse(resp.context['masters'].has_next)
+        resp = self.client.get(reverse('masters_catalog') + resp.context['masters'].previous_url)
+        self.assertEqual(list(resp.context['masters']), list(page))
+
+    def test_sort_by_soonest_available(self):
+        other = User.objects.create_user(
+            email='cat2@test.com', username='cat2', password='pass123',
+            role=User.Role.MASTER
+        )
+        make_slot(self.user, tomorrow_at(15))
+        make_slot(other, tomorrow_at(9))
+        resp = self.client.get(reverse('masters_catalog'), {'sort': 'soonest'})
+        self.assertEqual(list(resp.context['masters']), [other.master_profile, self.profile])
+
+    def test_outdated_summary_not_shown_or_sorted_first(self):
+        other = User.objects.create_user(
+            email='cat3@test.com', username='cat3', password='pass123',
+            role=User.Role.MASTER
+        )
+        make_slot(self.user, tomorrow_at(9))
+        make_slot(self.user, tomorrow_at(15))
+        make_slot(other, tomorrow_at(12))
+        # The first free time has started since the last write
+        MasterAvailability.objects.filter(owner=self.user).update(
+            next_available_at=timezone.now() - timedelta(minutes=5)
+        )
+        resp = self.client.get(reverse('masters_catalog'), {'sort': 'soonest'})
+        self.assertEqual(list(resp.context['masters']), [other.master_profile, self.profile])
+        self.assertContains(resp, 'Ближайшее время', count=1)
 
     def test_past_slots_not_counted(self):
         yesterday = timezone.now() - timedelta(days=1)
@@ -65,11 +133,13 @@ class MasterPageViewTest(TestCase):
             owner=self.user, salon=self.salon,
             name='Маникюр', duration_min=60, price=2000
         )
+        cache.clear()
 
     def test_master_page_loads(self):
         resp = self.client.get(reverse('master_page', args=[self.profile.slug]))
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp.context['profile'], self.profile)
+        self.assertEqual(resp.context['profile'].user_id, self.user.pk)
+        self.assertEqual(resp.context['profile'].display_name, self.profile.display_name)
 
     def test_master_page_shows_services(self):
         resp = self.client.get(reverse('master_page', args=[self.profile.slug]))
@@ -81,6 +151,19 @@ class MasterPageViewTest(TestCase):
         resp = self.client.get(reverse('master_page', args=[self.profile.slug]))
         self.assertNotIn(self.service, resp.context['services'])
 
+    def test_next_available_per_service(self):
+        short = Service.objects.create(
+            owner=self.user, salon=self.salon,
+            name='Покрытие', duration_min=30, price=1000
+        )
+        make_slot(self.user, tomorrow_at(10))
+        make_slot(self.user, tomorrow_at(12))
+        make_slot(self.user, tomorrow_at(12, 30))
+        resp = self.client.get(reverse('master_page', args=[self.profile.slug]))
+        starts = {s.pk: s.next_available_at for s in resp.context['services']}
+        self.assertEqual(starts[short.pk], tomorrow_at(10))
+        self.assertEqual(starts[self.service.pk], tomorrow_at(12))
+
     def test_nonexistent_slug_404(self):
         resp = self.client.get(reverse('master_page', args=['nonexistent']))
         self.assertEqual(resp.status_code, 404)
@@ -88,6 +171,7 @@ class MasterPageViewTest(TestCase):
 
 class MasterSlotsViewTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             email='ms@test.com', username='ms', password='pass123',
             role=User.Role.MASTER
@@ -124,6 +208,17 @@ class MasterSlotsViewTest(TestCase):
         self.assertEqual(resp.context['service'], self.service)
         self.assertIn(slot1, resp.context['slots'])
 
+    def test_mixed_slot_durations(self):
+        # 15 + 45 minutes cover a 60 min service; a lone 30 min slot does not
+        slot1 = make_slot(self.user, tomorrow_at(10), minutes=15)
+        make_slot(self.user, tomorrow_at(10, 15), minutes=45)
+        make_slot(self.user, tomorrow_at(12), minutes=30)
+        resp = self.client.get(
+            reverse('master_slots', args=[self.profile.slug]),
+            {'service': self.service.pk}
+        )
+        self.assertEqual(resp.context['slots'], [slot1])
+
     def test_single_slot_not_enough_for_long_service(self):
         # Only 1 slot, but service needs 2
         make_slot(self.user, tomorrow_at(10))
@@ -134,39 +229,339 @@ class MasterSlotsViewTest(TestCase):
         self.assertEqual(len(resp.context['slots']), 0)
 
 
-class FilterBookableSlotsTest(TestCase):
-    """Unit tests for _filter_bookable_slots static method."""
+# The page cache would answer before any fragment is looked at
+@override_settings(STOREFRONT_PAGE_CACHE=False)
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='frag@test.com', username='frag', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Маникюр', duration_min=30, price=2000
+        )
+        self.slot1 = make_slot(self.user, tomorrow_at(10))
+        self.slot2 = make_slot(self.user, tomorrow_at(10, 30))
+        self.slots_url = reverse('master_slots', args=[self.profile.slug])
+
+    def grid(self, client=None):
+        return (client or self.client).get(self.slots_url, {'service': self.service.pk})
+
+    def test_warm_master_page_runs_no_queries(self):
+        url = reverse('master_page', args=[self.profile.slug])
+        self.client.get(url)
+        # The master comes from the slug resolver, everything else from fragments
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Маникюр')
+        stats = fragment_stats()
+        self.assertEqual(stats['master_profile'], (1, 1))
+        self.assertEqual(stats['master_services'], (1, 1))
+
+    def test_service_edit_invalidates_master_page(self):
+        url = reverse('master_page', args=[self.profile.slug])
+        self.client.get(url)
+        self.service.name = 'Педикюр'
+        self.service.save()
+        self.assertContains(self.client.get(url), 'Педикюр')
+
+    def test_warm_grid_skips_slot_queries(self):
+        self.grid()
+        # Service lookup only; the master comes from the slug resolver
+        with self.assertNumQueries(1):
+            resp = self.grid()
+        self.assertContains(resp, f'slot={self.slot1.pk}"')
+        self.assertEqual(fragment_stats()['master_slots'], (1, 1))
+
+    def test_grid_follows_bookings(self):
+        self.grid()
+        booking_engine.create_booking(
+            owner=self.user, service=self.service, slot_id=self.slot1.pk,
+            client_name='Клиент', client_phone='+7999'
+        )
+        resp = self.grid()
+        self.assertNotContains(resp, f'slot={self.slot1.pk}"')
+        self.assertContains(resp, f'slot={self.slot2.pk}"')
+
+    def test_grid_follows_holds(self):
+        holder, other = Client(), Client()
+        self.grid(other)
+        holder.get(
+            reverse('booking_create', args=[self.profile.slug]),
+            {'service': self.service.pk, 'slot': self.slot2.pk}
+        )
+        self.assertNotContains(self.grid(other), f'slot={self.slot2.pk}"')
+        # The holder still sees the slot they are booking
+        self.assertContains(self.grid(holder), f'slot={self.slot2.pk}"')
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='page@test.com', username='page', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Маникюр', duration_min=30, price=2000
+        )
+        self.slot1 = make_slot(self.user, tomorrow_at(10))
+        self.slot2 = make_slot(self.user, tomorrow_at(10, 30))
+        self.page_url = reverse('master_page', args=[self.profile.slug])
+        self.slots_url = reverse('master_slots', args=[self.profile.slug]) + f'?service={self.service.pk}'
+
+    def test_warm_pages_skip_the_database(self):
+        for url in (reverse('masters_catalog'), self.page_url, self.slots_url):
+            self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+            with self.assertNumQueries(0):
+                resp = self.client.get(url)
+            self.assertEqual(resp['X-Page-Cache'], 'hit')
+            self.assertFalse(resp.cookies)
+        self.assertEqual(fragment_stats(PAGE_NAMES, PAGE_OUTCOMES)['page_master_page'], (1, 0, 0, 1))
+
+    def test_master_data_change_invalidates_page(self):
+        self.client.get(self.page_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Педикюр'
+            self.service.save()
+        resp = self.client.get(self.page_url)
+        self.assertEqual(resp['X-Page-Cache'], 'miss')
+        self.assertContains(resp, 'Педикюр')
+
+    def test_write_committed_while_rendering_leaves_page_outdated(self):
+        real_load = load_snapshot
+
+        def load_then_commit(record, now=None):
+            snapshot = real_load(record, now=now)
+            # Another request's write commits after this render read its data
+            cache.incr(page_generation_key(self.user.pk))
+            return snapshot
+
+        cache.set(page_generation_key(self.user.pk), 1, None)
+        with mock.patch('showcase.views.load_snapshot', side_effect=load_then_commit):
+            self.assertEqual(self.client.get(self.slots_url)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(self.slots_url)['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get(self.slots_url)['X-Page-Cache'], 'hit')
+
+    def test_booking_and_holds_invalidate_slot_grid(self):
+        self.client.get(self.slots_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking_engine.create_booking(
+                owner=self.user, service=self.service, slot_id=self.slot1.pk,
+                client_name='Клиент', client_phone='+7999'
+            )
+        self.assertNotContains(self.client.get(self.slots_url), f'slot={self.slot1.pk}"')
+
+        holder = Client()
+        holder.get(reverse('booking_create', args=[self.profile.slug]), {
+            'service': self.service.pk, 'slot': self.slot2.pk
+        })
+        self.assertNotContains(self.client.get(self.slots_url), f'slot={self.slot2.pk}"')
+        # The holder bypasses the shared page and still sees the slot they are booking
+        resp = holder.get(self.slots_url)
+        self.assertContains(resp, f'slot={self.slot2.pk}"')
+        self.assertNotIn('X-Page-Cache', resp)
+
+    def test_stale_page_served_while_another_request_rebuilds(self):
+        self.client.get(self.page_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Педикюр'
+            self.service.save()
+        key = _page_key('page_master_page', RequestFactory().get(self.page_url))
+        cache.add(f'{key}:lock', 1)
+        # Only the master record is re-resolved after the change
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.page_url)
+        self.assertEqual(resp['X-Page-Cache'], 'stale')
+        self.assertNotIn('ETag', resp)
+        self.assertContains(resp, 'Маникюр')
+
+    def test_locked_database_serves_last_good_page_and_revalidates(self):
+        self.client.get(self.slots_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Педикюр'
+            self.service.save()
+        key = _page_key('page_master_slots', RequestFactory().get(self.slots_url))
+        locked = OperationalError('database is locked')
+        with mock.patch.object(MasterSlotsView, 'get_context_data', side_effect=locked), \
+                mock.patch('showcase.page_cache._revalidate') as revalidate:
+            resp = self.client.get(self.slots_url)
+        self.assertEqual(resp['X-Page-Cache'], 'fallback')
+        self.assertContains(resp, f'slot={self.slot1.pk}"')
+        self.assertContains(resp, 'расписание обновляется')
+        revalidate.assert_called_once()
+        # The rebuild lock stays with the background job, so others get the stale copy meanwhile
+        self.assertEqual(self.client.get(self.slots_url)['X-Page-Cache'], 'stale')
+        self.assertEqual(fragment_stats(PAGE_NAMES, PAGE_OUTCOMES)['page_master_slots'], (0, 1, 1, 1))
+
+        cache.delete(f'{key}:lock')
+        resp = self.client.get(self.slots_url)
+        self.assertEqual(resp['X-Page-Cache'], 'miss')
+        self.assertNotContains(resp, 'расписание обновляется')
+
+    def test_locked_database_without_cached_copy_raises(self):
+        locked = OperationalError('database is locked')
+        with mock.patch.object(MasterSlotsView, 'get_context_data', side_effect=locked):
+            with self.assertRaises(OperationalError):
+                self.client.get(self.slots_url)
+
+    def test_conditional_get_for_anonymous_pages(self):
+        resp = self.client.get(self.slots_url)
+        self.assertIn('public', resp['Cache-Control'])
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.slots_url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        # Another visitor's hold changes the grid, so the tag no longer matches
+        Client().get(reverse('booking_create', args=[self.profile.slug]), {
+            'service': self.service.pk, 'slot': self.slot1.pk
+        })
+        resp = self.client.get(self.slots_url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, f'slot={self.slot1.pk}"')
 
-    def _make_fake_slot(self, start, minutes=30):
-        class FakeSlot:
-            def __init__(self, s, e):
-                self.start_at = s
-                self.end_at = e
-        return FakeSlot(start, start + timedelta(minutes=minutes))
+        etag = self.client.get(self.page_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.name = 'Педикюр'
+            self.service.save()
+        self.assertEqual(self.client.get(self.page_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
 
-    def test_slots_needed_1_returns_all(self):
-        base = timezone.now()
-        slots = [self._make_fake_slot(base + timedelta(minutes=i * 30)) for i in range(3)]
-        result = MasterSlotsView._filter_bookable_slots(slots, 1)
-        self.assertEqual(len(result), 3)
+    def test_logged_in_visitors_and_booking_form_bypass_cache(self):
+        self.client.login(username='page@test.com', password='pass123')
+        self.assertNotIn('X-Page-Cache', self.client.get(self.page_url))
 
-    def test_consecutive_slots_found(self):
-        base = timezone.now()
-        slots = [self._make_fake_slot(base + timedelta(minutes=i * 30)) for i in range(4)]
-        result = MasterSlotsView._filter_bookable_slots(slots, 3)
-        # slots 0, 1 can start a 3-slot sequence
-        self.assertEqual(len(result), 2)
+        # The form issues its own CSRF token, cached pages never carry one
+        resp = Client().get(reverse('booking_create', args=[self.profile.slug]), {
+            'service': self.service.pk, 'slot': self.slot1.pk
+        })
+        self.assertIn('csrftoken', resp.cookies)
+        self.assertNotIn('X-Page-Cache', resp)
 
-    def test_gap_breaks_sequence(self):
-        base = timezone.now()
-        slot1 = self._make_fake_slot(base)
-        slot2 = self._make_fake_slot(base + timedelta(minutes=60))  # gap!
-        result = MasterSlotsView._filter_bookable_slots([slot1, slot2], 2)
-        self.assertEqual(len(result), 0)
+
+@override_settings(STOREFRONT_PAGE_CACHE=False)
+class StorefrontSnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='snap@test.com', username='snap', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Маникюр', duration_min=30, price=2000
+        )
+        self.slot = make_slot(self.user, tomorrow_at(10))
+        self.slots_url = reverse('master_slots', args=[self.profile.slug]) + f'?service={self.service.pk}'
+
+    def test_pages_render_from_one_read(self):
+        for url in (self.slots_url, reverse('master_page', args=[self.profile.slug])):
+            self.client.get(url)
+            cache.clear()
+            # Fragments are gone; the master comes from the resolver and the rest from the snapshot row
+            with self.assertNumQueries(1):
+                resp = self.client.get(url)
+            self.assertContains(resp, 'Маникюр')
+        self.assertContains(resp, 'Ближайшее время')
+
+    def test_outdated_snapshot_rebuilt_on_read(self):
+        self.client.get(self.slots_url)
+        later = make_slot(self.user, tomorrow_at(15))
+        self.assertContains(self.client.get(self.slots_url), f'slot={later.pk}"')
+        snapshot = StorefrontSnapshot.objects.get(owner=self.user)
+        self.assertEqual(snapshot.data_version, MasterProfile.objects.get(pk=self.profile.pk).data_version)
+
+        # A new day enters the availability window at midnight
+        record = resolver.get(self.profile.slug)
+        load_snapshot(record, now=timezone.now() + timedelta(days=1))
+        self.assertGreater(StorefrontSnapshot.objects.get(owner=self.user).window_end, snapshot.window_end)
+
+    def test_outdated_snapshot_not_written_by_reader(self):
+        self.client.get(self.slots_url)
+        later = make_slot(self.user, tomorrow_at(15))
+        with mock.patch('showcase.snapshots.background_rebuilds', return_value=True), \
+                mock.patch('showcase.snapshots.rebuilder') as rebuilder, \
+                CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(self.slots_url)
+        self.assertContains(resp, f'slot={later.pk}"')
+        # The response is built in memory; storing the snapshot is the worker's job
+        rebuilder.submit.assert_called_once_with(self.user.pk)
+        self.assertFalse([
+            q for q in ctx.captured_queries
+            if 'storefront_snapshots' in q['sql'] and not q['sql'].startswith('SELECT')
+        ])
+
+    def test_commit_rebuilds_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.price = 2500
+            self.service.save()
+        snapshot = StorefrontSnapshot.objects.get(owner=self.user)
+        self.assertEqual(snapshot.payload['services'][0]['price'], '2500.00')
+        self.assertEqual(snapshot.payload['slots'][0][0], self.slot.pk)
+
+    def test_rebuild_command(self):
+        StorefrontSnapshot.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_storefront_snapshots', stdout=out)
+        self.assertIn('for 1 masters', out.getvalue())
+        self.assertTrue(StorefrontSnapshot.objects.filter(owner=self.user).exists())
+
+
+class SnapshotRebuilderTest(SimpleTestCase):
+    def test_queued_masters_coalesce(self):
+        started, release, done = threading.Event(), threading.Event(), threading.Event()
+        calls = []
+
+        def rebuild(owner_id):
+            calls.append(owner_id)
+            started.set()
+            release.wait(5)
+            if len(calls) == 3:
+                done.set()
+
+        rebuilder = SnapshotRebuilder(idle_timeout=0.1)
+        with mock.patch('showcase.snapshots.rebuild_snapshot', side_effect=rebuild), \
+                mock.patch('showcase.snapshots.close_old_connections'):
+            rebuilder.submit(1)
+            started.wait(5)
+            for owner_id in (2, 2, 3, 2):
+                rebuilder.submit(owner_id)
+            self.assertEqual(rebuilder.pending(), [2, 3])
+            release.set()
+            self.assertTrue(done.wait(5))
+        self.assertEqual(calls, [1, 2, 3])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite progress handler')
+class ReadBudgetTest(SimpleTestCase):
+    databases = {'default'}
+    SLOW_QUERY = (
+        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 100000000) '
+        'SELECT count(*) FROM n'
+    )
+
+    def test_slow_read_is_interrupted_and_settings_restored(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            busy_timeout = cursor.fetchone()[0]
+        with self.assertRaises(OperationalError):
+            with read_budget(0.05), connection.cursor() as cursor:
+                cursor.execute(self.SLOW_QUERY)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], busy_timeout)
+            cursor.execute('SELECT 1')
+            self.assertEqual(cursor.fetchone()[0], 1)
 
 
 class BookingCreateViewTest(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             email='bc@test.com', username='bc', password='pass123',
             role=User.Role.MASTER
@@ -236,6 +631,37 @@ class BookingCreateViewTest(TestCase):
         self.assertEqual(slot1.status, ScheduleSlot.Status.BOOKED)
         self.assertEqual(slot2.status, ScheduleSlot.Status.BOOKED)
 
+    def test_booking_with_mixed_slot_durations(self):
+        long_service = Service.objects.create(
+            owner=self.user, salon=self.salon,
+            name='Комплекс', duration_min=60, price=2500
+        )
+        slot1 = make_slot(self.user, tomorrow_at(14), minutes=15)
+        slot2 = make_slot(self.user, tomorrow_at(14, 15), minutes=45)
+        slot3 = make_slot(self.user, tomorrow_at(15), minutes=30)
+
+        resp = self.client.post(
+            reverse('booking_create', args=[self.profile.slug]),
+            {
+                'service_id': long_service.pk,
+                'slot_id': slot1.pk,
+                'client_name': 'Смешанный',
+                'client_phone': '+7 000',
+                'notes': '',
+            }
+        )
+        self.assertEqual(resp.status_code, 302)
+
+        booking = Booking.objects.get(client_name='Смешанный')
+        self.assertEqual(set(booking.booked_slots.all()), {slot1, slot2})
+        slot3.refresh_from_db()
+        self.assertEqual(slot3.status, ScheduleSlot.Status.AVAILABLE)
+
+        slot1.refresh_from_db()
+        slot2.refresh_from_db()
+        self.assertEqual(slot1.status, ScheduleSlot.Status.BOOKED)
+        self.assertEqual(slot2.status, ScheduleSlot.Status.BOOKED)
+
     def test_booking_already_booked_slot_fails(self):
         self.slot.status = ScheduleSlot.Status.BOOKED
         self.slot.save()
@@ -275,6 +701,206 @@ class BookingCreateViewTest(TestCase):
         self.assertEqual(Booking.objects.count(), 0)
 
 
+class SlotHoldTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='hold@test.com', username='hold', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Педикюр', duration_min=60, price=2500
+        )
+        self.slot1 = make_slot(self.user, tomorrow_at(10))
+        self.slot2 = make_slot(self.user, tomorrow_at(10, 30))
+        self.slot3 = make_slot(self.user, tomorrow_at(11))
+        self.form_url = reverse('booking_create', args=[self.profile.slug])
+        self.other = Client()
+
+    def open_form(self, client, slot):
+        return client.get(self.form_url, {'service': self.service.pk, 'slot': slot.pk})
+
+    def post_booking(self, client, slot, name):
+        return client.post(self.form_url, {
+            'service_id': self.service.pk,
+            'slot_id': slot.pk,
+            'client_name': name,
+            'client_phone': '+7 000',
+            'notes': '',
+            'hold_token': client.cookies[HOLD_COOKIE].value if HOLD_COOKIE in client.cookies else '',
+        })
+
+    def slot_starts(self, client):
+        resp = client.get(reverse('master_slots', args=[self.profile.slug]), {'service': self.service.pk})
+        return list(resp.context['slots'])
+
+    def test_opening_form_holds_run_for_other_visitors(self):
+        resp = self.open_form(self.client, self.slot1)
+        self.assertIsNone(resp.context['hold_error'])
+        self.assertIn(HOLD_COOKIE, resp.cookies)
+
+        # Slot 2 is part of the held run, so slot 1 and slot 2 starts vanish for others
+        self.assertEqual(self.slot_starts(self.other), [])
+        self.assertEqual(self.slot_starts(self.client), [self.slot1, self.slot2])
+
+        resp = self.open_form(self.other, self.slot2)
+        self.assertEqual(resp.context['hold_error'], SLOT_HELD_MESSAGE)
+
+    def test_engine_refuses_slots_held_by_someone_else(self):
+        self.open_form(self.client, self.slot1)
+        resp = self.post_booking(self.other, self.slot2, 'Чужой')
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+
+        resp = self.post_booking(self.client, self.slot1, 'Свой')
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Booking.objects.get().client_name, 'Свой')
+
+    def test_reopening_form_moves_the_hold(self):
+        self.open_form(self.client, self.slot1)
+        self.open_form(self.client, self.slot2)
+        # Slot 1 is released; slot 2 + slot 3 are held now
+        held = held_slots([self.slot1, self.slot2, self.slot3])
+        self.assertEqual(set(held), {self.slot2, self.slot3})
+
+    def test_hold_expires(self):
+        self.open_form(self.client, self.slot1)
+        cache.clear()
+        self.assertEqual(self.slot_starts(self.other), [self.slot1, self.slot2])
+
+
+class WorkingHoursStorefrontTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='wh@test.com', username='wh', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Маникюр', duration_min=60, price=1500
+        )
+        day = timezone.localdate() + timedelta(days=1)
+        WorkingHours.objects.create(owner=self.user, weekday=day.weekday(), start_time=time(10), end_time=time(11))
+        self.start = timezone.make_aware(datetime.combine(day, time(10)))
+
+    def test_rule_slot_is_offered_and_bookable(self):
+        resp = self.client.get(reverse('master_slots', args=[self.profile.slug]), {'service': self.service.pk})
+        slot = resp.context['slots'][0]
+        self.assertEqual(slot.start_at, self.start)
+        self.assertIsNone(slot.pk)
+        self.assertContains(resp, f'slot={slot.ref}')
+
+        url = reverse('booking_create', args=[self.profile.slug])
+        resp = self.client.get(url, {'service': self.service.pk, 'slot': slot.ref})
+        self.assertIsNone(resp.context['hold_error'])
+
+        resp = self.client.post(url, {
+            'service_id': self.service.pk,
+            'slot_id': slot.ref,
+            'client_name': 'Клиент',
+            'client_phone': '+7 000',
+            'notes': '',
+            'hold_token': self.client.cookies[HOLD_COOKIE].value,
+        })
+        self.assertEqual(resp.status_code, 302)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.booked_slots.count(), 2)
+        self.assertEqual(booking.slot.start_at, self.start)
+
+    def test_unknown_ref_is_404(self):
+        url = reverse('booking_create', args=[self.profile.slug])
+        resp = self.client.get(url, {'service': self.service.pk, 'slot': 'r1'})
+        self.assertEqual(resp.status_code, 404)
+
+
+class IdempotentBookingTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='idem@test.com', username='idem', password='pass123',
+            role=User.Role.MASTER
+        )
+        self.profile = self.user.master_profile
+        salon = Salon.objects.create(owner=self.user, name='Салон')
+        self.service = Service.objects.create(
+            owner=self.user, salon=salon, name='Маникюр', duration_min=30, price=1500
+        )
+        self.slot = make_slot(self.user, tomorrow_at(10))
+        self.url = reverse('booking_create', args=[self.profile.slug])
+
+    def submit(self, key, **extra):
+        return self.client.post(self.url, {
+            'service_id': self.service.pk,
+            'slot_id': self.slot.pk,
+            'client_name': 'Повтор',
+            'client_phone': '+7 000',
+            'notes': '',
+            'idempotency_key': key,
+        }, **extra)
+
+    def test_form_carries_a_fresh_key(self):
+        resp = self.client.get(self.url, {'service': self.service.pk, 'slot': self.slot.pk})
+        self.assertEqual(len(resp.context['form'].initial['idempotency_key']), 32)
+
+    def test_replay_returns_original_booking_without_touching_slots(self):
+        first = self.submit('k1')
+        self.assertEqual(first.status_code, 302)
+
+        with CaptureQueriesContext(connection) as ctx:
+            replay = self.submit('k1')
+        self.assertEqual(replay.url, first.url)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'schedule_slots' in q['sql']])
+
+    def test_header_key_is_accepted(self):
+        first = self.submit('', HTTP_IDEMPOTENCY_KEY='hdr')
+        replay = self.submit('', HTTP_IDEMPOTENCY_KEY='hdr')
+        self.assertEqual(replay.url, first.url)
+
+    def test_expired_key_is_not_replayed(self):
+        self.submit('k1')
+        BookingIdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        resp = self.submit('k1')
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, 'Слот уже занят')
+
+    def test_expired_unpurged_key_can_be_reused(self):
+        self.submit('k1')
+        BookingIdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.slot = make_slot(self.user, tomorrow_at(12))
+        resp = self.submit('k1')
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Booking.objects.count(), 2)
+        key = BookingIdempotencyKey.objects.get()
+        self.assertEqual(key.booking.slot, self.slot)
+        self.assertGreater(key.expires_at, timezone.now())
+
+    def test_same_key_books_another_master(self):
+        self.submit('', HTTP_IDEMPOTENCY_KEY='shared')
+        other = User.objects.create_user(
+            email='idem2@test.com', username='idem2', password='pass123',
+            role=User.Role.MASTER
+        )
+        salon = Salon.objects.create(owner=other, name='Салон')
+        self.service = Service.objects.create(owner=other, salon=salon, name='Маникюр', duration_min=30, price=1500)
+        self.slot = make_slot(other, tomorrow_at(10))
+        self.url = reverse('booking_create', args=[other.master_profile.slug])
+        resp = self.submit('', HTTP_IDEMPOTENCY_KEY='shared')
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(Booking.objects.filter(owner=other).count(), 1)
+        self.assertEqual(BookingIdempotencyKey.objects.filter(key='shared').count(), 2)
+
+    def test_other_key_still_sees_taken_slot(self):
+        self.submit('k1')
+        resp = self.submit('k2')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Booking.objects.count(), 1)
+
+
 class BookingSuccessViewTest(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -1,10 +1,30 @@
 from django.urls import path
+
+from masters.conditional import conditional_page, storefront_master
 from . import views
+from .page_cache import cache_page_for_anonymous
 
 urlpatterns = [
-    path('', views.MastersCatalogView.as_view(), name='masters_catalog'),
-    path('<slug:slug>/', views.MasterPageView.as_view(), name='master_page'),
-    path('<slug:slug>/slots/', views.MasterSlotsView.as_view(), name='master_slots'),
+    path(
+        '',
+        cache_page_for_anonymous('page_masters_catalog')(views.MastersCatalogView.as_view()),
+        name='masters_catalog'
+    ),
+    path(
+        '<slug:slug>/',
+        conditional_page(storefront_master)(
+            cache_page_for_anonymous('page_master_page')(views.MasterPageView.as_view())
+        ),
+        name='master_page'
+    ),
+    path(
+        '<slug:slug>/slots/',
+        conditional_page(storefront_master, with_holds=True)(
+            cache_page_for_anonymous('page_master_slots')(views.MasterSlotsView.as_view())
+        ),
+        name='master_slots'
+    ),
+    # Never page-cached: the form carries a CSRF token and places a hold
     path('<slug:slug>/book/', views.BookingCreateView.as_view(), name='booking_create'),
     path('<slug:slug>/book/success/', views.BookingSuccessView.as_view(), name='booking_success'),
 ]
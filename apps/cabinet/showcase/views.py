@@ -1,38 +1,75 @@
-from datetime import timedelta
+import uuid
 
-from django.db import transaction, IntegrityError
+from django.db import IntegrityError
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.views.generic import TemplateView, FormView, ListView
 
 from masters.models import MasterProfile, Service
-from schedule.models import ScheduleSlot, Booking
+from masters.resolver import resolve_master
+from schedule.availability import bookable_starts
+from schedule.booking import (
+    create_booking, find_covering_slots, find_replayed_booking, find_start_slot, SLOT_TAKEN_MESSAGE
+)
+from schedule.holds import (
+    HOLD_COOKIE, HOLD_TTL, SLOT_HELD_MESSAGE, held_slots, holds_version, new_hold_token, place_hold,
+    token_holds_for
+)
+from schedule.models import Booking
+from schedule.pagination import KeysetPaginationMixin, keyset_page, page_size
+from schedule.writer import run_booking_write, WriteQueueTimeout, WRITE_TIMEOUT_MESSAGE
 from .forms import PublicBookingForm
+from .fragments import PROFILE_FRAGMENT_TIMEOUT, SCHEDULE_FRAGMENT_TIMEOUT
+from .snapshots import load_snapshot, with_next_available
 
+CATALOG_PAGE_SIZE = 24
 
-class MastersCatalogView(ListView):
+OTHER_MASTERS_PAGE_SIZE = 48
+
+
+class MastersCatalogView(KeysetPaginationMixin, ListView):
     """Catalog of all masters with available slots."""
     template_name = 'showcase/masters_catalog.html'
     context_object_name = 'masters'
+    page_size = CATALOG_PAGE_SIZE
+
+    def available_filter(self):
+        # Masters whose availability summary has a free slot ahead of now
+        return Q(user__availability__has_availability=True, user__availability__last_available_at__gte=timezone.now())
 
     def get_queryset(self):
-        now = timezone.now()
-        # Masters who have at least one available slot in the next 14 days
-        masters_with_slots = ScheduleSlot.objects.filter(
-            status=ScheduleSlot.Status.AVAILABLE,
-            start_at__gte=now,
-            start_at__date__lte=now.date() + timedelta(days=14)
-        ).values_list('owner__master_profile__id', flat=True).distinct()
-
-        return MasterProfile.objects.filter(
-            id__in=masters_with_slots
-        ).select_related('user')
+        return MasterProfile.objects.filter(self.available_filter()).select_related(
+            'user', 'user__availability'
+        ).annotate(
+            # A summary is only recomputed on writes and by ``rebuild_availability --stale``: until then
+            # a first free time already past is unknown, and such masters sort after the current ones
+            outdated=Case(
+                When(user__availability__next_available_at__lt=timezone.now(), then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+    def get_keyset_ordering(self):
+        if self.request.GET.get('sort') == 'soonest':
+            return ('outdated', 'user__availability__next_available_at', 'pk')
+        return ('pk',)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # All masters (even without slots) for full catalog
-        context['all_masters'] = MasterProfile.objects.all().select_related('user')
+        # The rest of the catalog, without slots now; each master is listed once
+        context['other_masters'] = keyset_page(
+            self.request,
+            MasterProfile.objects.exclude(self.available_filter()).only('slug', 'display_name'),
+            ('pk',),
+            size=page_size(self.request, OTHER_MASTERS_PAGE_SIZE, prefix='others_'),
+            prefix='others_',
+        )
+        context['sort'] = self.request.GET.get('sort', '')
         return context
 
 
@@ -44,15 +81,19 @@ class MasterPageView(TemplateView):
         context = super().get_context_data(**kwargs)
         slug = self.kwargs['slug']
 
-        profile = get_object_or_404(MasterProfile, slug=slug)
+        profile = resolve_master(self.request, slug)
         context['profile'] = profile
-        context['salon'] = profile.user.salons.first()
-        context['services'] = Service.objects.filter(
-            owner=profile.user,
-            is_active=True
-        )
+        context['salon'] = profile.salon
+        # Lazy: a cached fragment never reads the snapshot
+        context['services'] = SimpleLazyObject(lambda: self._services(profile))
+        context['profile_timeout'] = PROFILE_FRAGMENT_TIMEOUT
+        context['schedule_timeout'] = SCHEDULE_FRAGMENT_TIMEOUT
         return context
 
+    def _services(self, profile):
+        snapshot = load_snapshot(profile)
+        return with_next_available(snapshot.services, snapshot.slots)
+
 
 class MasterSlotsView(TemplateView):
     """Available slots for master."""
@@ -62,57 +103,39 @@ class MasterSlotsView(TemplateView):
         context = super().get_context_data(**kwargs)
         slug = self.kwargs['slug']
 
-        profile = get_object_or_404(MasterProfile, slug=slug)
+        profile = resolve_master(self.request, slug)
         context['profile'] = profile
+        snapshot = load_snapshot(profile)
 
         # Get service if specified
         service_id = self.request.GET.get('service')
         if service_id:
-            context['service'] = get_object_or_404(
-                Service,
-                pk=service_id,
-                owner=profile.user,
-                is_active=True
-            )
-
-        now = timezone.now()
-        slots = ScheduleSlot.objects.filter(
-            owner=profile.user,
-            status=ScheduleSlot.Status.AVAILABLE,
-            start_at__gte=now,
-            start_at__date__lte=now.date() + timedelta(days=14)
-        )
-
-        all_slots = list(slots.order_by('start_at'))
+            context['service'] = next((s for s in snapshot.services if str(s.pk) == service_id), None)
+            if context['service'] is None:
+                raise Http404
+
+        hold_token = self.request.COOKIES.get(HOLD_COOKIE)
+        context['holds_version'] = holds_version(profile.user_id)
+        # A visitor holding slots here sees them as free, so their grid is not shared
+        context['viewer'] = hold_token if token_holds_for(hold_token, profile.user_id) else ''
+        context['schedule_timeout'] = SCHEDULE_FRAGMENT_TIMEOUT
+        context['slots'] = SimpleLazyObject(lambda: self._slots(snapshot, context.get('service'), hold_token))
+        return context
 
-        # Filter: only show slots where enough consecutive slots exist for the service
-        service = context.get('service')
-        if service and all_slots:
-            slot_duration = all_slots[0].duration_minutes if all_slots else 30
-            slots_needed = max(1, -(-service.duration_min // slot_duration))  # ceil division
-            context['slots'] = self._filter_bookable_slots(all_slots, slots_needed)
-        else:
-            context['slots'] = all_slots
+    def _slots(self, snapshot, service, hold_token):
+        # Stored free slots plus slots computed from working hours, as of the snapshot
+        all_slots = snapshot.slots
 
-        return context
+        # Slots held by other visitors' open booking forms are not offered
+        held = held_slots(all_slots, exclude_token=hold_token)
+        if held:
+            held = {id(s) for s in held}
+            all_slots = [s for s in all_slots if id(s) not in held]
 
-    @staticmethod
-    def _filter_bookable_slots(slots, slots_needed):
-        """Return only slots that have enough consecutive available slots after them."""
-        if slots_needed <= 1:
-            return slots
-
-        bookable = []
-        for i, slot in enumerate(slots):
-            consecutive = 1
-            for j in range(i + 1, min(i + slots_needed, len(slots))):
-                if slots[j].start_at == slots[j - 1].end_at:
-                    consecutive += 1
-                else:
-                    break
-            if consecutive >= slots_needed:
-                bookable.append(slot)
-        return bookable
+        # Filter: only show starts with enough continuous free time for the service
+        if service:
+            return bookable_starts(all_slots, service.duration_min)
+        return all_slots
 
 
 class BookingCreateView(FormView):
@@ -120,11 +143,18 @@ class BookingCreateView(FormView):
     template_name = 'showcase/booking_form.html'
     form_class = PublicBookingForm
 
+    def get(self, request, *args, **kwargs):
+        # One token per visitor, kept in a cookie so reopening the form keeps the same hold
+        self.hold_token = request.COOKIES.get(HOLD_COOKIE) or new_hold_token()
+        response = super().get(request, *args, **kwargs)
+        response.set_cookie(HOLD_COOKIE, self.hold_token, max_age=HOLD_TTL, httponly=True, samesite='Lax')
+        return response
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         slug = self.kwargs['slug']
 
-        profile = get_object_or_404(MasterProfile, slug=slug)
+        profile = resolve_master(self.request, slug)
         context['profile'] = profile
 
         # Pre-fill service and slot from GET params
@@ -133,112 +163,103 @@ class BookingCreateView(FormView):
 
         if service_id:
             context['service'] = get_object_or_404(
-                Service, pk=service_id, owner=profile.user, is_active=True
+                Service, pk=service_id, owner_id=profile.user_id, is_active=True
             )
         if slot_id:
-            context['slot'] = get_object_or_404(
-                ScheduleSlot, pk=slot_id, owner=profile.user, status=ScheduleSlot.Status.AVAILABLE
-            )
+            try:
+                slot = find_start_slot(profile.owner, slot_id)
+            except ValueError:
+                raise Http404
+            if not slot.is_available:
+                raise Http404
+            context['slot'] = slot
+
+        if 'service' in context and 'slot' in context and getattr(self, 'hold_token', None):
+            context['hold_error'] = self._hold_slots(profile.owner, context['service'], context['slot'])
+            context['hold_minutes'] = HOLD_TTL // 60
 
         return context
 
+    def _hold_slots(self, owner, service, slot):
+        """Reserve the run covering the service for this visitor; return an error message or None."""
+        try:
+            slots = find_covering_slots(owner, service, slot.ref)
+        except ValueError as e:
+            return str(e)
+        if not place_hold(slots, self.hold_token):
+            return SLOT_HELD_MESSAGE
+        return None
+
     def get_initial(self):
         initial = super().get_initial()
         initial['service_id'] = self.request.GET.get('service', '')
         initial['slot_id'] = self.request.GET.get('slot', '')
+        initial['hold_token'] = getattr(self, 'hold_token', '')
+        initial['idempotency_key'] = uuid.uuid4().hex
         return initial
 
     def form_valid(self, form):
         slug = self.kwargs['slug']
-        profile = get_object_or_404(MasterProfile, slug=slug)
+        profile = resolve_master(self.request, slug)
+        owner = profile.owner
+
+        # A resubmitted form gets the original booking back without touching the slots
+        idempotency_key = (
+            self.request.headers.get('Idempotency-Key', '')[:64] or form.cleaned_data.get('idempotency_key')
+        )
+        replayed = find_replayed_booking(owner, idempotency_key)
+        if replayed:
+            return self._success_redirect(slug, replayed)
 
         service_id = form.cleaned_data['service_id']
         slot_id = form.cleaned_data['slot_id']
 
         service = get_object_or_404(
-            Service, pk=service_id, owner=profile.user, is_active=True
+            Service, pk=service_id, owner=owner, is_active=True
         )
 
         try:
             booking = self._create_booking(
-                owner=profile.user,
+                owner=owner,
                 service=service,
                 slot_id=slot_id,
                 client_name=form.cleaned_data['client_name'],
                 client_phone=form.cleaned_data['client_phone'],
-                notes=form.cleaned_data.get('notes', '')
+                notes=form.cleaned_data.get('notes', ''),
+                hold_token=form.cleaned_data.get('hold_token') or None,
+                idempotency_key=idempotency_key or None
             )
-            return redirect(reverse('booking_success', kwargs={'slug': slug}) + f'?booking={booking.id}')
-        except ValueError as e:
-            form.add_error(None, str(e))
+            return self._success_redirect(slug, booking)
+        except (ValueError, IntegrityError) as e:
+            # A concurrent replay may have won the slot with this very key
+            replayed = find_replayed_booking(owner, idempotency_key)
+            if replayed:
+                return self._success_redirect(slug, replayed)
+            form.add_error(None, str(e) if isinstance(e, ValueError) else SLOT_TAKEN_MESSAGE)
             return self.form_invalid(form)
-        except IntegrityError:
-            form.add_error(None, 'Этот слот уже занят. Пожалуйста, выберите другое время.')
+        except WriteQueueTimeout:
+            form.add_error(None, WRITE_TIMEOUT_MESSAGE)
             return self.form_invalid(form)
 
-    @transaction.atomic
-    def _create_booking(self, owner, service, slot_id, client_name, client_phone, notes):
-        """Create booking with transaction. Locks multiple consecutive slots if needed."""
-        # Lock the starting slot
-        start_slot = ScheduleSlot.objects.select_for_update().get(pk=slot_id, owner=owner)
-
-        if start_slot.status != ScheduleSlot.Status.AVAILABLE:
-            raise ValueError('Слот уже занят')
-
-        if service.owner_id != start_slot.owner_id:
-            raise ValueError('Услуга и слот принадлежат разным мастерам')
-
-        # Calculate how many slots are needed
-        slot_duration = start_slot.duration_minutes
-        slots_needed = max(1, -(-service.duration_min // slot_duration))  # ceil division
-
-        # Find and lock consecutive slots
-        slots_to_book = [start_slot]
-        if slots_needed > 1:
-            next_slots = list(
-                ScheduleSlot.objects.select_for_update()
-                .filter(
-                    owner=owner,
-                    status=ScheduleSlot.Status.AVAILABLE,
-                    start_at__gt=start_slot.start_at,
-                    start_at__lte=start_slot.start_at + timedelta(minutes=slot_duration * (slots_needed - 1))
-                )
-                .order_by('start_at')
-            )
+    def _success_redirect(self, slug, booking):
+        return redirect(reverse('booking_success', kwargs={'slug': slug}) + f'?booking={booking.id}')
 
-            # Verify slots are consecutive
-            current_end = start_slot.end_at
-            for ns in next_slots:
-                if ns.start_at == current_end:
-                    slots_to_book.append(ns)
-                    current_end = ns.end_at
-                else:
-                    break
-
-            if len(slots_to_book) < slots_needed:
-                raise ValueError(
-                    f'Недостаточно последовательных свободных слотов. '
-                    f'Нужно: {slots_needed}, доступно: {len(slots_to_book)}'
-                )
-
-        # Create booking linked to start slot
-        booking = Booking.objects.create(
+    def _create_booking(self, owner, service, slot_id, client_name, client_phone, notes, hold_token=None,
+                        idempotency_key=None):
+        """Create booking by atomically claiming the contiguous free slots covering the service."""
+        return run_booking_write(
+            owner.pk,
+            create_booking,
             owner=owner,
             service=service,
-            slot=start_slot,
+            slot_id=slot_id,
             client_name=client_name,
             client_phone=client_phone,
-            notes=notes
+            notes=notes,
+            hold_token=hold_token,
+            idempotency_key=idempotency_key
         )
 
-        # Mark all slots as booked and link to booking
-        for s in slots_to_book:
-            s.status = ScheduleSlot.Status.BOOKED
-            s.save()
-        booking.booked_slots.set(slots_to_book)
-
-        return booking
-
 
 class BookingSuccessView(TemplateView):
     """Booking confirmation page."""
@@ -248,14 +269,14 @@ class BookingSuccessView(TemplateView):
         context = super().get_context_data(**kwargs)
         slug = self.kwargs['slug']
 
-        profile = get_object_or_404(MasterProfile, slug=slug)
+        profile = resolve_master(self.request, slug)
         context['profile'] = profile
 
         booking_id = self.request.GET.get('booking')
         if booking_id:
             context['booking'] = Booking.objects.filter(
                 pk=booking_id,
-                owner=profile.user
+                owner_id=profile.user_id
             ).select_related('service', 'slot').first()
 
         return context